@@ -0,0 +1,236 @@
+from constants.response import KEY_MESSAGE, KEY_PAYLOAD, KEY_STATUS
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from functools import wraps
+from rest_framework import status
+from rest_framework.response import Response
+import hashlib
+import json
+import time
+
+# ------------------------------------------------------------------------------
+# Decorator: idempotent
+# ------------------------------------------------------------------------------
+# Honours the Idempotency-Key header on mutating DRF view methods. The first
+# response for a (user, endpoint, key) is stored for IDEMPOTENCY_TTL seconds
+# and returned as is to every retry, without running the view again.
+#
+# - A retry that arrives while the first request is still running waits for
+#   it (up to IDEMPOTENCY_WAIT seconds), then replays its response, or gets a
+#   409 if it is still running.
+# - The key can't be reused with a different payload (422).
+# - 5xx responses and exceptions are not stored, so the request can be retried.
+# - A claim left behind by a crashed request expires after
+#   IDEMPOTENCY_LOCK_TIMEOUT seconds.
+# - Requests without the header, or from anonymous users, are not affected.
+#
+# Records live in the IdempotencyKey table (IDEMPOTENCY_STORE = "db") or in
+# Django's cache (IDEMPOTENCY_STORE = "cache").
+#
+# Apply it above @handle_exceptions so error responses are seen here.
+# ------------------------------------------------------------------------------
+
+HEADER = "Idempotency-Key"
+REPLAY_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = 255
+# Response headers kept with the stored response
+STORED_HEADERS = ("ETag", "Location")
+
+CLAIMED = "claimed"
+IN_PROGRESS = "in_progress"
+COMPLETED = "completed"
+MISMATCH = "mismatch"
+
+
+def get_ttl():
+    return timedelta(seconds=getattr(settings, "IDEMPOTENCY_TTL", 24 * 60 * 60))
+
+
+def get_lock_timeout():
+    return timedelta(seconds=getattr(settings, "IDEMPOTENCY_LOCK_TIMEOUT", 60))
+
+
+class DatabaseIdempotencyStore:
+    """ Records in the IdempotencyKey table; the unique constraint arbitrates concurrent claims. """
+
+    def model(self):
+        from user.models import IdempotencyKey
+        return IdempotencyKey
+
+    def claim(self, user_id, endpoint, key, fingerprint):
+        """ Returns (state, record) where record is a dict for COMPLETED and None otherwise. """
+        IdempotencyKey = self.model()
+        now = timezone.now()
+        claim_fields = {
+            "fingerprint": fingerprint,
+            "status_code": None,
+            "response_body": None,
+            "response_headers": {},
+            "locked_until": now + get_lock_timeout(),
+            "expires_at": now + get_ttl(),
+        }
+        record, created = IdempotencyKey.objects.get_or_create(
+            user_id=user_id, endpoint=endpoint, key=key, defaults=claim_fields
+        )
+        if created:
+            return CLAIMED, None
+
+        records = IdempotencyKey.objects.filter(id=record.id)
+        # Expired records and abandoned claims are taken over with a conditional UPDATE
+        if record.expires_at <= now:
+            return (CLAIMED, None) if records.filter(expires_at__lte=now).update(**claim_fields) else (IN_PROGRESS, None)
+        if record.fingerprint != fingerprint:
+            return MISMATCH, None
+        if record.status_code is not None:
+            return COMPLETED, {
+                "status_code": record.status_code,
+                "body": record.response_body,
+                "headers": record.response_headers,
+            }
+        if record.locked_until <= now:
+            claimed = records.filter(status_code__isnull=True, locked_until__lte=now).update(**claim_fields)
+            return (CLAIMED, None) if claimed else (IN_PROGRESS, None)
+        return IN_PROGRESS, None
+
+    def complete(self, user_id, endpoint, key, status_code, body, headers):
+        self.model().objects.filter(user_id=user_id, endpoint=endpoint, key=key).update(
+            status_code=status_code, response_body=body, response_headers=headers
+        )
+
+    def release(self, user_id, endpoint, key):
+        self.model().objects.filter(user_id=user_id, endpoint=endpoint, key=key, status_code__isnull=True).delete()
+
+    def purge_expired(self):
+        deleted, _ = self.model().objects.filter(expires_at__lte=timezone.now()).delete()
+        return deleted
+
+
+class CacheIdempotencyStore:
+    """ Records in Django's cache; cache.add() arbitrates concurrent claims. """
+    key_prefix = "idempotency"
+
+    def cache_key(self, user_id, endpoint, key):
+        digest = hashlib.sha256(f"{endpoint}\n{key}".encode()).hexdigest()
+        return f"{self.key_prefix}:{user_id}:{digest}"
+
+    def claim(self, user_id, endpoint, key, fingerprint):
+        cache_key = self.cache_key(user_id, endpoint, key)
+        claim = {"fingerprint": fingerprint, "locked_until": time.time() + get_lock_timeout().total_seconds()}
+        if cache.add(cache_key, claim, get_ttl().total_seconds()):
+            return CLAIMED, None
+
+        record = cache.get(cache_key)
+        if record is None:
+            # Expired between add() and get(); let the caller retry the claim
+            return IN_PROGRESS, None
+        if record["fingerprint"] != fingerprint:
+            return MISMATCH, None
+        if "status_code" in record:
+            return COMPLETED, record
+        if record["locked_until"] <= time.time():
+            cache.delete(cache_key)
+            return (CLAIMED, None) if cache.add(cache_key, claim, get_ttl().total_seconds()) else (IN_PROGRESS, None)
+        return IN_PROGRESS, None
+
+    def complete(self, user_id, endpoint, key, status_code, body, headers):
+        cache_key = self.cache_key(user_id, endpoint, key)
+        record = cache.get(cache_key) or {}
+        cache.set(cache_key, {
+            "fingerprint": record.get("fingerprint"),
+            "status_code": status_code,
+            "body": body,
+            "headers": headers,
+        }, get_ttl().total_seconds())
+
+    def release(self, user_id, endpoint, key):
+        cache.delete(self.cache_key(user_id, endpoint, key))
+
+    def purge_expired(self):
+        # The cache expires entries on its own
+        return 0
+
+
+STORES = {
+    "db": DatabaseIdempotencyStore,
+    "cache": CacheIdempotencyStore,
+}
+
+
+def get_store():
+    return STORES[getattr(settings, "IDEMPOTENCY_STORE", "db")]()
+
+
+def request_fingerprint(request):
+    """ Hash of the query string and payload; uploaded files count by name and size only. """
+    data = request.data
+    if hasattr(data, "lists"):
+        data = {name: values for name, values in data.lists()}
+    files = {name: [(f.name, f.size) for f in request.FILES.getlist(name)] for name in request.FILES}
+    canonical = json.dumps(
+        [sorted(request.query_params.lists()), data, files],
+        sort_keys=True, cls=DjangoJSONEncoder, default=str
+    )
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def error_response(message, status_code, headers=None):
+    return Response(
+        status=status_code,
+        headers=headers,
+        data={
+            KEY_MESSAGE: "error",
+            KEY_PAYLOAD: message,
+            KEY_STATUS: 0
+        },
+    )
+
+
+def idempotent(func):
+    @wraps(func)
+    def wrapper(view, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key or not request.user.is_authenticated:
+            return func(view, request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return error_response(f"{HEADER} must be at most {MAX_KEY_LENGTH} characters.", status.HTTP_400_BAD_REQUEST)
+
+        store = get_store()
+        user_id = request.user.id
+        endpoint = f"{request.method} {request.path}"[:255]
+        fingerprint = request_fingerprint(request)
+
+        # Wait for a concurrent request with the same key instead of racing it
+        deadline = time.monotonic() + getattr(settings, "IDEMPOTENCY_WAIT", 10)
+        delay = 0.05
+        state, record = store.claim(user_id, endpoint, key, fingerprint)
+        while state == IN_PROGRESS and time.monotonic() < deadline:
+            time.sleep(delay)
+            delay = min(delay * 2, 0.5)
+            state, record = store.claim(user_id, endpoint, key, fingerprint)
+
+        if state == MISMATCH:
+            return error_response(f"{HEADER} was already used with a different request.",
+                                  status.HTTP_422_UNPROCESSABLE_ENTITY)
+        if state == IN_PROGRESS:
+            return error_response(f"A request with this {HEADER} is still being processed.",
+                                  status.HTTP_409_CONFLICT, headers={"Retry-After": "1"})
+        if state == COMPLETED:
+            return Response(record["body"], status=record["status_code"],
+                            headers={**record["headers"], REPLAY_HEADER: "true"})
+
+        try:
+            response = func(view, request, *args, **kwargs)
+        except Exception:
+            store.release(user_id, endpoint, key)
+            raise
+        if response.status_code >= 500 or not hasattr(response, "data"):
+            store.release(user_id, endpoint, key)
+        else:
+            body = json.loads(json.dumps(response.data, cls=DjangoJSONEncoder))
+            headers = {name: response[name] for name in STORED_HEADERS if response.has_header(name)}
+            store.complete(user_id, endpoint, key, response.status_code, body, headers)
+        return response
+    return wrapper
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class FamilyConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'family'
+
+    # Called when the app is ready
+    def ready(self):
+        import family.signals
@@ -0,0 +1,84 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from family.models import FamilyMembership
+
+# ------------------------------------------------------------------------------
+# Cross-request cache for user -> memberships -> family -> role
+# ------------------------------------------------------------------------------
+# Entries live in Django's default cache for MEMBERSHIP_CACHE_TTL seconds.
+# family/signals.py drops them whenever a FamilyMembership, Family or Role
+# changes:
+#   - a membership change drops the entry of that membership's user
+#   - a family change drops the entries of the family's members
+#   - a role change bumps a generation number, which invalidates every entry
+#     at once without having to enumerate the users holding that role
+#
+# Revocation delay: the deletes only reach the cache of the process making the
+# change. With a shared cache (CACHE_URL or REDIS_URL, see settings) that is
+# every process, so a removed member loses access on their next request. With
+# the per-process locmem fallback, other processes keep serving the old entry
+# for up to MEMBERSHIP_CACHE_TTL seconds (30 by default there).
+# ------------------------------------------------------------------------------
+
+KEY_PREFIX = "family:memberships"
+ROLE_GENERATION_KEY = f"{KEY_PREFIX}:role-generation"
+
+stats = {"hits": 0, "misses": 0}
+
+
+def get_ttl():
+    return getattr(settings, "MEMBERSHIP_CACHE_TTL", 300)
+
+
+def user_key(user_id):
+    return f"{KEY_PREFIX}:user:{user_id}"
+
+
+def get_user_memberships(user):
+    """
+    Returns the user's FamilyMembership list, with family and role loaded,
+    from the cache when possible and from the database otherwise.
+    """
+    key = user_key(user.id)
+    cached = cache.get_many([key, ROLE_GENERATION_KEY])
+    generation = cached.get(ROLE_GENERATION_KEY, 0)
+    entry = cached.get(key)
+
+    if entry is not None and entry["role_generation"] == generation:
+        stats["hits"] += 1
+        memberships = entry["memberships"]
+    else:
+        stats["misses"] += 1
+        memberships = list(FamilyMembership.objects.select_related("family", "role").filter(user=user))
+        cache.set(key, {"role_generation": generation, "memberships": memberships}, get_ttl())
+
+    # Point the cached copies at the caller's user object rather than storing it in the cache
+    for membership in memberships:
+        membership.user = user
+    return memberships
+
+
+def invalidate_users(user_ids):
+    """ Drops the cached memberships of the given users once the current transaction commits. """
+    keys = [user_key(user_id) for user_id in user_ids]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def invalidate_family(family_id):
+    invalidate_users(FamilyMembership.objects.filter(family_id=family_id).values_list("user_id", flat=True))
+
+
+def invalidate_roles():
+    def bump():
+        # add() is a no-op when the key exists, so incr() always has something to increment
+        cache.add(ROLE_GENERATION_KEY, 0, None)
+        cache.incr(ROLE_GENERATION_KEY)
+    transaction.on_commit(bump)
+
+
+def get_stats():
+    """ Hit/miss counters of this process. """
+    lookups = stats["hits"] + stats["misses"]
+    return {**stats, "hit_rate": stats["hits"] / lookups if lookups else 0.0}
@@ -1,15 +1,74 @@
 from family.models import FamilyMembership
-from django.core.exceptions import ObjectDoesNotExist, MultipleObjectsReturned
+from family.cache import get_user_memberships
 
-def fetch_my_family_membership(user):
+class MembershipResolver:
     """
-    Fetch the FamilyMembership instance associated with the given user.
+    Loads a user's family memberships (with family and role) once, through the
+    cross-request membership cache, and answers every membership question from
+    memory afterwards.
+
+    Use get_membership_resolver(request) so that permissions, views and
+    serializers handling the same request share a single instance.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self._memberships = None
+
+    @property
+    def memberships(self):
+        if self._memberships is None:
+            if self.user and self.user.is_authenticated:
+                self._memberships = get_user_memberships(self.user)
+            else:
+                self._memberships = []
+        return self._memberships
+
+    @property
+    def membership(self):
+        """ The user's membership, or None. If there are several, the first created one. """
+        return self.memberships[-1] if self.memberships else None
+
+    @property
+    def membership_ids(self):
+        return [membership.id for membership in self.memberships]
+
+    @property
+    def family_ids(self):
+        return [membership.family_id for membership in self.memberships]
+
+    def owns_membership(self, membership_id):
+        return str(membership_id) in {str(pk) for pk in self.membership_ids}
+
+    def is_member_of(self, family_id):
+        return str(family_id) in {str(pk) for pk in self.family_ids}
+
+    def invalidate(self):
+        """ Forget loaded memberships, e.g. after the user joined a family. """
+        self._memberships = None
+
+
+def get_membership_resolver(request):
+    """
+    Returns the MembershipResolver attached to the request, creating it on first use.
+    """
+    resolver = getattr(request, "_membership_resolver", None)
+    if resolver is None or resolver.user is not request.user:
+        resolver = MembershipResolver(request.user)
+        request._membership_resolver = resolver
+    return resolver
+
+
+def fetch_my_family_membership(user, request=None):
+    """
+    Fetch the FamilyMembership ID associated with the given user.
 
     Args:
         user (User): The user instance for whom the membership is fetched.
+        request: Optional request; when given, its membership resolver is reused.
 
     Returns:
-        FamilyMembership instance if found, otherwise None.
+        FamilyMembership ID if found, otherwise None.
     """
 
     if not user:
@@ -17,20 +76,19 @@ def fetch_my_family_membership(user):
         return None
 
     try:
-        # Try to get single membership record
-        membership = FamilyMembership.objects.get(user=user)
-        return membership.id
-
-    except ObjectDoesNotExist:
-        print(f"No FamilyMembership found for user ID: {user.id}")
-        return None
+        if request is not None and request.user == user:
+            resolver = get_membership_resolver(request)
+        else:
+            resolver = MembershipResolver(user)
 
-    except MultipleObjectsReturned:
-        # Handle case where multiple memberships exist (shouldn’t happen normally)
-        print(f"Multiple FamilyMembership records found for user ID: {user.id}. Returning the first created one.")
-        return FamilyMembership.objects.filter(user=user).last().id
+        membership = resolver.membership
+        if membership is None:
+            print(f"No FamilyMembership found for user ID: {user.id}")
+            return None
+        return membership.id
 
     except Exception as e:
         # Catch any other unexpected issue
         print(f"Error fetching FamilyMembership for user ID {getattr(user, 'id', None)}: {e}")
         return None
+
@@ -1 +1,19 @@
+from django.dispatch import receiver
+from django.db.models.signals import post_save, post_delete
 from family.models import *
+from family import cache as membership_cache
+
+
+@receiver([post_save, post_delete], sender=FamilyMembership)
+def invalidate_membership_cache(sender, instance, **kwargs):
+    membership_cache.invalidate_users([instance.user_id])
+
+
+@receiver([post_save, post_delete], sender=Family)
+def invalidate_family_cache(sender, instance, **kwargs):
+    membership_cache.invalidate_family(instance.id)
+
+
+@receiver([post_save, post_delete], sender=Role)
+def invalidate_role_cache(sender, instance, **kwargs):
+    membership_cache.invalidate_roles()
@@ -19,15 +19,18 @@ from django.db.models import Q
 from datetime import datetime, timedelta, date
 from constants.response import KEY_MESSAGE, KEY_PAYLOAD, KEY_STATUS
 from constants.commons import handle_exceptions
+from constants.idempotency import idempotent
 from django.conf import settings
 from notification.scripts import *
 from family.serializers import *
+from family.scripts import get_membership_resolver
 
 
 class JoinFamilyAPIView(APIView):
     """Join or create a family"""
     permission_classes = [IsAuthenticated]
 
+    @idempotent
     @handle_exceptions
     def post(self, request):
         serializer = JoinFamilySerializer(data=request.data)
@@ -49,8 +52,8 @@ class JoinFamilyAPIView(APIView):
         family_name = serializer.validated_data.get("family_name", "").strip()
 
         # Check if user already belongs to a family
-        existing_membership = FamilyMembership.objects.filter(user=user).first()
-        if existing_membership:
+        resolver = get_membership_resolver(request)
+        if resolver.memberships:
             return Response(
                 status=status.HTTP_400_BAD_REQUEST,
                 data={
@@ -86,6 +89,7 @@ class JoinFamilyAPIView(APIView):
         membership = FamilyMembership.objects.create(user=user, family=family)
         membership.role = Role.objects.get(name="owner" if family_created else "member")
         membership.save()
+        resolver.invalidate()
 
         return Response(
             status=status.HTTP_200_OK,
@@ -101,9 +105,8 @@ class MyFamiliesAPIView(APIView):
 
 	@handle_exceptions
 	def get(self, request):
-		user = request.user
 		# Get all memberships of the current user
-		memberships = FamilyMembership.objects.select_related('family', 'role').filter(user=user)
+		memberships = get_membership_resolver(request).memberships
 		# Serialize memberships
 		serializer = FamilyMembershipSerializer(memberships, many=True)
 
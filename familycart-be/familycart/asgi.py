@@ -2,6 +2,8 @@
 ASGI config for familycart project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+HTTP requests go to Django as usual; WebSocket connections are routed to the
+Channels consumers (real-time grocery change events).
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
@@ -13,4 +15,14 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'familycart.settings.settings')
 
-application = get_asgi_application()
+# Initialize Django before importing anything that touches models
+django_asgi_app = get_asgi_application()
+
+from channels.routing import ProtocolTypeRouter, URLRouter
+from channels.security.websocket import AllowedHostsOriginValidator
+from grocery.routing import websocket_urlpatterns
+
+application = ProtocolTypeRouter({
+    'http': django_asgi_app,
+    'websocket': AllowedHostsOriginValidator(URLRouter(websocket_urlpatterns)),
+})
@@ -53,6 +53,7 @@ DJANGO_APPS = (
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 )
 
 THIRD_PARTY_APPS = (
@@ -63,6 +64,7 @@ THIRD_PARTY_APPS = (
     'rest_framework.authtoken',
     'rest_framework_simplejwt',
     'drf_yasg',
+    'channels',
 )
 
 LOCAL_APPS = (
@@ -72,7 +74,8 @@ LOCAL_APPS = (
     'notification'
     
 )
-INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
+# daphne must come first so runserver serves the ASGI application (HTTP + WebSocket)
+INSTALLED_APPS = ('daphne',) + DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 
 
 APP_NAME = env('APP_NAME')
@@ -126,6 +129,21 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 WSGI_APPLICATION = 'familycart.wsgi.application'
+ASGI_APPLICATION = 'familycart.asgi.application'
+
+# Channel layer for real-time push. The in-memory layer only reaches sockets of
+# the same process; set REDIS_URL to fan events out across processes.
+if env('REDIS_URL', default=None):
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {'hosts': [env('REDIS_URL')]},
+        },
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'},
+    }
 
 
 REST_FRAMEWORK = {
@@ -205,6 +223,27 @@ DATABASES = {
 
 
 
+# Cache
+# Shared between workers through CACHE_URL (e.g. redis://redis:6379/1), or else the
+# channel layer's REDIS_URL. Without either it is a per-process locmem cache, and
+# invalidations (memberships, item suggestions) only reach the process that made
+# them: the others serve their entries until the TTL runs out.
+CACHE_SHARED = bool(env('CACHE_URL', default=None) or env('REDIS_URL', default=None))
+CACHES = {
+    'default': env.cache('CACHE_URL', default=env('REDIS_URL', default='locmemcache://')),
+}
+# Bounds how long a removed member keeps access when the cache is not shared
+MEMBERSHIP_CACHE_TTL = env.int('MEMBERSHIP_CACHE_TTL', default=300 if CACHE_SHARED else 30)
+# In-process LRU of item-name suggestions (grocery/suggestions.py)
+SUGGESTION_CACHE_FAMILIES = env.int('SUGGESTION_CACHE_FAMILIES', default=256)
+SUGGESTION_CACHE_TTL = env.int('SUGGESTION_CACHE_TTL', default=300)
+# Idempotency-Key records (constants/idempotency.py): "db" or "cache"
+IDEMPOTENCY_STORE = env('IDEMPOTENCY_STORE', default='db')
+IDEMPOTENCY_TTL = env.int('IDEMPOTENCY_TTL', default=24 * 60 * 60)
+IDEMPOTENCY_LOCK_TIMEOUT = env.int('IDEMPOTENCY_LOCK_TIMEOUT', default=60)
+IDEMPOTENCY_WAIT = env.int('IDEMPOTENCY_WAIT', default=10)
+# Op-log merges reject client clocks further ahead of the server than this (seconds)
+OPLOG_MAX_CLOCK_DRIFT = env.int('OPLOG_MAX_CLOCK_DRIFT', default=300)
 
 STATICFILES_DIRS = (
     str(APPS_DIR.path('static')),
@@ -225,6 +264,16 @@ EMAIL_USE_SSL = False
 EMAIL_PORT = 587
 EMAIL_HOST_USER = env('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = env('EMAIL_HOST_PASSWORD')
+# Outgoing email queue (notification/queue.py), drained by the send_queued_emails worker
+EMAIL_QUEUE_MAX_ATTEMPTS = env.int('EMAIL_QUEUE_MAX_ATTEMPTS', default=6)
+# Seconds before the first retry, doubled per failed attempt up to EMAIL_QUEUE_MAX_RETRY_DELAY
+EMAIL_QUEUE_RETRY_DELAY = env.int('EMAIL_QUEUE_RETRY_DELAY', default=30)
+EMAIL_QUEUE_MAX_RETRY_DELAY = env.int('EMAIL_QUEUE_MAX_RETRY_DELAY', default=60 * 60)
+# Seconds a claimed email stays invisible to other workers
+EMAIL_QUEUE_LEASE = env.int('EMAIL_QUEUE_LEASE', default=5 * 60)
+EMAIL_QUEUE_POLL_INTERVAL = env.int('EMAIL_QUEUE_POLL_INTERVAL', default=5)
+# Sent and failed emails are deleted by purge_queued_emails after this many days
+EMAIL_QUEUE_RETENTION_DAYS = env.int('EMAIL_QUEUE_RETENTION_DAYS', default=7)
 
 
 
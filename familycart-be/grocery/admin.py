@@ -1,5 +1,8 @@
 from django.contrib import admin
 from grocery.models import *
+from grocery.scripts import delete_grocery_items, delete_grocery_list, recount_grocery_lists
+from grocery.suggestions import record_item_names
+from grocery.analytics import record_purchases, purchase_transition
 
 # ------------------------------------------------------------------------------
 # Admin Configuration for Model
@@ -20,13 +23,30 @@ class GroceryItemInline(admin.TabularInline):
 class GroceryListAdmin(admin.ModelAdmin):
     """Admin configuration for Grocery Lists."""
     list_display = ("id","name", "family_name", "created_by", "created_at", "updated_at")
-    search_fields = ("name", "family_membership__family__name", "family_membership__user__username")
-    list_filter = ("created_at", "updated_at")
+    search_fields = ("name", "family__name", "family_membership__user__username")
+    list_filter = ("is_template", "created_at", "updated_at")
     readonly_fields = ("created_at", "updated_at")
     inlines = [GroceryItemInline]
 
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # Inline item edits bypass the counter deltas and purchase rollups
+        recount_grocery_lists([form.instance.id])
+        record_purchases(
+            purchase_transition(inline_form.instance, inline_form.initial.get("purchased", False))
+            for formset in formsets for inline_form in formset.forms
+            if inline_form.instance.pk and "purchased" in inline_form.changed_data and inline_form not in formset.deleted_forms
+        )
+
+    def delete_model(self, request, obj):
+        delete_grocery_list(obj)
+
+    def delete_queryset(self, request, queryset):
+        for grocery_list in queryset:
+            delete_grocery_list(grocery_list)
+
     def family_name(self, obj):
-        return obj.family_membership.family.name
+        return obj.family.name
     family_name.short_description = "Family"
 
     def created_by(self, obj):
@@ -42,9 +62,44 @@ class GroceryItemAdmin(admin.ModelAdmin):
     list_filter = ("quantity_type", "purchased", "created_at")
     readonly_fields = ("created_at", "updated_at")
 
+    def save_model(self, request, obj, form, change):
+        previous_list_id = form.initial.get("grocery_list") if change else None
+        super().save_model(request, obj, form, change)
+        if not change:
+            record_item_names(obj.family_id, [obj])
+        record_purchases([purchase_transition(obj, form.initial.get("purchased", False) if change else False)])
+        recount_grocery_lists([obj.grocery_list_id] + ([previous_list_id] if previous_list_id else []))
+
+    def delete_model(self, request, obj):
+        delete_grocery_items(GroceryItem.objects.filter(id=obj.id))
+
+    def delete_queryset(self, request, queryset):
+        delete_grocery_items(queryset)
+
     def grocery_list_name(self, obj):
         return obj.grocery_list.name
     grocery_list_name.short_description = "Grocery List"
 
 
 admin.site.register(GroceryItem, GroceryItemAdmin)
+
+
+class GroceryUnitConversionAdmin(admin.ModelAdmin):
+    """Admin configuration for unit conversions of the consolidated shopping view."""
+    list_display = ("id", "normalized_name", "from_type", "factor", "to_type", "family")
+    search_fields = ("normalized_name", "family__name")
+    list_filter = ("from_type", "to_type")
+
+
+admin.site.register(GroceryUnitConversion, GroceryUnitConversionAdmin)
+
+
+class GroceryListRecurrenceAdmin(admin.ModelAdmin):
+    """Admin configuration for recurring template lists."""
+    list_display = ("id", "template", "frequency", "interval", "weekday", "day_of_month", "next_run_on", "last_run_on", "is_active")
+    search_fields = ("template__name", "family__name")
+    list_filter = ("frequency", "is_active")
+    readonly_fields = ("created_at", "updated_at")
+
+
+admin.site.register(GroceryListRecurrence, GroceryListRecurrenceAdmin)
@@ -0,0 +1,161 @@
+from datetime import timedelta
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from family.models import Family
+from grocery.suggestions import normalize_item_name
+
+# ------------------------------------------------------------------------------
+# Purchase rollups
+# ------------------------------------------------------------------------------
+# GroceryPurchaseRollup keeps, per (family, day, normalized name, quantity
+# type), the net number of items marked purchased that day and their quantity.
+# Every write path that flips GroceryItem.purchased calls record_purchases in
+# its transaction, next to its counter deltas: +1 when an item becomes
+# purchased (or is created purchased), -1 on the day it is un-marked. The
+# rollups are the purchase history: they outlive the items (deletes and
+# clear-purchased keep them), so they are never rebuilt from the items table.
+#
+# backfill_purchase_rollups only seeds families that have no rollup at all,
+# i.e. whose purchases all predate the rollups, from their purchased items
+# dated by updated_at (the closest the items keep to a purchase day). Imports
+# restore past state rather than record purchases; an import into such a
+# family is seeded like the rest of its history.
+#
+# Analytics read the rollups alone: a year of one family is at most a few
+# thousand rows of the (family, day, ...) unique index.
+# ------------------------------------------------------------------------------
+
+ROLLUP_BATCH_SIZE = 1000
+ANALYTICS_PERIODS = {"week": 12 * 7, "month": 366, "year": 5 * 366}
+ANALYTICS_MAX_RANGE_DAYS = 10 * 366
+ANALYTICS_TOP_ITEMS = 10
+
+UPSERT_SQL = """
+    INSERT INTO grocery_purchase_rollups (family_id, day, normalized_name, quantity_type, item_count, quantity)
+    VALUES {values}
+    ON CONFLICT (family_id, day, normalized_name, quantity_type) DO UPDATE SET
+        item_count = grocery_purchase_rollups.item_count + EXCLUDED.item_count,
+        quantity = grocery_purchase_rollups.quantity + EXCLUDED.quantity
+"""
+
+BACKFILL_SQL = """
+    INSERT INTO grocery_purchase_rollups (family_id, day, normalized_name, quantity_type, item_count, quantity)
+    SELECT family_id, (updated_at AT TIME ZONE %(tz)s)::date, lower(btrim(name)), quantity_type, COUNT(*), SUM(quantity)
+    FROM grocery_items
+    WHERE family_id >= %(first)s AND family_id < %(last)s AND purchased AND btrim(name) <> ''
+      AND NOT EXISTS (SELECT 1 FROM grocery_purchase_rollups r WHERE r.family_id = grocery_items.family_id)
+    GROUP BY 1, 2, 3, 4
+    ON CONFLICT (family_id, day, normalized_name, quantity_type) DO NOTHING
+"""
+
+PERIOD_SQL = """
+    SELECT date_trunc(%(period)s, day)::date AS period_start, quantity_type,
+           SUM(item_count) AS items, SUM(quantity) AS quantity
+    FROM grocery_purchase_rollups
+    WHERE family_id = ANY(%(family_ids)s) AND day >= %(start)s AND day <= %(end)s
+    GROUP BY 1, 2
+    ORDER BY 1, 2
+"""
+
+TOP_ITEMS_SQL = """
+    SELECT normalized_name, quantity_type, SUM(item_count) AS items, SUM(quantity) AS quantity
+    FROM grocery_purchase_rollups
+    WHERE family_id = ANY(%(family_ids)s) AND day >= %(start)s AND day <= %(end)s
+    GROUP BY 1, 2
+    HAVING SUM(item_count) > 0
+    ORDER BY 3 DESC, 1, 2
+    LIMIT %(limit)s
+"""
+
+
+def record_purchases(transitions):
+    """
+    Adds purchase transitions, (family_id, name, quantity, quantity_type, +1 or -1)
+    tuples, to today's rollups with one upsert. Must run inside the transaction
+    of the item write.
+    """
+    rollups = {}
+    for family_id, name, quantity, quantity_type, delta in transitions:
+        normalized_name = normalize_item_name(name)
+        if not delta or not normalized_name:
+            continue
+        key = (family_id, normalized_name, quantity_type)
+        item_count, total = rollups.get(key, (0, 0))
+        rollups[key] = (item_count + delta, total + delta * (quantity or 0))
+    if not rollups:
+        return
+
+    day = timezone.localdate()
+    params = []
+    # Sorted so concurrent upserts lock the rows in the same order
+    for key in sorted(rollups):
+        family_id, normalized_name, quantity_type = key
+        params += [family_id, day, normalized_name, quantity_type, *rollups[key]]
+    with connection.cursor() as cursor:
+        cursor.execute(UPSERT_SQL.format(values=", ".join(["(%s, %s, %s, %s, %s, %s)"] * len(rollups))), params)
+
+
+def purchase_transition(item, was_purchased):
+    """ The record_purchases tuple for item going from was_purchased to item.purchased. """
+    return (item.family_id, item.name, item.quantity, item.quantity_type, int(item.purchased) - int(was_purchased))
+
+
+def backfill_family_range(first_family_id, last_family_id):
+    """ Seeds the rollups of the families with first_family_id <= id < last_family_id that have none. """
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(BACKFILL_SQL, {"tz": settings.TIME_ZONE, "first": first_family_id, "last": last_family_id})
+            return cursor.rowcount
+
+
+def backfill_purchase_rollups(batch_size=ROLLUP_BATCH_SIZE):
+    """
+    Seeds the rollups of every family that has none, batch_size family ids per
+    transaction, with the aggregation done in the database so memory stays flat.
+    Families with rollups are left alone, so it can be rerun. Returns the rows written.
+    """
+    written = 0
+    first = Family.objects.order_by("id").values_list("id", flat=True).first()
+    while first is not None:
+        written += backfill_family_range(first, first + batch_size)
+        first = Family.objects.filter(id__gte=first + batch_size).order_by("id").values_list("id", flat=True).first()
+    return written
+
+
+def get_purchase_analytics(family_ids, period, start=None, end=None, limit=ANALYTICS_TOP_ITEMS):
+    """
+    Items bought and quantities per period ("week", "month" or "year") and
+    quantity type between start and end (inclusive; the default range ends
+    today), plus the most bought items of the range. Raises ValueError for an
+    invalid period or range.
+    """
+    if period not in ANALYTICS_PERIODS:
+        raise ValueError(f"period must be one of: {', '.join(ANALYTICS_PERIODS)}")
+    end = end or timezone.localdate()
+    start = start or end - timedelta(days=ANALYTICS_PERIODS[period])
+    if start > end:
+        raise ValueError("start must not be after end.")
+    if (end - start).days > ANALYTICS_MAX_RANGE_DAYS:
+        raise ValueError(f"The range can span at most {ANALYTICS_MAX_RANGE_DAYS} days.")
+
+    params = {"family_ids": list(family_ids), "period": period, "start": start, "end": end, "limit": limit}
+    with connection.cursor() as cursor:
+        cursor.execute(PERIOD_SQL, params)
+        periods = {}
+        for period_start, quantity_type, items, quantity in cursor.fetchall():
+            entry = periods.setdefault(period_start, {"start": period_start, "items": 0, "quantities": {}})
+            entry["items"] += items
+            entry["quantities"][quantity_type] = quantity
+        cursor.execute(TOP_ITEMS_SQL, params)
+        top_items = [
+            {"normalized_name": normalized_name, "quantity_type": quantity_type, "items": items, "quantity": quantity}
+            for normalized_name, quantity_type, items, quantity in cursor.fetchall()
+        ]
+    return {
+        "period": period,
+        "start": start,
+        "end": end,
+        "periods": list(periods.values()),
+        "top_items": top_items,
+    }
@@ -0,0 +1,108 @@
+import json
+import os
+import socket
+import time
+from threading import Lock
+from typing import NamedTuple
+from django.db import models
+from django.db.models import Func, Value
+
+# ------------------------------------------------------------------------------
+# Hybrid logical clocks
+# ------------------------------------------------------------------------------
+# A timestamp is "<wall clock ms>:<counter>:<node id>". Timestamps are ordered
+# as (wall, counter, node), which is consistent with causality, since each node
+# advances its clock past every timestamp it has seen, and stays close to real
+# time. Offline clients stamp their field edits with their own clock; the server
+# stamps the fields written by the regular endpoints with server_clock, so both
+# kinds of writes take part in the same last-writer-wins order per field
+# (GroceryItem.field_clocks, see grocery/oplog.py).
+# ------------------------------------------------------------------------------
+
+MAX_NODE_LENGTH = 64
+# GroceryItem fields whose writes are clocked in GroceryItem.field_clocks
+MERGEABLE_ITEM_FIELDS = ("name", "quantity", "quantity_type", "purchased", "note")
+
+
+class Timestamp(NamedTuple):
+    wall: int
+    counter: int
+    node: str
+
+    def __str__(self):
+        return f"{self.wall}:{self.counter}:{self.node}"
+
+
+def parse_timestamp(value):
+    """ Parses "<wall ms>:<counter>:<node>". Raises ValueError if it is malformed. """
+    try:
+        wall, counter, node = str(value).split(":", 2)
+        timestamp = Timestamp(int(wall), int(counter), node)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid clock {value!r}, expected '<wall ms>:<counter>:<node>'.")
+    if timestamp.wall < 0 or timestamp.counter < 0 or not node or len(node) > MAX_NODE_LENGTH:
+        raise ValueError(f"Invalid clock {value!r}.")
+    return timestamp
+
+
+def physical_time():
+    return int(time.time() * 1000)
+
+
+class HybridLogicalClock:
+    """ Clock of one node; now() stamps a local event, observe() merges a received timestamp. """
+
+    def __init__(self, node=None):
+        self.node = node
+        self.wall = 0
+        self.counter = 0
+        self.lock = Lock()
+
+    def node_id(self):
+        # Resolved per call so every worker process forked from one parent gets its own id
+        return self.node or f"server-{socket.gethostname()}-{os.getpid()}"[:MAX_NODE_LENGTH]
+
+    def now(self):
+        physical = physical_time()
+        with self.lock:
+            if physical > self.wall:
+                self.wall, self.counter = physical, 0
+            else:
+                self.counter += 1
+            return Timestamp(self.wall, self.counter, self.node_id())
+
+    def observe(self, timestamp):
+        physical = physical_time()
+        with self.lock:
+            wall = max(physical, self.wall, timestamp.wall)
+            if wall == self.wall == timestamp.wall:
+                self.counter = max(self.counter, timestamp.counter) + 1
+            elif wall == self.wall:
+                self.counter += 1
+            elif wall == timestamp.wall:
+                self.counter = timestamp.counter + 1
+            else:
+                self.counter = 0
+            self.wall = wall
+            return Timestamp(self.wall, self.counter, self.node_id())
+
+
+server_clock = HybridLogicalClock()
+
+
+class JSONBConcat(Func):
+    """ field || value for jsonb: merges value's keys into the stored object. """
+    arg_joiner = " || "
+    template = "(%(expressions)s)"
+    output_field = models.JSONField()
+
+
+def stamp_fields(fields, timestamp=None):
+    """ {field: timestamp} for the mergeable ones of fields, stamped now by the server clock by default. """
+    timestamp = str(timestamp or server_clock.now())
+    return {field: timestamp for field in fields if field in MERGEABLE_ITEM_FIELDS}
+
+
+def stamp_fields_expression(fields, timestamp=None):
+    """ UPDATE expression setting the clocks of fields in GroceryItem.field_clocks. """
+    return JSONBConcat("field_clocks", Value(json.dumps(stamp_fields(fields, timestamp))), output_field=models.JSONField())
@@ -0,0 +1,83 @@
+import asyncio
+from urllib.parse import parse_qs
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from family.cache import get_user_memberships
+from grocery.events import family_group_name
+
+# Events arriving within this many seconds of each other go out as one frame
+COALESCE_WINDOW = 0.25
+
+
+@database_sync_to_async
+def authenticate(raw_token):
+    """ Returns the user of a JWT access token, or None if it is not valid. """
+    authentication = JWTAuthentication()
+    try:
+        return authentication.get_user(authentication.get_validated_token(raw_token))
+    except (InvalidToken, TokenError):
+        return None
+
+
+@database_sync_to_async
+def fetch_family_ids(user):
+    return [membership.family_id for membership in get_user_memberships(user)]
+
+
+class GroceryEventsConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Streams grocery list/item change events for the user's families.
+    Connect with ws://<host>/ws/v1/grocery/events/?token=<access token>.
+
+    Frames look like {"type": "grocery.changes", "events": [...]}. Events of the
+    same type on the same list within COALESCE_WINDOW are merged into one event
+    carrying the union of their item ids.
+    """
+
+    async def connect(self):
+        query = parse_qs(self.scope.get("query_string", b"").decode())
+        token = (query.get("token") or [None])[0]
+        user = await authenticate(token) if token else None
+        if user is None:
+            await self.close(code=4401)
+            return
+
+        self.groups_joined = [family_group_name(family_id) for family_id in await fetch_family_ids(user)]
+        for group in self.groups_joined:
+            await self.channel_layer.group_add(group, self.channel_name)
+
+        self.pending = {}
+        self.flush_task = None
+        await self.accept()
+
+    async def disconnect(self, code):
+        for group in getattr(self, "groups_joined", []):
+            await self.channel_layer.group_discard(group, self.channel_name)
+        if getattr(self, "flush_task", None):
+            self.flush_task.cancel()
+
+    async def receive_json(self, content, **kwargs):
+        # The channel is push only; answer pings so clients can keep it alive
+        if content.get("type") == "ping":
+            await self.send_json({"type": "pong"})
+
+    async def grocery_event(self, message):
+        """ Handler for "grocery.event" messages sent by grocery.events.publish_grocery_event. """
+        event = message["event"]
+        key = (event["type"], event["grocery_list_id"])
+        if key in self.pending:
+            item_ids = self.pending[key]["item_ids"]
+            item_ids.extend(item_id for item_id in event["item_ids"] if item_id not in item_ids)
+        else:
+            self.pending[key] = {**event, "item_ids": list(event["item_ids"])}
+
+        if self.flush_task is None:
+            self.flush_task = asyncio.ensure_future(self.flush_later())
+
+    async def flush_later(self):
+        await asyncio.sleep(COALESCE_WINDOW)
+        events, self.pending, self.flush_task = list(self.pending.values()), {}, None
+        if events:
+            await self.send_json({"type": "grocery.changes", "events": events})
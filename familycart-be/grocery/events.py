@@ -0,0 +1,47 @@
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+
+# ------------------------------------------------------------------------------
+# Grocery change events
+# ------------------------------------------------------------------------------
+# Events only say *what* changed (type, list id, item ids), never the new data:
+# clients refresh through the sync / ETag endpoints. They are sent to the
+# family's channel-layer group once the surrounding transaction commits, and
+# GroceryEventsConsumer coalesces bursts before they reach the socket.
+# ------------------------------------------------------------------------------
+
+LIST_CREATED = "list.created"
+LIST_UPDATED = "list.updated"
+LIST_DELETED = "list.deleted"
+ITEMS_CREATED = "items.created"
+ITEMS_UPDATED = "items.updated"
+ITEMS_DELETED = "items.deleted"
+
+
+def family_group_name(family_id):
+    return f"grocery.family.{family_id}"
+
+
+def publish_grocery_event(family_id, event_type, grocery_list_id, item_ids=()):
+    """ Sends a change event to every socket of the family after the current transaction commits. """
+    event = {
+        "type": event_type,
+        "grocery_list_id": grocery_list_id,
+        "item_ids": list(item_ids),
+    }
+
+    def send():
+        channel_layer = get_channel_layer()
+        if channel_layer is None:
+            return
+        try:
+            async_to_sync(channel_layer.group_send)(
+                family_group_name(family_id),
+                {"type": "grocery.event", "event": event}
+            )
+        except Exception as e:
+            # Push is best effort; clients still converge through sync
+            print("Exception in publish_grocery_event -->", e)
+
+    transaction.on_commit(send)
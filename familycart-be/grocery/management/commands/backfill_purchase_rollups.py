@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand, CommandError
+from grocery.analytics import backfill_purchase_rollups, ROLLUP_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = ("Seeds the daily purchase rollups of families that have none from their purchased items. "
+            "Run it once after deploying; families with rollups are left untouched.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=ROLLUP_BATCH_SIZE,
+                            help="Family ids seeded per transaction.")
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be at least 1.")
+        written = backfill_purchase_rollups(options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} purchase rollup rows."))
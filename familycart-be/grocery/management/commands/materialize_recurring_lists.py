@@ -0,0 +1,22 @@
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from grocery.recurrence import materialize_due_recurrences, RECURRENCE_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = "Clones every due recurring template into a new grocery list. Run it periodically (e.g. hourly from cron)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=RECURRENCE_BATCH_SIZE,
+                            help="Recurrences materialized per transaction.")
+        parser.add_argument("--date", help="Materialize as of this day (YYYY-MM-DD) instead of today.")
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be at least 1.")
+        try:
+            today = date.fromisoformat(options["date"]) if options["date"] else None
+        except ValueError:
+            raise CommandError("--date must be YYYY-MM-DD.")
+        created = materialize_due_recurrences(today, options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Created {created} grocery lists from recurring templates."))
@@ -0,0 +1,22 @@
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from grocery.replenishment import predict_replenishment, REPLENISHMENT_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = "Recomputes when each family is next due to buy its usual items. Run it nightly (e.g. from cron)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=REPLENISHMENT_BATCH_SIZE,
+                            help="Family ids processed per query.")
+        parser.add_argument("--date", help="Predict as of this day (YYYY-MM-DD) instead of today.")
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be at least 1.")
+        try:
+            today = date.fromisoformat(options["date"]) if options["date"] else None
+        except ValueError:
+            raise CommandError("--date must be YYYY-MM-DD.")
+        written = predict_replenishment(options["batch_size"], today)
+        self.stdout.write(self.style.SUCCESS(f"Stored {written} replenishment predictions."))
@@ -0,0 +1,45 @@
+# Generated by Django 5.1.7 on 2026-10-18 17:56
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('family', '0002_alter_familymembership_user'),
+        ('grocery', '0003_remove_groceryitem_family_membership_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GroceryTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_type', models.CharField(choices=[('list', 'List'), ('item', 'Item')], max_length=10)),
+                ('object_id', models.BigIntegerField()),
+                ('object_uuid', models.UUIDField()),
+                ('grocery_list_id', models.BigIntegerField()),
+                ('family_membership_id', models.BigIntegerField()),
+                ('deleted_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'db_table': 'grocery_tombstones',
+                'ordering': ['deleted_at', 'id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='groceryitem',
+            index=models.Index(fields=['updated_at', 'id'], name='grocery_ite_updated_ea7c14_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='grocerylist',
+            index=models.Index(fields=['updated_at', 'id'], name='grocery_lis_updated_42d558_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='grocerytombstone',
+            index=models.Index(fields=['family_membership_id', 'deleted_at', 'id'], name='grocery_tom_family__939acd_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.1.7 on 2026-10-18 17:57
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('family', '0002_alter_familymembership_user'),
+        ('grocery', '0004_grocerytombstone'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='groceryitem',
+            index=models.Index(fields=['grocery_list', '-created_at', '-id'], name='grocery_ite_grocery_ced7fe_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='grocerylist',
+            index=models.Index(fields=['family_membership', '-created_at', '-id'], name='grocery_lis_family__447979_idx'),
+        ),
+    ]
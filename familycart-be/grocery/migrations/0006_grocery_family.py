@@ -0,0 +1,30 @@
+# Generated by Django 5.1.7 on 2026-10-18 17:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('family', '0002_alter_familymembership_user'),
+        ('grocery', '0005_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='groceryitem',
+            name='family',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='grocery_items', to='family.family'),
+        ),
+        migrations.AddField(
+            model_name='grocerylist',
+            name='family',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='grocery_lists', to='family.family'),
+        ),
+        migrations.AddField(
+            model_name='grocerytombstone',
+            name='family_id',
+            field=models.BigIntegerField(null=True),
+        ),
+    ]
@@ -0,0 +1,45 @@
+from django.db import migrations, transaction
+from django.db.models import OuterRef, Subquery
+
+BATCH_SIZE = 5000
+
+
+def backfill_in_batches(model, subquery):
+    """ Sets family_id from subquery on rows that miss it, one id range per transaction. """
+    last_id = model.objects.order_by("-id").values_list("id", flat=True).first()
+    if last_id is None:
+        return
+    for start in range(0, last_id + 1, BATCH_SIZE):
+        with transaction.atomic():
+            model.objects.filter(
+                id__gte=start, id__lt=start + BATCH_SIZE, family_id__isnull=True
+            ).update(family_id=subquery)
+
+
+def backfill_family(apps, schema_editor):
+    FamilyMembership = apps.get_model("family", "FamilyMembership")
+    GroceryList = apps.get_model("grocery", "GroceryList")
+    GroceryItem = apps.get_model("grocery", "GroceryItem")
+    GroceryTombstone = apps.get_model("grocery", "GroceryTombstone")
+
+    membership_family = Subquery(
+        FamilyMembership.objects.filter(id=OuterRef("family_membership_id")).values("family_id")[:1]
+    )
+    backfill_in_batches(GroceryList, membership_family)
+    backfill_in_batches(GroceryTombstone, membership_family)
+    backfill_in_batches(GroceryItem, Subquery(
+        GroceryList.objects.filter(id=OuterRef("grocery_list_id")).values("family_id")[:1]
+    ))
+
+
+class Migration(migrations.Migration):
+    # Each batch commits on its own so large tables are not locked for the whole run
+    atomic = False
+
+    dependencies = [
+        ('grocery', '0006_grocery_family'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_family, migrations.RunPython.noop),
+    ]
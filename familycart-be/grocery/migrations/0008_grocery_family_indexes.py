@@ -0,0 +1,59 @@
+# Generated by Django 5.1.7 on 2026-10-18 17:58
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('family', '0002_alter_familymembership_user'),
+        ('grocery', '0007_backfill_grocery_family'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='groceryitem',
+            name='grocery_ite_updated_ea7c14_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='grocerylist',
+            name='grocery_lis_updated_42d558_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='grocerylist',
+            name='grocery_lis_family__447979_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='grocerytombstone',
+            name='grocery_tom_family__939acd_idx',
+        ),
+        migrations.AlterField(
+            model_name='groceryitem',
+            name='family',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='grocery_items', to='family.family'),
+        ),
+        migrations.AlterField(
+            model_name='grocerylist',
+            name='family',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='grocery_lists', to='family.family'),
+        ),
+        migrations.AddIndex(
+            model_name='groceryitem',
+            index=models.Index(fields=['family', 'updated_at', 'id'], name='grocery_ite_family__ad082c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='grocerylist',
+            index=models.Index(fields=['family', 'updated_at', 'id'], name='grocery_lis_family__31816a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='grocerylist',
+            index=models.Index(fields=['family', '-created_at', '-id'], name='grocery_lis_family__252912_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='grocerytombstone',
+            index=models.Index(fields=['family_id', 'deleted_at', 'id'], name='grocery_tom_family__11b2cd_idx'),
+        ),
+    ]
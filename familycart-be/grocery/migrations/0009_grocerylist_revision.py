@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-18 18:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grocery', '0008_grocery_family_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='grocerylist',
+            name='revision',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
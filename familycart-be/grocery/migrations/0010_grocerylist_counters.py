@@ -0,0 +1,23 @@
+# Generated by Django 5.1.7 on 2026-10-18 18:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grocery', '0009_grocerylist_revision'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='grocerylist',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='grocerylist',
+            name='purchased_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
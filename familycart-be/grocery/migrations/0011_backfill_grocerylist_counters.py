@@ -0,0 +1,39 @@
+from django.db import migrations, transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+BATCH_SIZE = 2000
+
+
+def backfill_counters(apps, schema_editor):
+    GroceryList = apps.get_model("grocery", "GroceryList")
+    GroceryItem = apps.get_model("grocery", "GroceryItem")
+
+    def count_items(**filters):
+        counts = GroceryItem.objects.filter(grocery_list_id=OuterRef("id"), **filters).order_by().values(
+            "grocery_list_id"
+        ).annotate(total=Count("id")).values("total")
+        return Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+
+    last_id = GroceryList.objects.order_by("-id").values_list("id", flat=True).first()
+    if last_id is None:
+        return
+    for start in range(0, last_id + 1, BATCH_SIZE):
+        with transaction.atomic():
+            GroceryList.objects.filter(id__gte=start, id__lt=start + BATCH_SIZE).update(
+                item_count=count_items(),
+                purchased_count=count_items(purchased=True),
+            )
+
+
+class Migration(migrations.Migration):
+    # Each batch commits on its own so large tables are not locked for the whole run
+    atomic = False
+
+    dependencies = [
+        ('grocery', '0010_grocerylist_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.1.7 on 2026-10-18 18:11
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # The index is built concurrently so grocery_items stays writable meanwhile
+    atomic = False
+
+    dependencies = [
+        ('family', '0002_alter_familymembership_user'),
+        ('grocery', '0011_backfill_grocerylist_counters'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='groceryitem',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.SearchVector('name', config='english', weight='A'), '||', django.contrib.postgres.search.SearchVector(models.Func(models.F('note'), models.Value('<[^>]*>|&[#0-9a-zA-Z]+;'), models.Value(' '), models.Value('g'), function='regexp_replace', output_field=models.TextField()), config='english', weight='B'), django.contrib.postgres.search.SearchConfig('english')), name='grocery_items_search_idx'),
+        ),
+    ]
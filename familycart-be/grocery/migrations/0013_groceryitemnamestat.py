@@ -0,0 +1,34 @@
+# Generated by Django 5.1.7 on 2026-10-18 18:13
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('family', '0002_alter_familymembership_user'),
+        ('grocery', '0012_item_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GroceryItemNameStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('normalized_name', models.CharField(max_length=255)),
+                ('name', models.CharField(max_length=255)),
+                ('use_count', models.PositiveIntegerField(default=0)),
+                ('quantity', models.FloatField(default=1)),
+                ('quantity_type', models.CharField(choices=[('Gram', 'Gram'), ('Liter', 'Liter'), ('Count', 'Count')], default='Count', max_length=10)),
+                ('last_used_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('family', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='item_name_stats', to='family.family')),
+            ],
+            options={
+                'db_table': 'grocery_item_name_stats',
+                'indexes': [models.Index(fields=['family', 'normalized_name'], name='grocery_item_name_prefix_idx', opclasses=['int8_ops', 'varchar_pattern_ops'])],
+                'constraints': [models.UniqueConstraint(fields=('family', 'normalized_name'), name='grocery_item_name_stats_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,48 @@
+from django.db import migrations, transaction
+
+BATCH_SIZE = 500
+
+# Mirrors grocery.suggestions: names are stripped and lower-cased; the latest
+# item of a name provides its display name, quantity and quantity type
+BACKFILL_SQL = """
+    INSERT INTO grocery_item_name_stats
+        (family_id, normalized_name, name, use_count, quantity, quantity_type, last_used_at)
+    SELECT family_id, normalized_name,
+           (array_agg(btrim(name) ORDER BY created_at DESC, id DESC))[1],
+           count(*),
+           (array_agg(quantity ORDER BY created_at DESC, id DESC))[1],
+           (array_agg(quantity_type ORDER BY created_at DESC, id DESC))[1],
+           max(created_at)
+    FROM (
+        SELECT id, family_id, name, quantity, quantity_type, created_at, lower(btrim(name)) AS normalized_name
+        FROM grocery_items
+        WHERE family_id >= %s AND family_id < %s
+    ) AS items
+    WHERE normalized_name <> ''
+    GROUP BY family_id, normalized_name
+    ON CONFLICT (family_id, normalized_name) DO NOTHING
+"""
+
+
+def backfill_name_stats(apps, schema_editor):
+    """ Aggregates existing items into name statistics, one family id range per transaction. """
+    Family = apps.get_model("family", "Family")
+    last_id = Family.objects.order_by("-id").values_list("id", flat=True).first()
+    if last_id is None:
+        return
+    for start in range(0, last_id + 1, BATCH_SIZE):
+        with transaction.atomic(), schema_editor.connection.cursor() as cursor:
+            cursor.execute(BACKFILL_SQL, [start, start + BATCH_SIZE])
+
+
+class Migration(migrations.Migration):
+    # Each batch commits on its own so large tables are not locked for the whole run
+    atomic = False
+
+    dependencies = [
+        ('grocery', '0013_groceryitemnamestat'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_name_stats, migrations.RunPython.noop),
+    ]
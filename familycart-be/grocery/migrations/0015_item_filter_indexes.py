@@ -0,0 +1,50 @@
+# Generated by Django 5.1.7 on 2026-10-18 18:17
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently, RemoveIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Indexes are built and dropped concurrently so grocery_items stays writable meanwhile
+    atomic = False
+
+    dependencies = [
+        ('family', '0002_alter_familymembership_user'),
+        ('grocery', '0014_backfill_groceryitemnamestat'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='groceryitem',
+            index=models.Index(fields=['grocery_list', 'purchased', '-created_at', '-id'], name='grocery_ite_grocery_0b4142_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='groceryitem',
+            index=models.Index(fields=['grocery_list', 'quantity_type', '-created_at', '-id'], name='grocery_ite_grocery_db6936_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='groceryitem',
+            index=models.Index(fields=['grocery_list', 'name', 'id'], name='grocery_ite_grocery_96b864_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='groceryitem',
+            index=models.Index(fields=['grocery_list', 'updated_at', 'id'], name='grocery_ite_grocery_9704e8_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='groceryitem',
+            index=models.Index(models.F('grocery_list'), django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('name'), name='text_pattern_ops'), name='grocery_items_name_prefix_idx'),
+        ),
+        # Dropped only once the composite indexes replacing them exist
+        RemoveIndexConcurrently(
+            model_name='groceryitem',
+            name='grocery_ite_purchas_b91c38_idx',
+        ),
+        RemoveIndexConcurrently(
+            model_name='groceryitem',
+            name='grocery_ite_quantit_73a9ae_idx',
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.7 on 2026-10-18 18:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grocery', '0015_item_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='groceryitem',
+            name='version',
+            field=models.PositiveIntegerField(db_default=1, default=1),
+        ),
+        migrations.AddField(
+            model_name='grocerylist',
+            name='version',
+            field=models.PositiveIntegerField(db_default=1, default=1),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.7 on 2026-10-18 18:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grocery', '0016_item_list_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='groceryitem',
+            name='field_clocks',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='grocerytombstone',
+            name='hlc',
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+        migrations.AddField(
+            model_name='grocerytombstone',
+            name='snapshot',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.7 on 2026-10-18 18:40
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Built concurrently so grocery_items and grocery_tombstones stay writable meanwhile
+    atomic = False
+
+    dependencies = [
+        ('family', '0002_alter_familymembership_user'),
+        ('grocery', '0017_field_clocks'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='groceryitem',
+            index=models.Index(fields=['uuid'], name='grocery_items_uuid_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='grocerytombstone',
+            index=models.Index(fields=['object_uuid'], name='grocery_tombstones_uuid_idx'),
+        ),
+    ]
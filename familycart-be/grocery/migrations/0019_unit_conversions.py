@@ -0,0 +1,47 @@
+# Generated by Django 5.1.7 on 2026-10-18 19:13
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('family', '0002_alter_familymembership_user'),
+        ('grocery', '0018_uuid_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GroceryUnitConversion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('normalized_name', models.CharField(blank=True, default='', max_length=255)),
+                ('from_type', models.CharField(choices=[('Gram', 'Gram'), ('Liter', 'Liter'), ('Count', 'Count')], max_length=10)),
+                ('to_type', models.CharField(choices=[('Gram', 'Gram'), ('Liter', 'Liter'), ('Count', 'Count')], max_length=10)),
+                ('factor', models.FloatField()),
+            ],
+            options={
+                'db_table': 'grocery_unit_conversions',
+            },
+        ),
+        migrations.AddField(
+            model_name='groceryunitconversion',
+            name='family',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='unit_conversions', to='family.family'),
+        ),
+        migrations.AddConstraint(
+            model_name='groceryunitconversion',
+            constraint=models.UniqueConstraint(fields=('family', 'normalized_name', 'from_type'), name='grocery_unit_conversions_unique', nulls_distinct=False),
+        ),
+        migrations.AddConstraint(
+            model_name='groceryunitconversion',
+            constraint=models.CheckConstraint(condition=models.Q(('from_type', models.F('to_type')), _negated=True), name='grocery_unit_conversions_types'),
+        ),
+        migrations.AddConstraint(
+            model_name='groceryunitconversion',
+            constraint=models.CheckConstraint(condition=models.Q(('factor__gt', 0)), name='grocery_unit_conversions_factor'),
+        ),
+    ]
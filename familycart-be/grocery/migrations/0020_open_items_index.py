@@ -0,0 +1,20 @@
+# Generated by Django 5.1.7 on 2026-10-18 19:13
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Built concurrently so grocery_items stays writable meanwhile
+    atomic = False
+
+    dependencies = [
+        ('grocery', '0019_unit_conversions'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='groceryitem',
+            index=models.Index(condition=models.Q(('purchased', False)), fields=['family', 'quantity_type'], name='grocery_items_open_family_idx'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.1.7 on 2026-10-18 19:15
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('family', '0002_alter_familymembership_user'),
+        ('grocery', '0020_open_items_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='grocerylist',
+            name='is_template',
+            field=models.BooleanField(db_default=False, default=False),
+        ),
+        migrations.CreateModel(
+            name='GroceryListRecurrence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('frequency', models.CharField(choices=[('daily', 'Daily'), ('weekly', 'Weekly'), ('monthly', 'Monthly')], default='weekly', max_length=10)),
+                ('interval', models.PositiveSmallIntegerField(default=1)),
+                ('weekday', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('day_of_month', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('next_run_on', models.DateField()),
+                ('last_run_on', models.DateField(blank=True, null=True)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='grocery_list_recurrences', to=settings.AUTH_USER_MODEL)),
+                ('family', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='grocery_list_recurrences', to='family.family')),
+                ('template', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='recurrence', to='grocery.grocerylist')),
+            ],
+            options={
+                'db_table': 'grocery_list_recurrences',
+                'indexes': [models.Index(condition=models.Q(('is_active', True)), fields=['next_run_on', 'id'], name='grocery_recurrences_due_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.1.7 on 2026-10-18 19:18
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('family', '0002_alter_familymembership_user'),
+        ('grocery', '0021_list_templates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GroceryReplenishment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('normalized_name', models.CharField(max_length=255)),
+                ('name', models.CharField(max_length=255)),
+                ('quantity', models.FloatField(default=1)),
+                ('quantity_type', models.CharField(choices=[('Gram', 'Gram'), ('Liter', 'Liter'), ('Count', 'Count')], default='Count', max_length=10)),
+                ('purchase_count', models.PositiveIntegerField()),
+                ('interval_days', models.FloatField()),
+                ('interval_stddev_days', models.FloatField()),
+                ('last_purchased_on', models.DateField()),
+                ('next_due_on', models.DateField()),
+                ('computed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('family', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='grocery_replenishments', to='family.family')),
+            ],
+            options={
+                'db_table': 'grocery_replenishments',
+                'indexes': [models.Index(fields=['family', 'next_due_on'], name='grocery_replenishments_due_idx')],
+                'constraints': [models.UniqueConstraint(fields=('family', 'normalized_name'), name='grocery_replenishments_unique')],
+            },
+        ),
+    ]
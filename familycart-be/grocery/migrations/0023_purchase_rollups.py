@@ -0,0 +1,31 @@
+# Generated by Django 5.1.7 on 2026-10-18 19:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('family', '0002_alter_familymembership_user'),
+        ('grocery', '0022_replenishments'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GroceryPurchaseRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('normalized_name', models.CharField(max_length=255)),
+                ('quantity_type', models.CharField(choices=[('Gram', 'Gram'), ('Liter', 'Liter'), ('Count', 'Count')], default='Count', max_length=10)),
+                ('item_count', models.IntegerField(default=0)),
+                ('quantity', models.FloatField(default=0)),
+                ('family', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='grocery_purchase_rollups', to='family.family')),
+            ],
+            options={
+                'db_table': 'grocery_purchase_rollups',
+                'constraints': [models.UniqueConstraint(fields=('family', 'day', 'normalized_name', 'quantity_type'), name='grocery_purchase_rollups_unique')],
+            },
+        ),
+    ]
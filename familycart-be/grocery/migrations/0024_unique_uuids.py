@@ -0,0 +1,63 @@
+# Generated by Django 5.1.7 on 2026-10-18 19:36
+
+from django.conf import settings
+from django.contrib.postgres.operations import RemoveIndexConcurrently
+from django.db import migrations, models
+
+
+# Imports used to copy the dump's uuids, so a family may hold the same uuid
+# twice: every copy but the oldest gets a new one before the unique indexes are built
+DEDUPLICATE_SQL = """
+    UPDATE {table} SET uuid = gen_random_uuid()
+    WHERE id IN (
+        SELECT id FROM (
+            SELECT id, row_number() OVER (PARTITION BY family_id, uuid ORDER BY id) AS copy
+            FROM {table}
+        ) copies
+        WHERE copy > 1
+    )
+"""
+
+
+def unique_uuid_constraint(model_name, table, name):
+    """ AddConstraint whose unique index is built concurrently, then attached to the table. """
+    return migrations.SeparateDatabaseAndState(
+        database_operations=[
+            migrations.RunSQL(DEDUPLICATE_SQL.format(table=table), migrations.RunSQL.noop),
+            migrations.RunSQL(
+                f"CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} (family_id, uuid)",
+                f"DROP INDEX CONCURRENTLY IF EXISTS {name}",
+            ),
+            migrations.RunSQL(
+                f"ALTER TABLE {table} ADD CONSTRAINT {name} UNIQUE USING INDEX {name}",
+                f"ALTER TABLE {table} DROP CONSTRAINT {name}",
+            ),
+        ],
+        state_operations=[
+            migrations.AddConstraint(
+                model_name=model_name,
+                constraint=models.UniqueConstraint(fields=('family', 'uuid'), name=name),
+            ),
+        ],
+    )
+
+
+class Migration(migrations.Migration):
+    # Built concurrently so grocery_items and grocery_lists stay writable meanwhile
+    atomic = False
+
+    dependencies = [
+        ('family', '0002_alter_familymembership_user'),
+        ('grocery', '0023_purchase_rollups'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        unique_uuid_constraint('grocerylist', 'grocery_lists', 'grocery_lists_family_uuid_uniq'),
+        unique_uuid_constraint('groceryitem', 'grocery_items', 'grocery_items_family_uuid_uniq'),
+        # Superseded by grocery_items_family_uuid_uniq
+        RemoveIndexConcurrently(
+            model_name='groceryitem',
+            name='grocery_items_uuid_idx',
+        ),
+    ]
@@ -1,33 +1,82 @@
 from django.db import models
+from django.db.models import F, Func, Q, Value
+from django.db.models.functions import Upper
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVector
 from ckeditor.fields import RichTextField
 import string
 import uuid
 from django.utils import timezone
 from django.conf import settings
-from family.models import FamilyMembership
+from family.models import Family, FamilyMembership
 
 
 
 
+# Text search configuration used by the item search index and its queries
+SEARCH_CONFIG = "english"
+
+
+def grocery_item_search_vector():
+    """
+    tsvector of an item: its name (weight A) and the plain text of its rich-text
+    note (weight B, HTML tags and entities stripped). The GIN index on
+    grocery_items is built on this exact expression, so queries must use it too.
+    """
+    note_text = Func(F("note"), Value(r"<[^>]*>|&[#0-9a-zA-Z]+;"), Value(" "), Value("g"),
+                     function="regexp_replace", output_field=models.TextField())
+    return (SearchVector("name", weight="A", config=SEARCH_CONFIG)
+            + SearchVector(note_text, weight="B", config=SEARCH_CONFIG))
+
+
 class GroceryList(models.Model):
     """Represents a single grocery list"""
     uuid = models.UUIDField(default=uuid.uuid4, editable=False)
     family_membership = models.ForeignKey(FamilyMembership, on_delete=models.CASCADE, related_name="grocery_lists")
+    # Denormalized from family_membership so authorization filters need no joins
+    family = models.ForeignKey(Family, on_delete=models.CASCADE, db_index=False, related_name="grocery_lists")
     name = models.CharField(max_length=255, null=False, blank=False, db_index=True)
     created_by = models.ForeignKey(settings.AUTH_USER_MODEL,on_delete=models.SET_NULL,null=True,blank=True,related_name="list_created_by")
     description = RichTextField(blank=True, null=True)
+    # Bumped on every write to the list or to any of its items; drives the ETag
+    revision = models.PositiveBigIntegerField(default=0)
+    # Bumped on every write to the list's own fields; optimistic concurrency token (If-Match)
+    version = models.PositiveIntegerField(default=1, db_default=1)
+    # Materialized counters, maintained transactionally by every item write
+    item_count = models.PositiveIntegerField(default=0)
+    purchased_count = models.PositiveIntegerField(default=0)
+    # Templates are cloned into new lists (grocery/recurrence.py) and are not shopped from themselves
+    is_template = models.BooleanField(default=False, db_default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         db_table = "grocery_lists"
         ordering = ["-created_at"]
+        constraints = [
+            models.UniqueConstraint(fields=["family", "uuid"], name="grocery_lists_family_uuid_uniq"),
+        ]
         indexes = [
             models.Index(fields=["name"]),
+            models.Index(fields=["family", "updated_at", "id"]),
+            models.Index(fields=["family", "-created_at", "-id"]),
         ]
 
+    def save(self, *args, **kwargs):
+        if self.family_id is None and self.family_membership_id:
+            self.family_id = FamilyMembership.objects.values_list("family_id", flat=True).get(id=self.family_membership_id)
+        # Every save of an existing list bumps its version
+        updating = not self._state.adding
+        if updating:
+            self.version = F("version") + 1
+            if kwargs.get("update_fields") is not None:
+                kwargs["update_fields"] = {*kwargs["update_fields"], "version"}
+        super(GroceryList, self).save(*args, **kwargs)
+        if updating:
+            self.refresh_from_db(fields=["version"])
+
     def __str__(self):
-        return f"{self.name} ({self.family_membership.family.name})"
+        return f"{self.name} ({self.family.name})"
 
 class GroceryItem(models.Model):
 	class QuantityType(models.TextChoices):
@@ -37,10 +86,16 @@ class GroceryItem(models.Model):
 
 	uuid = models.UUIDField(default=uuid.uuid4, editable=False)
 	grocery_list = models.ForeignKey(GroceryList, on_delete=models.CASCADE, null=False, blank=False, related_name="items")
+	# Denormalized from grocery_list so authorization filters need no joins
+	family = models.ForeignKey(Family, on_delete=models.CASCADE, db_index=False, related_name="grocery_items")
 	name = models.CharField(max_length=255, null=False, blank=False, db_index=True)
 	quantity = models.FloatField(default=1)
 	quantity_type = models.CharField(max_length=10,choices=QuantityType.choices,default=QuantityType.COUNT)
 	purchased = models.BooleanField(default=False)
+	# Bumped on every write to the item; optimistic concurrency token (If-Match)
+	version = models.PositiveIntegerField(default=1, db_default=1)
+	# Hybrid logical clock of the last write to each mergeable field (grocery/oplog.py)
+	field_clocks = models.JSONField(default=dict, blank=True)
 	created_by = models.ForeignKey(settings.AUTH_USER_MODEL,on_delete=models.SET_NULL,null=True,blank=True,related_name="created_by")
 	# price = models.DecimalField(max_digits=10, decimal_places=2, default=0.00, null=False, blank=False)
 	note = RichTextField(blank=True, null=True)
@@ -50,11 +105,226 @@ class GroceryItem(models.Model):
 	class Meta:
 		db_table = "grocery_items"
 		ordering = ["-created_at"]
+		constraints = [
+		    # Op-log merges address items by uuid within the caller's family
+		    models.UniqueConstraint(fields=["family", "uuid"], name="grocery_items_family_uuid_uniq"),
+		]
 		indexes = [
 		    models.Index(fields=["name"]),
-		    models.Index(fields=["purchased"]),
-		    models.Index(fields=["quantity_type"]),
+		    models.Index(fields=["family", "updated_at", "id"]),
+		    models.Index(fields=["grocery_list", "-created_at", "-id"]),
+		    # Filter / sort shapes of GroceryItemAPIView.get (grocery.scripts.filter_grocery_items)
+		    models.Index(fields=["grocery_list", "purchased", "-created_at", "-id"]),
+		    models.Index(fields=["grocery_list", "quantity_type", "-created_at", "-id"]),
+		    models.Index(fields=["grocery_list", "name", "id"]),
+		    models.Index(fields=["grocery_list", "updated_at", "id"]),
+		    models.Index(F("grocery_list"), OpClass(Upper("name"), name="text_pattern_ops"),
+		                 name="grocery_items_name_prefix_idx"),
+		    # Expression index for search_grocery_items
+		    GinIndex(grocery_item_search_vector(), name="grocery_items_search_idx"),
+		    # Unpurchased items of a family, for consolidate_grocery_items
+		    models.Index(fields=["family", "quantity_type"], condition=Q(purchased=False),
+		                 name="grocery_items_open_family_idx"),
+		]
+
+	def save(self, *args, **kwargs):
+		if self.family_id is None and self.grocery_list_id:
+			self.family_id = self.grocery_list.family_id
+		# Every save of an existing item bumps its version
+		updating = not self._state.adding
+		if updating:
+			self.version = F("version") + 1
+			if kwargs.get("update_fields") is not None:
+				kwargs["update_fields"] = {*kwargs["update_fields"], "version"}
+		super(GroceryItem, self).save(*args, **kwargs)
+		if updating:
+			self.refresh_from_db(fields=["version"])
+
+	def __str__(self):
+		return f"{self.name} ({self.quantity} {self.quantity_type})"
+
+class GroceryTombstone(models.Model):
+	"""Records a deleted GroceryList/GroceryItem so delta-sync clients can drop it"""
+	class ObjectType(models.TextChoices):
+	    LIST = "list", "List"
+	    ITEM = "item", "Item"
+
+	object_type = models.CharField(max_length=10, choices=ObjectType.choices)
+	object_id = models.BigIntegerField()
+	object_uuid = models.UUIDField()
+	grocery_list_id = models.BigIntegerField()
+	family_membership_id = models.BigIntegerField()
+	family_id = models.BigIntegerField(null=True)
+	deleted_at = models.DateTimeField(default=timezone.now)
+	# Items only: clock of the removal and the item as it was, so that a
+	# concurrent offline edit can bring it back (add-wins, see grocery/oplog.py)
+	hlc = models.CharField(max_length=100, null=True, blank=True)
+	snapshot = models.JSONField(null=True, blank=True)
+
+	class Meta:
+		db_table = "grocery_tombstones"
+		ordering = ["deleted_at", "id"]
+		indexes = [
+		    models.Index(fields=["family_id", "deleted_at", "id"]),
+		    models.Index(fields=["object_uuid"], name="grocery_tombstones_uuid_idx"),
+		]
+
+	def __str__(self):
+		return f"{self.object_type} {self.object_id} deleted at {self.deleted_at}"
+
+class GroceryItemNameStat(models.Model):
+	"""
+	How often a family has added an item of a given (normalized) name, with the
+	display name, quantity and quantity type of its latest use. Maintained by
+	grocery.suggestions.record_item_names whenever items are created.
+	"""
+	family = models.ForeignKey(Family, on_delete=models.CASCADE, db_index=False, related_name="item_name_stats")
+	normalized_name = models.CharField(max_length=255)
+	name = models.CharField(max_length=255)
+	use_count = models.PositiveIntegerField(default=0)
+	quantity = models.FloatField(default=1)
+	quantity_type = models.CharField(max_length=10, choices=GroceryItem.QuantityType.choices, default=GroceryItem.QuantityType.COUNT)
+	last_used_at = models.DateTimeField(default=timezone.now)
+
+	class Meta:
+		db_table = "grocery_item_name_stats"
+		constraints = [
+		    models.UniqueConstraint(fields=["family", "normalized_name"], name="grocery_item_name_stats_unique"),
+		]
+		indexes = [
+		    # Pattern opclass so "normalized_name LIKE 'prefix%'" can seek in any collation
+		    models.Index(fields=["family", "normalized_name"], opclasses=["int8_ops", "varchar_pattern_ops"],
+		                 name="grocery_item_name_prefix_idx"),
+		]
+
+	def __str__(self):
+		return f"{self.name} x{self.use_count} ({self.family_id})"
+
+class GroceryUnitConversion(models.Model):
+	"""
+	1 from_type of an item = factor to_type, e.g. eggs: 1 Count = 60 Gram. Rows
+	without a family apply to every family, rows without a name to every item.
+	Used by grocery.scripts.consolidate_grocery_items to add up quantities of
+	the same item recorded in different units.
+	"""
+	family = models.ForeignKey(Family, on_delete=models.CASCADE, null=True, blank=True, db_index=False, related_name="unit_conversions")
+	normalized_name = models.CharField(max_length=255, blank=True, default="")
+	from_type = models.CharField(max_length=10, choices=GroceryItem.QuantityType.choices)
+	to_type = models.CharField(max_length=10, choices=GroceryItem.QuantityType.choices)
+	factor = models.FloatField()
+
+	class Meta:
+		db_table = "grocery_unit_conversions"
+		constraints = [
+		    models.UniqueConstraint(fields=["family", "normalized_name", "from_type"], nulls_distinct=False,
+		                            name="grocery_unit_conversions_unique"),
+		    models.CheckConstraint(condition=~Q(from_type=F("to_type")), name="grocery_unit_conversions_types"),
+		    models.CheckConstraint(condition=Q(factor__gt=0), name="grocery_unit_conversions_factor"),
+		]
+
+	def save(self, *args, **kwargs):
+		self.normalized_name = (self.normalized_name or "").strip().lower()
+		super(GroceryUnitConversion, self).save(*args, **kwargs)
+
+	def __str__(self):
+		return f"{self.normalized_name or '*'}: 1 {self.from_type} = {self.factor} {self.to_type}"
+
+class GroceryListRecurrence(models.Model):
+	"""
+	Schedule on which a template list is cloned into a new list, e.g. weekly on
+	Saturday. Materialized by the materialize_recurring_lists command
+	(grocery/recurrence.py), which moves next_run_on forward.
+	"""
+	class Frequency(models.TextChoices):
+	    DAILY = "daily", "Daily"
+	    WEEKLY = "weekly", "Weekly"
+	    MONTHLY = "monthly", "Monthly"
+
+	template = models.OneToOneField(GroceryList, on_delete=models.CASCADE, related_name="recurrence")
+	# Denormalized from template so authorization filters need no joins
+	family = models.ForeignKey(Family, on_delete=models.CASCADE, db_index=False, related_name="grocery_list_recurrences")
+	frequency = models.CharField(max_length=10, choices=Frequency.choices, default=Frequency.WEEKLY)
+	# Every <interval> days / weeks / months
+	interval = models.PositiveSmallIntegerField(default=1)
+	# Weekly: 0 (Monday) to 6 (Sunday); monthly: 1 to 31, the last day of shorter months
+	weekday = models.PositiveSmallIntegerField(null=True, blank=True)
+	day_of_month = models.PositiveSmallIntegerField(null=True, blank=True)
+	next_run_on = models.DateField()
+	last_run_on = models.DateField(null=True, blank=True)
+	is_active = models.BooleanField(default=True)
+	created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name="grocery_list_recurrences")
+	created_at = models.DateTimeField(auto_now_add=True)
+	updated_at = models.DateTimeField(auto_now=True)
+
+	class Meta:
+		db_table = "grocery_list_recurrences"
+		indexes = [
+		    # Due recurrences, in the order materialize_due_recurrences walks them
+		    models.Index(fields=["next_run_on", "id"], condition=Q(is_active=True),
+		                 name="grocery_recurrences_due_idx"),
+		]
+
+	def save(self, *args, **kwargs):
+		if self.family_id is None and self.template_id:
+			self.family_id = self.template.family_id
+		super(GroceryListRecurrence, self).save(*args, **kwargs)
+
+	def __str__(self):
+		return f"{self.template_id} {self.frequency} (next {self.next_run_on})"
+
+class GroceryReplenishment(models.Model):
+	"""
+	How often a family buys an item (by normalized name) and when it is next due,
+	estimated from the intervals between its purchase days in the purchase rollups.
+	Recomputed in batches by the predict_replenishment command
+	(grocery/replenishment.py).
+	"""
+	family = models.ForeignKey(Family, on_delete=models.CASCADE, db_index=False, related_name="grocery_replenishments")
+	normalized_name = models.CharField(max_length=255)
+	# Display name, quantity and quantity type of the latest purchase
+	name = models.CharField(max_length=255)
+	quantity = models.FloatField(default=1)
+	quantity_type = models.CharField(max_length=10, choices=GroceryItem.QuantityType.choices, default=GroceryItem.QuantityType.COUNT)
+	purchase_count = models.PositiveIntegerField()
+	interval_days = models.FloatField()
+	interval_stddev_days = models.FloatField()
+	last_purchased_on = models.DateField()
+	next_due_on = models.DateField()
+	computed_at = models.DateTimeField(default=timezone.now)
+
+	class Meta:
+		db_table = "grocery_replenishments"
+		constraints = [
+		    models.UniqueConstraint(fields=["family", "normalized_name"], name="grocery_replenishments_unique"),
+		]
+		indexes = [
+		    models.Index(fields=["family", "next_due_on"], name="grocery_replenishments_due_idx"),
+		]
+
+	def __str__(self):
+		return f"{self.name} every {self.interval_days:.1f} days, next {self.next_due_on} ({self.family_id})"
+
+class GroceryPurchaseRollup(models.Model):
+	"""
+	Net number of items, and their total quantity, a family marked purchased on a
+	day, per normalized name and quantity type. Maintained by
+	grocery.analytics.record_purchases in the transaction of every purchase
+	(or un-purchase); the backfill_purchase_rollups command seeds the families
+	that have none.
+	"""
+	family = models.ForeignKey(Family, on_delete=models.CASCADE, db_index=False, related_name="grocery_purchase_rollups")
+	day = models.DateField()
+	normalized_name = models.CharField(max_length=255)
+	quantity_type = models.CharField(max_length=10, choices=GroceryItem.QuantityType.choices, default=GroceryItem.QuantityType.COUNT)
+	item_count = models.IntegerField(default=0)
+	quantity = models.FloatField(default=0)
+
+	class Meta:
+		db_table = "grocery_purchase_rollups"
+		constraints = [
+		    models.UniqueConstraint(fields=["family", "day", "normalized_name", "quantity_type"],
+		                            name="grocery_purchase_rollups_unique"),
 		]
 
 	def __str__(self):
-		return f"{self.name} ({self.quantity} {self.quantity_type})"
\ No newline at end of file
+		return f"{self.day} {self.normalized_name}: {self.item_count} ({self.quantity} {self.quantity_type})"
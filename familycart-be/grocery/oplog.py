@@ -0,0 +1,320 @@
+import json
+import uuid
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from grocery.models import GroceryList, GroceryItem, GroceryTombstone
+from grocery.serializers import GroceryItemSerializer
+from grocery.events import publish_grocery_event, ITEMS_CREATED, ITEMS_UPDATED
+from grocery.suggestions import record_item_names
+from grocery.analytics import record_purchases, purchase_transition
+from grocery.clock import MERGEABLE_ITEM_FIELDS, Timestamp, parse_timestamp, physical_time, server_clock
+from grocery.scripts import delete_grocery_items, touch_grocery_list
+
+# ------------------------------------------------------------------------------
+# Operation-log merge of offline item edits
+# ------------------------------------------------------------------------------
+# Clients queue their edits while offline as operations stamped with their
+# hybrid logical clock (grocery/clock.py) and send the queue in one batch:
+#   {"op": "add",    "item": <uuid>, "hlc": <clock>, "grocery_list_id": <id>, "fields": {...}}
+#   {"op": "set",    "item": <uuid>, "hlc": <clock>, "fields": {...}}
+#   {"op": "remove", "item": <uuid>, "hlc": <clock>}
+#
+# Merge rules, which make the result independent of the order in which
+# operations (and batches from different clients) arrive:
+#   - each field of MERGEABLE_ITEM_FIELDS is last-writer-wins on its own clock
+#     (GroceryItem.field_clocks); equal clocks fall back to comparing the values
+#   - add-wins: a remove only deletes the item if its clock is later than
+#     every field clock of the item; an add or set later than the removal
+#     brings the item back from the tombstone's snapshot
+#
+# Items are addressed by uuid within the caller's family only: (family, uuid)
+# is unique, and the same uuid in another family is a different item.
+#
+# A batch is validated as a whole and applied in one transaction; the response
+# holds the merged state of every item it touched, so the client converges in
+# a single round trip.
+# ------------------------------------------------------------------------------
+
+OPLOG_MAX_OPERATIONS = 500
+OPLOG_OPERATION_TYPES = ("add", "set", "remove")
+ZERO_CLOCK = Timestamp(0, 0, "")
+
+
+def _clock(value):
+    return parse_timestamp(value) if value else ZERO_CLOCK
+
+
+def _removal_clock(tombstone):
+    """ Tombstones written before removals were clocked fall back to their deletion time. """
+    if tombstone.hlc:
+        return parse_timestamp(tombstone.hlc)
+    return Timestamp(int(tombstone.deleted_at.timestamp() * 1000), 0, "")
+
+
+def _wins(clock, value, current_clock, current_value):
+    """ Last-writer-wins order of two writes to a field; the values break clock ties deterministically. """
+    return (clock, json.dumps(value, default=str)) > (current_clock, json.dumps(current_value, default=str))
+
+
+def _error(result, message):
+    result["errors"] = message
+    return True
+
+
+def parse_operations(operations, family_ids):
+    """
+    Validates every operation. Returns (operations, results, has_errors), where
+    operations are normalized dicts and results hold one entry per operation.
+    """
+    results = [{"index": index, "op": operation.get("op") if isinstance(operation, dict) else None}
+               for index, operation in enumerate(operations)]
+    max_wall = physical_time() + getattr(settings, "OPLOG_MAX_CLOCK_DRIFT", 300) * 1000
+    list_ids = {operation.get("grocery_list_id") for operation in operations
+                if isinstance(operation, dict) and operation.get("op") == "add"}
+    lists = dict(GroceryList.objects.filter(
+        id__in=[list_id for list_id in list_ids if isinstance(list_id, int)], family_id__in=family_ids
+    ).values_list("id", "family_id"))
+
+    parsed = []
+    has_errors = False
+    for result, operation in zip(results, operations):
+        op_type = result["op"]
+        if op_type not in OPLOG_OPERATION_TYPES:
+            has_errors = _error(result, f"Invalid op, expected one of: {', '.join(OPLOG_OPERATION_TYPES)}")
+            continue
+        try:
+            item_uuid = uuid.UUID(str(operation.get("item")))
+            clock = parse_timestamp(operation.get("hlc"))
+        except ValueError as e:
+            has_errors = _error(result, str(e) if operation.get("item") else "item (uuid) is required.")
+            continue
+        if clock.wall > max_wall:
+            has_errors = _error(result, "hlc is too far ahead of the server clock.")
+            continue
+
+        fields = {}
+        if op_type != "remove":
+            raw_fields = operation.get("fields")
+            if not isinstance(raw_fields, dict) or not raw_fields:
+                has_errors = _error(result, "fields must be a non-empty object.")
+                continue
+            unknown = [name for name in raw_fields if name not in MERGEABLE_ITEM_FIELDS]
+            if unknown:
+                has_errors = _error(result, f"Unknown fields: {', '.join(unknown)}. "
+                                            f"Mergeable: {', '.join(MERGEABLE_ITEM_FIELDS)}")
+                continue
+            if op_type == "add" and not raw_fields.get("name"):
+                has_errors = _error(result, "Missing mandatory fields: name")
+                continue
+            serializer = GroceryItemSerializer(data=raw_fields, partial=True)
+            if not serializer.is_valid():
+                has_errors = _error(result, serializer.errors)
+                continue
+            fields = serializer.validated_data
+        if op_type == "add" and operation.get("grocery_list_id") not in lists:
+            has_errors = _error(result, "Grocery list not found or not authorized.")
+            continue
+
+        parsed.append({
+            "op": op_type,
+            "uuid": item_uuid,
+            "clock": clock,
+            "fields": fields,
+            "grocery_list_id": operation.get("grocery_list_id"),
+            "result": result,
+        })
+
+    return parsed, results, has_errors
+
+
+class _ItemState:
+    """ In-memory state of one item while a batch is merged. """
+
+    def __init__(self, stored, tombstone):
+        self.stored = stored
+        self.item = stored
+        self.was_purchased = stored.purchased if stored else False
+        self.changed = set()
+        self.removal = _removal_clock(tombstone) if tombstone else None
+        self.tombstone_changed = False
+        self.tombstone = tombstone
+        self.snapshot = tombstone.snapshot if tombstone else None
+        self.removed = None
+
+    def max_clock(self):
+        return max((_clock(value) for value in self.item.field_clocks.values()), default=ZERO_CLOCK)
+
+    def set_fields(self, fields, clock):
+        for name, value in fields.items():
+            if _wins(clock, value, _clock(self.item.field_clocks.get(name)), getattr(self.item, name)):
+                setattr(self.item, name, value)
+                self.item.field_clocks = {**self.item.field_clocks, name: str(clock)}
+                self.changed.add(name)
+
+    def set_removed_fields(self, fields, clock):
+        """ Merges an edit the removal has seen into the snapshot, in case the item comes back. """
+        clocks = self.snapshot.setdefault("field_clocks", {})
+        for name, value in fields.items():
+            if _wins(clock, value, _clock(clocks.get(name)), self.snapshot.get(name)):
+                self.snapshot[name] = value
+                clocks[name] = str(clock)
+                self.tombstone_changed = True
+
+    def remove(self, clock):
+        if self.item is None:
+            if self.removal is not None and clock > self.removal:
+                self.removal, self.tombstone_changed = clock, True
+            return
+        # Add-wins: an edit the removal has not seen keeps the item
+        if clock <= self.max_clock():
+            return
+        self.snapshot = {
+            "name": self.item.name, "quantity": self.item.quantity, "quantity_type": self.item.quantity_type,
+            "purchased": self.item.purchased, "note": self.item.note, "created_by_id": self.item.created_by_id,
+            "field_clocks": self.item.field_clocks, "grocery_list_id": self.item.grocery_list_id,
+        }
+        self.removal, self.tombstone_changed = clock, True
+        self.removed, self.item = self.item, None
+
+    def restore(self, item_uuid, grocery_list_id, family_id):
+        """ Brings a removed item back, as it was when removed. """
+        if self.stored is not None:
+            # Removed earlier in this batch: the stored row is still there
+            self.item = self.stored
+            for name in MERGEABLE_ITEM_FIELDS:
+                setattr(self.item, name, self.snapshot[name])
+            self.item.field_clocks = self.snapshot["field_clocks"]
+            self.changed.update(MERGEABLE_ITEM_FIELDS)
+        else:
+            snapshot = self.snapshot
+            self.item = GroceryItem(
+                uuid=item_uuid, grocery_list_id=grocery_list_id, family_id=family_id, created_by_id=snapshot["created_by_id"],
+                field_clocks=snapshot["field_clocks"],
+                **{name: snapshot[name] for name in MERGEABLE_ITEM_FIELDS}
+            )
+        self.tombstone_changed = False
+
+
+def apply_operations(operations, family_ids, user):
+    """
+    Merges validated operations (from parse_operations) into the items of the
+    given families in one transaction. Returns the merged item for each uuid
+    ({"item": <uuid>, "state": <serialized item> or None when removed}).
+    """
+    uuids = list(dict.fromkeys(op["uuid"] for op in operations))
+    now = timezone.now()
+    with transaction.atomic():
+        # Serialize merges of the same uuids, including the creation of new items
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT pg_advisory_xact_lock(key) FROM"
+                " (SELECT hashtextextended(u, 0) AS key FROM unnest(%s::text[]) AS u ORDER BY key) AS keys",
+                [sorted(str(item_uuid) for item_uuid in uuids)]
+            )
+        stored = {item.uuid: item for item in GroceryItem.objects.select_for_update().filter(
+            uuid__in=uuids, family_id__in=family_ids
+        ).order_by("id")}
+        tombstones = {}
+        for tombstone in GroceryTombstone.objects.filter(
+            object_type=GroceryTombstone.ObjectType.ITEM, object_uuid__in=set(uuids) - set(stored),
+            family_id__in=family_ids
+        ).order_by("deleted_at", "id"):
+            tombstones[tombstone.object_uuid] = tombstone
+        list_ids = {op["grocery_list_id"] for op in operations if op["op"] == "add"}
+        list_ids |= {tombstone.grocery_list_id for tombstone in tombstones.values()}
+        list_ids |= {item.grocery_list_id for item in stored.values()}
+        lists = dict(GroceryList.objects.filter(id__in=list_ids, family_id__in=family_ids).values_list("id", "family_id"))
+
+        states = {item_uuid: _ItemState(stored.get(item_uuid), tombstones.get(item_uuid)) for item_uuid in uuids}
+        for op in operations:
+            state = states[op["uuid"]]
+            server_clock.observe(op["clock"])
+            if op["op"] == "remove":
+                state.remove(op["clock"])
+                continue
+            if state.item is None:
+                if state.removal is not None:
+                    if state.snapshot is None:
+                        continue
+                    if op["clock"] <= state.removal:
+                        state.set_removed_fields(op["fields"], op["clock"])
+                        continue
+                    grocery_list_id = op["grocery_list_id"] if op["op"] == "add" else \
+                        state.snapshot.get("grocery_list_id", state.tombstone.grocery_list_id if state.tombstone else None)
+                    if grocery_list_id not in lists:
+                        continue
+                    state.restore(op["uuid"], grocery_list_id, lists[grocery_list_id])
+                elif op["op"] == "add":
+                    state.item = GroceryItem(uuid=op["uuid"], grocery_list_id=op["grocery_list_id"],
+                                             family_id=lists[op["grocery_list_id"]], created_by=user, field_clocks={})
+                else:
+                    # Nothing to edit: the item was never synced here
+                    continue
+            state.set_fields(op["fields"], op["clock"])
+
+        # Write: updates and inserts first, so removed rows are deleted (and snapshotted) as merged.
+        # Items both added and removed in this batch are inserted and deleted too, so that
+        # operations arriving later find their tombstone.
+        to_create = [state.item for state in states.values() if state.item is not None and state.item.pk is None]
+        to_create += [state.removed for state in states.values() if state.item is None and
+                      state.stored is None and state.tombstone is None and state.removed is not None]
+        to_update = [state for state in states.values() if state.stored is not None and state.changed]
+        to_delete = [state for state in states.values() if state.item is None and state.removed is not None and
+                     state.tombstone is None]
+        deltas = {}
+        events = {}
+
+        def add_delta(item, event, items, purchased):
+            counters = deltas.setdefault(item.grocery_list_id, [0, 0])
+            counters[0] += items
+            counters[1] += purchased
+            if event:
+                events.setdefault((item.family_id, item.grocery_list_id, event), []).append(item.id)
+
+        if to_update:
+            for state in to_update:
+                state.stored.version += 1
+                state.stored.updated_at = now
+                add_delta(state.stored, ITEMS_UPDATED if state.item is not None else None,
+                          0, int(state.stored.purchased) - int(state.was_purchased))
+            record_purchases(purchase_transition(state.stored, state.was_purchased) for state in to_update)
+            GroceryItem.objects.bulk_update(
+                [state.stored for state in to_update],
+                fields=sorted(set().union(*(state.changed for state in to_update)) |
+                              {"field_clocks", "version", "updated_at"})
+            )
+        if to_create:
+            GroceryItem.objects.bulk_create(to_create)
+            families = {}
+            for item in to_create:
+                add_delta(item, ITEMS_CREATED, 1, int(item.purchased))
+                families.setdefault(item.family_id, []).append(item)
+            for family_id, items in families.items():
+                record_item_names(family_id, items)
+            # Items brought back from a tombstone were counted when first purchased
+            restored = {item_uuid for item_uuid, state in states.items() if state.tombstone is not None}
+            record_purchases(purchase_transition(item, False) for item in to_create if item.uuid not in restored)
+
+        # Touch lists in id order so concurrent batches cannot deadlock
+        for grocery_list_id in sorted(deltas):
+            touch_grocery_list(grocery_list_id, items=deltas[grocery_list_id][0], purchased=deltas[grocery_list_id][1])
+        for (family_id, grocery_list_id, event), item_ids in events.items():
+            publish_grocery_event(family_id, event, grocery_list_id, item_ids)
+        if to_delete:
+            delete_grocery_items(
+                GroceryItem.objects.filter(id__in=[state.removed.id for state in to_delete]),
+                clocks={state.removed.id: state.removal for state in to_delete}
+            )
+        # Operations on items that stay removed only move the tombstone's clock and snapshot
+        for state in states.values():
+            if state.item is None and state.tombstone_changed:
+                tombstones = GroceryTombstone.objects.filter(id=state.tombstone.id) if state.tombstone else \
+                    GroceryTombstone.objects.filter(object_type=GroceryTombstone.ObjectType.ITEM, object_id=state.removed.id)
+                tombstones.update(hlc=str(state.removal), snapshot=state.snapshot)
+
+    merged = {item.uuid: item for item in GroceryItem.objects.filter(uuid__in=uuids, family_id__in=family_ids)}
+    return [
+        {"item": item_uuid, "state": GroceryItemSerializer(merged[item_uuid]).data if item_uuid in merged else None}
+        for item_uuid in uuids
+    ]
@@ -0,0 +1,133 @@
+from collections import OrderedDict
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+import json
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def use_keyset_pagination(request):
+    """ Keyset pagination is opt-in: ?pagination=cursor """
+    return request.query_params.get("pagination") == "cursor"
+
+
+class GroceryKeysetPagination(BasePagination):
+    """
+    Keyset (cursor) pagination on (ordering field, id), newest first by default.
+
+    Each page seeks straight to its position through the composite
+    (parent, field, id) indexes instead of scanning an OFFSET, and no
+    COUNT(*) is run unless the client asks for it with ?with_count=true.
+    The response keeps the same shape as the page-number paginator:
+    {"next", "previous", ["count"], "results"}.
+    """
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 50
+    cursor_query_param = 'cursor'
+    count_query_param = 'with_count'
+    invalid_cursor_message = 'Invalid cursor'
+    # Sort field, "-" prefixed for descending; id breaks ties in the same direction
+    ordering = '-created_at'
+    datetime_fields = ('created_at', 'updated_at')
+
+    def __init__(self, ordering=None):
+        if ordering:
+            self.ordering = ordering
+        self.field = self.ordering.lstrip('-')
+        self.descending = self.ordering.startswith('-')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.count = queryset.count() if request.query_params.get(self.count_query_param) == "true" else None
+
+        position, reverse = self.decode_cursor(request)
+        # Previous pages are read by scanning backwards from the cursor
+        descending = self.descending != reverse
+        if position is not None:
+            value, row_id = position
+            lookup = "lt" if descending else "gt"
+            queryset = queryset.filter(
+                Q(**{f"{self.field}__{lookup}": value}) | Q(**{self.field: value, f"id__{lookup}": row_id})
+            )
+
+        prefix = "-" if descending else ""
+        rows = list(queryset.order_by(prefix + self.field, prefix + "id")[:self.page_size + 1])
+        has_extra = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+
+        if reverse:
+            rows.reverse()
+            self.has_next = True
+            self.has_previous = has_extra
+        else:
+            self.has_next = has_extra
+            self.has_previous = position is not None
+
+        self.page = rows
+        return rows
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+            if page_size > 0:
+                return min(page_size, self.max_page_size)
+        except (KeyError, ValueError):
+            pass
+        return self.page_size
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            raw = json.loads(urlsafe_b64decode(encoded.encode()))
+            # A cursor is only valid for the ordering it was issued for
+            if raw.get("o", "-created_at") != self.ordering:
+                raise ValueError
+            value = raw["c"]
+            if self.field in self.datetime_fields:
+                value = parse_datetime(value)
+            if not isinstance(value, (str, datetime)):
+                raise ValueError
+            return (value, int(raw["i"])), bool(raw.get("r"))
+        except Exception:
+            # Views answer ValueError with a 400, as for their other query params
+            raise ValueError(self.invalid_cursor_message)
+
+    def encode_cursor(self, row, reverse):
+        value = getattr(row, self.field)
+        raw = {"c": value.isoformat() if self.field in self.datetime_fields else value, "i": row.id}
+        if self.ordering != '-created_at':
+            raw["o"] = self.ordering
+        if reverse:
+            raw["r"] = 1
+        encoded = urlsafe_b64encode(json.dumps(raw, separators=(",", ":")).encode()).decode()
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        response = OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+        ])
+        if self.count is not None:
+            response['count'] = self.count
+        response['results'] = data
+        return Response(response)
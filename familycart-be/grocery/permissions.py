@@ -1,6 +1,7 @@
 from rest_framework import permissions
 from rest_framework.exceptions import APIException
 from family.models import FamilyMembership, Family
+from family.scripts import get_membership_resolver
 from grocery.models import GroceryList, GroceryItem
 from constants.response import KEY_MESSAGE, KEY_PAYLOAD, KEY_STATUS
 
@@ -30,6 +31,7 @@ class IsFamilyMember(permissions.BasePermission):
         user = request.user
         if not user or not user.is_authenticated:
             raise FamilyPermissionError("Authentication required.")
+        resolver = get_membership_resolver(request)
 
         family_membership_id = None
 
@@ -39,19 +41,16 @@ class IsFamilyMember(permissions.BasePermission):
             or request.query_params.get("family_membership")
         )
 
-        # For GroceryItemViewSet, get from grocery_list_id in URL
+        # For GroceryItemViewSet, the list in the URL must belong to one of the user's families
         grocery_list_id = view.kwargs.get("list_id")
         if grocery_list_id and not family_membership_id:
-            try:
-                grocery_list = GroceryList.objects.get(id=grocery_list_id)
-                family_membership_id = grocery_list.family_membership.id
-            except GroceryList.DoesNotExist:
+            if not GroceryList.objects.filter(id=grocery_list_id, family_id__in=resolver.family_ids).exists():
                 raise FamilyPermissionError("Invalid grocery list ID.")
 
         # For object actions, the object check will be done separately.
         # But if we already have family_membership_id, verify user belongs.
         if family_membership_id:
-            if not FamilyMembership.objects.filter(id=family_membership_id, user=user).exists():
+            if not resolver.owns_membership(family_membership_id):
                 raise FamilyPermissionError("You are not authorized for this family.")
         return True
 
@@ -59,16 +58,10 @@ class IsFamilyMember(permissions.BasePermission):
         """
         Runs for retrieve/update/delete — verifies user belongs to that object's family.
         """
-        user = request.user
-
-        if isinstance(obj, GroceryList):
-            family_membership_id = obj.family_membership.id
-        elif isinstance(obj, GroceryItem):
-            family_membership_id = obj.grocery_list.family_membership.id
-        else:
+        if not isinstance(obj, (GroceryList, GroceryItem)):
             raise FamilyPermissionError("Invalid object type for family check.")
 
-        if not FamilyMembership.objects.filter(id=family_membership_id, user=user).exists():
+        if not get_membership_resolver(request).is_member_of(obj.family_id):
             raise FamilyPermissionError("You are not authorized to access this resource.")
 
         return True
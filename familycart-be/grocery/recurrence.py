@@ -0,0 +1,137 @@
+import calendar
+from datetime import timedelta
+from django.db import transaction
+from django.utils import timezone
+from grocery.models import GroceryList, GroceryItem, GroceryListRecurrence
+from grocery.events import publish_grocery_event, LIST_CREATED
+
+# ------------------------------------------------------------------------------
+# List templates and recurrences
+# ------------------------------------------------------------------------------
+# A template is a GroceryList with is_template set; its items are edited like
+# any other list's. Instantiating templates clones them into new lists with a
+# fixed number of queries however many templates and items there are: one
+# read of the template items, one bulk_create of the lists (with their
+# counters already set) and one bulk_create of the items.
+#
+# A GroceryListRecurrence instantiates its template whenever next_run_on is
+# due. materialize_due_recurrences walks the due rows in batches; a run that
+# was missed creates a single list and moves next_run_on past today, instead
+# of one list per missed occurrence.
+# ------------------------------------------------------------------------------
+
+RECURRENCE_BATCH_SIZE = 500
+
+
+def _add_months(day, months, day_of_month):
+    month_index = day.month - 1 + months
+    year, month = day.year + month_index // 12, month_index % 12 + 1
+    return day.replace(year=year, month=month, day=min(day_of_month, calendar.monthrange(year, month)[1]))
+
+
+def first_occurrence(recurrence, start):
+    """ The first day on or after start that matches the recurrence's schedule. """
+    if recurrence.frequency == GroceryListRecurrence.Frequency.WEEKLY:
+        return start + timedelta(days=(recurrence.weekday - start.weekday()) % 7)
+    if recurrence.frequency == GroceryListRecurrence.Frequency.MONTHLY:
+        occurrence = _add_months(start, 0, recurrence.day_of_month)
+        return occurrence if occurrence >= start else _add_months(start, 1, recurrence.day_of_month)
+    return start
+
+
+def next_occurrence(recurrence, today):
+    """ The first occurrence after today, stepping from recurrence.next_run_on by whole intervals. """
+    current = recurrence.next_run_on
+    if current > today:
+        return current
+    if recurrence.frequency == GroceryListRecurrence.Frequency.MONTHLY:
+        elapsed = (today.year - current.year) * 12 + today.month - current.month
+        steps = elapsed // recurrence.interval
+        occurrence = _add_months(current, steps * recurrence.interval, recurrence.day_of_month)
+        if occurrence <= today:
+            occurrence = _add_months(current, (steps + 1) * recurrence.interval, recurrence.day_of_month)
+        return occurrence
+    period = recurrence.interval * (7 if recurrence.frequency == GroceryListRecurrence.Frequency.WEEKLY else 1)
+    return current + timedelta(days=((today - current).days // period + 1) * period)
+
+
+def instantiate_templates(clones):
+    """
+    Clones templates into new lists. clones holds (template, name, created_by_id)
+    tuples; returns the new lists in the same order. Items are copied unpurchased.
+    """
+    if not clones:
+        return []
+    template_items = {}
+    for item in GroceryItem.objects.filter(
+        grocery_list_id__in={template.id for template, _, _ in clones}
+    ).only("grocery_list_id", "name", "quantity", "quantity_type", "note").order_by("grocery_list_id", "created_at", "id"):
+        template_items.setdefault(item.grocery_list_id, []).append(item)
+
+    with transaction.atomic():
+        lists = GroceryList.objects.bulk_create([
+            GroceryList(
+                family_membership_id=template.family_membership_id,
+                family_id=template.family_id,
+                name=name,
+                description=template.description,
+                created_by_id=created_by_id,
+                item_count=len(template_items.get(template.id, [])),
+            )
+            for template, name, created_by_id in clones
+        ])
+        GroceryItem.objects.bulk_create([
+            GroceryItem(
+                grocery_list_id=grocery_list.id,
+                family_id=grocery_list.family_id,
+                name=item.name,
+                quantity=item.quantity,
+                quantity_type=item.quantity_type,
+                note=item.note,
+                created_by_id=grocery_list.created_by_id,
+            )
+            for (template, _, _), grocery_list in zip(clones, lists)
+            for item in template_items.get(template.id, [])
+        ])
+        for grocery_list in lists:
+            publish_grocery_event(grocery_list.family_id, LIST_CREATED, grocery_list.id)
+    return lists
+
+
+def instantiate_template(template, user, name=None):
+    """ Clones one template into a new list created by user. """
+    return instantiate_templates([(template, name or template.name, user.id)])[0]
+
+
+def recurring_list_name(template, day):
+    return f"{template.name} ({day.isoformat()})"
+
+
+def materialize_due_recurrences(today=None, batch_size=RECURRENCE_BATCH_SIZE):
+    """
+    Instantiates every active recurrence due on or before today, batch_size at a
+    time, each batch in one transaction with a constant number of queries. Due
+    rows are locked with SKIP LOCKED, so concurrent runs split the work instead
+    of cloning twice. Returns the number of lists created.
+    """
+    today = today or timezone.localdate()
+    created = 0
+    while True:
+        with transaction.atomic():
+            recurrences = list(
+                GroceryListRecurrence.objects.select_for_update(skip_locked=True, of=("self",)).filter(
+                    is_active=True, next_run_on__lte=today, template__is_template=True
+                ).select_related("template").order_by("next_run_on", "id")[:batch_size]
+            )
+            if not recurrences:
+                return created
+            instantiate_templates([
+                (recurrence.template, recurring_list_name(recurrence.template, today),
+                 recurrence.created_by_id or recurrence.template.created_by_id)
+                for recurrence in recurrences
+            ])
+            for recurrence in recurrences:
+                recurrence.last_run_on = today
+                recurrence.next_run_on = next_occurrence(recurrence, today)
+            GroceryListRecurrence.objects.bulk_update(recurrences, fields=["last_run_on", "next_run_on"])
+            created += len(recurrences)
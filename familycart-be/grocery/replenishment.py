@@ -0,0 +1,161 @@
+from datetime import date, timedelta
+import numpy as np
+from django.db import connection, transaction
+from django.utils import timezone
+from family.models import Family
+from grocery.models import GroceryReplenishment
+
+# ------------------------------------------------------------------------------
+# Replenishment prediction
+# ------------------------------------------------------------------------------
+# "You usually buy coffee every 9 days". Purchases are the days on which the
+# family's purchase rollups (grocery/analytics.py) count a net purchase of a
+# normalized name: unlike the items themselves, they survive deletes and
+# clear-purchased, and an edit does not move them. The display name comes from
+# the family's name stats. For every family and name bought on at least
+# REPLENISHMENT_MIN_PURCHASES days, the mean and standard deviation of the days
+# between purchases give the next due day.
+#
+# predict_replenishment walks the families in id ranges of batch_size. Each
+# range is one query returning its purchases sorted by (family, name, day);
+# the statistics of every group in it are computed at once with NumPy (group
+# boundaries, np.diff and np.bincount), with no Python loop over purchases.
+# The range's GroceryReplenishment rows are then replaced in one transaction.
+# ------------------------------------------------------------------------------
+
+REPLENISHMENT_MIN_PURCHASES = 3
+# Items not bought for this many times their usual interval are dropped as no longer bought
+REPLENISHMENT_STALE_FACTOR = 3
+REPLENISHMENT_BATCH_SIZE = 5000
+REPLENISHMENT_DAYS_AHEAD = 2
+REPLENISHMENT_MAX_DAYS_AHEAD = 30
+REPLENISHMENT_LIMIT = 20
+
+EPOCH = date(1970, 1, 1)
+
+PURCHASES_SQL = """
+    SELECT r.family_id,
+           r.normalized_name,
+           r.day - DATE '1970-01-01' AS day,
+           COALESCE(s.name, r.normalized_name) AS name,
+           (array_agg(r.quantity / r.item_count ORDER BY r.item_count DESC, r.quantity_type))[1] AS quantity,
+           (array_agg(r.quantity_type ORDER BY r.item_count DESC, r.quantity_type))[1] AS quantity_type
+    FROM grocery_purchase_rollups r
+    LEFT JOIN grocery_item_name_stats s ON s.family_id = r.family_id AND s.normalized_name = r.normalized_name
+    WHERE r.family_id >= %(first)s AND r.family_id < %(last)s AND r.item_count > 0
+    GROUP BY r.family_id, r.normalized_name, r.day, s.name
+    ORDER BY 1, 2, 3
+"""
+
+
+def purchase_statistics(family_ids, names, days, min_purchases=REPLENISHMENT_MIN_PURCHASES):
+    """
+    Interval statistics of purchases sorted by (family, name, day), given as
+    parallel arrays (days as day numbers). Returns a dict of per-group arrays:
+    last (index of the group's latest purchase), count, mean and std (of the
+    days between purchases), for the groups with at least min_purchases purchases.
+    """
+    if len(days) == 0:
+        empty = np.array([], dtype=np.int64)
+        return {"last": empty, "count": empty, "mean": empty.astype(float), "std": empty.astype(float)}
+    starts = np.ones(len(days), dtype=bool)
+    starts[1:] = (family_ids[1:] != family_ids[:-1]) | (names[1:] != names[:-1])
+    group = np.cumsum(starts) - 1
+    groups = group[-1] + 1
+
+    # Interval i is between purchases i and i + 1, which must be in the same group
+    same_group = ~starts[1:]
+    interval_group = group[1:][same_group]
+    intervals = np.diff(days)[same_group].astype(float)
+    interval_count = np.bincount(interval_group, minlength=groups)
+    total = np.bincount(interval_group, weights=intervals, minlength=groups)
+    total_squares = np.bincount(interval_group, weights=intervals ** 2, minlength=groups)
+
+    last = np.append(np.flatnonzero(starts)[1:] - 1, len(days) - 1)
+    keep = interval_count + 1 >= min_purchases
+    mean = total[keep] / interval_count[keep]
+    std = np.sqrt(np.maximum(total_squares[keep] / interval_count[keep] - mean ** 2, 0))
+    return {"last": last[keep], "count": interval_count[keep] + 1, "mean": mean, "std": std}
+
+
+def predict_family_range(first_family_id, last_family_id, today, now=None):
+    """
+    Recomputes the GroceryReplenishment rows of the families with
+    first_family_id <= id < last_family_id. Returns the number of rows written.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(PURCHASES_SQL, {"first": first_family_id, "last": last_family_id})
+        rows = cursor.fetchall()
+
+    replenishments = []
+    if rows:
+        family_ids, normalized_names, days, names, quantities, quantity_types = zip(*rows)
+        days = np.array(days, dtype=np.int64)
+        stats = purchase_statistics(np.array(family_ids, dtype=np.int64), np.array(normalized_names, dtype=object), days)
+        today_number = (today - EPOCH).days
+        last_days = days[stats["last"]]
+        next_due = last_days + np.maximum(np.rint(stats["mean"]), 1).astype(np.int64)
+        current = today_number - last_days <= REPLENISHMENT_STALE_FACTOR * np.maximum(stats["mean"], 1)
+        now = now or timezone.now()
+        for index in np.flatnonzero(current):
+            row = int(stats["last"][index])
+            replenishments.append(GroceryReplenishment(
+                family_id=family_ids[row],
+                normalized_name=normalized_names[row],
+                name=names[row],
+                quantity=quantities[row],
+                quantity_type=quantity_types[row],
+                purchase_count=int(stats["count"][index]),
+                interval_days=float(stats["mean"][index]),
+                interval_stddev_days=float(stats["std"][index]),
+                last_purchased_on=EPOCH + timedelta(days=int(last_days[index])),
+                next_due_on=EPOCH + timedelta(days=int(next_due[index])),
+                computed_at=now,
+            ))
+
+    with transaction.atomic():
+        GroceryReplenishment.objects.filter(family_id__gte=first_family_id, family_id__lt=last_family_id).delete()
+        GroceryReplenishment.objects.bulk_create(replenishments, batch_size=REPLENISHMENT_BATCH_SIZE)
+    return len(replenishments)
+
+
+def predict_replenishment(batch_size=REPLENISHMENT_BATCH_SIZE, today=None):
+    """ Recomputes the predictions of every family, batch_size family ids at a time. Returns the rows written. """
+    today = today or timezone.localdate()
+    now = timezone.now()
+    written = 0
+    first = Family.objects.order_by("id").values_list("id", flat=True).first()
+    while first is not None:
+        written += predict_family_range(first, first + batch_size, today, now)
+        first = Family.objects.filter(id__gte=first + batch_size).order_by("id").values_list("id", flat=True).first()
+    return written
+
+
+def get_due_replenishments(family_ids, days_ahead=REPLENISHMENT_DAYS_AHEAD, limit=REPLENISHMENT_LIMIT):
+    """
+    Items of the given families due within days_ahead days (overdue first) that
+    are not already on one of their lists unpurchased (templates aside).
+    """
+    due = GroceryReplenishment.objects.filter(
+        family_id__in=family_ids, next_due_on__lte=timezone.localdate() + timedelta(days=days_ahead)
+    ).order_by("next_due_on", "-purchase_count")
+
+    on_lists = {}
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT DISTINCT family_id, lower(btrim(name)) FROM grocery_items"
+            " WHERE family_id = ANY(%(family_ids)s) AND NOT purchased AND grocery_list_id NOT IN"
+            " (SELECT id FROM grocery_lists WHERE family_id = ANY(%(family_ids)s) AND is_template)",
+            {"family_ids": list(family_ids)}
+        )
+        for family_id, normalized_name in cursor.fetchall():
+            on_lists.setdefault(family_id, set()).add(normalized_name)
+
+    results = []
+    for replenishment in due.iterator():
+        if replenishment.normalized_name in on_lists.get(replenishment.family_id, ()):
+            continue
+        results.append(replenishment)
+        if len(results) == limit:
+            break
+    return results
@@ -0,0 +1,7 @@
+from django.urls import path
+from grocery.consumers import GroceryEventsConsumer
+
+websocket_urlpatterns = [
+    # Real-time list/item change events for the user's families
+    path('ws/v1/grocery/events/', GroceryEventsConsumer.as_asgi(), name='grocery-events'),
+]
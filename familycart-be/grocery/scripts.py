@@ -1 +1,770 @@
 from grocery.models import *
+from grocery.serializers import GroceryItemBulkSerializer
+from grocery.events import *
+from grocery.suggestions import record_item_names
+from grocery.analytics import record_purchases, purchase_transition
+from grocery.clock import server_clock, stamp_fields, stamp_fields_expression
+from django.db import connection, transaction
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import Count, F, FloatField, Q, Value
+from django.db.models.functions import Cast, Lower, Trim
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from datetime import timedelta
+import base64
+import hashlib
+import json
+
+BULK_MAX_OPERATIONS = 500
+BULK_OPERATION_TYPES = ("create", "update", "delete")
+ITEM_MANDATORY_FIELDS = ["name", "quantity", "quantity_type"]
+
+SYNC_PAGE_SIZE = 500
+# Rows newer than this are held back until the next sync, so a transaction
+# that stamped updated_at before committing cannot slip behind a cursor.
+SYNC_SETTLE_WINDOW = timedelta(seconds=2)
+SYNC_STREAMS = ("lists", "items", "tombstones")
+ITEM_SORT_KEYS = ("created_at", "-created_at", "updated_at", "-updated_at", "name", "-name")
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 50
+SEARCH_MAX_QUERY_LENGTH = 200
+# Item columns kept in the tombstone of a deleted item
+TOMBSTONE_SNAPSHOT_FIELDS = ("name", "quantity", "quantity_type", "purchased", "note", "created_by_id", "field_clocks")
+
+
+# ------------------------------------------------------------------------------
+# Parameters:
+#   grocery_list : GroceryList the operations are applied to (already authorized)
+#   operations   : list of dicts, each {"op": "create"|"update"|"delete", "id": int, "data": dict}
+#   user         : user performing the operations (stored as created_by)
+#
+# Returns:
+#   (results, has_errors) where results holds one entry per operation, in order.
+# ------------------------------------------------------------------------------
+def apply_bulk_item_operations(grocery_list, operations, user):
+    """
+    Validates every operation first and, only if all of them are valid,
+    writes them with one bulk_create, one bulk_update per set of updated
+    fields and one DELETE inside a single transaction.
+    """
+    results = [{"index": index, "op": operation.get("op") if isinstance(operation, dict) else None}
+               for index, operation in enumerate(operations)]
+    has_errors = False
+
+    # Load every item targeted by an update/delete with a single query
+    target_ids = [op.get("id") for op in operations if isinstance(op, dict) and op.get("op") in ("update", "delete")]
+    existing_items = GroceryItem.objects.filter(
+        grocery_list=grocery_list,
+        id__in=[item_id for item_id in target_ids if isinstance(item_id, int)]
+    ).in_bulk()
+
+    to_create, to_update, to_delete = [], [], []
+    seen_ids = set()
+
+    for result, operation in zip(results, operations):
+        op_type = result["op"]
+        if op_type not in BULK_OPERATION_TYPES:
+            result["errors"] = f"Invalid op, expected one of: {', '.join(BULK_OPERATION_TYPES)}"
+            has_errors = True
+            continue
+
+        data = operation.get("data") or {}
+        if op_type == "create":
+            missing_fields = [f for f in ITEM_MANDATORY_FIELDS if not data.get(f)]
+            if missing_fields:
+                result["errors"] = f"Missing mandatory fields: {', '.join(missing_fields)}"
+                has_errors = True
+                continue
+            serializer = GroceryItemBulkSerializer(data=data)
+            if not serializer.is_valid():
+                result["errors"] = serializer.errors
+                has_errors = True
+                continue
+            item = GroceryItem(**serializer.validated_data, grocery_list=grocery_list,
+                               family_id=grocery_list.family_id, created_by=user)
+            to_create.append((result, item))
+            continue
+
+        item_id = operation.get("id")
+        instance = existing_items.get(item_id)
+        if instance is None:
+            result["errors"] = "Item not found or not authorized."
+            has_errors = True
+            continue
+        if item_id in seen_ids:
+            result["errors"] = "Item is targeted by more than one operation."
+            has_errors = True
+            continue
+        seen_ids.add(item_id)
+
+        if op_type == "update":
+            serializer = GroceryItemBulkSerializer(instance, data=data, partial=True)
+            if not serializer.is_valid():
+                result["errors"] = serializer.errors
+                has_errors = True
+                continue
+            # Applied to the row once it is locked, so only the fields of the op are written
+            to_update.append((result, instance, serializer.validated_data))
+        else:
+            to_delete.append((result, instance))
+
+    if has_errors:
+        return results, True
+
+    with transaction.atomic():
+        purchased_delta = 0
+        if to_create:
+            GroceryItem.objects.bulk_create([item for _, item in to_create])
+            record_item_names(grocery_list.family_id, [item for _, item in to_create])
+            purchased_delta += sum(1 for _, item in to_create if item.purchased)
+            record_purchases(purchase_transition(item, False) for _, item in to_create)
+        if to_update:
+            # Each op is applied to its locked row: fields it does not set keep the values of
+            # concurrent writes, and purchased deltas are taken from the locked value
+            locked = GroceryItem.objects.select_for_update().filter(
+                id__in=[instance.id for _, instance, _ in to_update]
+            ).in_bulk()
+            # bulk_update bypasses auto_now, so stamp updated_at explicitly
+            now = timezone.now()
+            timestamp = server_clock.now()
+            transitions = []
+            by_fields = {}
+            for index, (result, instance, data) in enumerate(to_update):
+                item = locked[instance.id]
+                was_purchased = item.purchased
+                for field, value in data.items():
+                    setattr(item, field, value)
+                if "purchased" in data:
+                    purchased_delta += int(item.purchased) - int(was_purchased)
+                    transitions.append(purchase_transition(item, was_purchased))
+                item.updated_at = now
+                item.version += 1
+                item.field_clocks = {**item.field_clocks, **stamp_fields(data, timestamp)}
+                by_fields.setdefault(tuple(sorted(data)), []).append(item)
+                to_update[index] = (result, item)
+            record_purchases(transitions)
+            for fields, items in by_fields.items():
+                GroceryItem.objects.bulk_update(items, fields=[*fields, "updated_at", "version", "field_clocks"])
+        if to_delete:
+            delete_grocery_items(GroceryItem.objects.filter(id__in=[instance.id for _, instance in to_delete]))
+        touch_grocery_list(grocery_list.id, items=len(to_create), purchased=purchased_delta)
+        if to_create:
+            publish_grocery_event(grocery_list.family_id, ITEMS_CREATED, grocery_list.id, [item.id for _, item in to_create])
+        if to_update:
+            publish_grocery_event(grocery_list.family_id, ITEMS_UPDATED, grocery_list.id, [item.id for _, item in to_update])
+
+    for result, item in to_create + to_update:
+        result["id"] = item.id
+        result["item"] = GroceryItemBulkSerializer(item).data
+    for result, instance in to_delete:
+        result["id"] = instance.id
+
+    return results, False
+
+
+# ------------------------------------------------------------------------------
+# Deletes with tombstones
+# ------------------------------------------------------------------------------
+# Every delete of a list or an item must go through these helpers so delta-sync
+# clients are told about it. A list tombstone implies that all of its items are
+# gone as well, so no item tombstones are written for a deleted list.
+# ------------------------------------------------------------------------------
+def merge_grocery_item(grocery_list, data):
+    """
+    Merge-on-add: adds data["quantity"] to an unpurchased item of the list with the
+    same name (case and surrounding spaces ignored) and quantity type, using one
+    conditional F() UPDATE. Returns the merged item, or None when there is nothing
+    to merge into; the caller then inserts within the same transaction.
+    """
+    if data.get("purchased"):
+        return None
+    # Locking the list row serializes merge-adds on the list, so two concurrent
+    # adds of the same name cannot both miss each other and insert twice
+    GroceryList.objects.select_for_update().filter(id=grocery_list.id).exists()
+
+    candidates = GroceryItem.objects.filter(
+        grocery_list_id=grocery_list.id,
+        purchased=False,
+        quantity_type=data.get("quantity_type", GroceryItem.QuantityType.COUNT),
+    ).alias(normalized_name=Lower(Trim("name"))).filter(normalized_name=Lower(Trim(Value(data["name"]))))
+    item_id = candidates.order_by("created_at", "id").values_list("id", flat=True).first()
+    if item_id is None:
+        return None
+    # purchased=False is re-checked by the UPDATE itself, in case the item was bought meanwhile
+    merged = candidates.filter(id=item_id).update(
+        quantity=F("quantity") + data.get("quantity", 1),
+        version=F("version") + 1,
+        field_clocks=stamp_fields_expression(["quantity"]),
+        updated_at=timezone.now()
+    )
+    return GroceryItem.objects.get(id=item_id) if merged else None
+
+
+def delete_grocery_items(queryset, clocks=None):
+    """
+    Deletes the items in queryset and records one tombstone per item, with the
+    removal clock (clocks[item id], else the server clock) and a snapshot of the
+    item for op-log merges. Returns the count.
+    """
+    now = timezone.now()
+    clocks = clocks or {}
+    removed_at = str(server_clock.now())
+    with transaction.atomic():
+        rows = list(queryset.select_for_update(of=("self",)).values_list(
+            "id", "uuid", "grocery_list_id", "grocery_list__family_membership_id", "family_id", "purchased",
+            *TOMBSTONE_SNAPSHOT_FIELDS
+        ))
+        if not rows:
+            return 0
+
+        GroceryTombstone.objects.bulk_create([
+            GroceryTombstone(
+                object_type=GroceryTombstone.ObjectType.ITEM,
+                object_id=row[0],
+                object_uuid=row[1],
+                grocery_list_id=row[2],
+                family_membership_id=row[3],
+                family_id=row[4],
+                deleted_at=now,
+                hlc=str(clocks.get(row[0], removed_at)),
+                snapshot=dict(zip(TOMBSTONE_SNAPSHOT_FIELDS, row[6:])),
+            )
+            for row in rows
+        ])
+        deleted, _ = GroceryItem.objects.filter(id__in=[row[0] for row in rows]).delete()
+
+        deleted_ids = {}
+        for item_id, _, grocery_list_id, _, family_id, purchased, *_ in rows:
+            deleted_ids.setdefault((family_id, grocery_list_id), []).append((item_id, purchased))
+        for (family_id, grocery_list_id), deleted_items in deleted_ids.items():
+            touch_grocery_list(
+                grocery_list_id,
+                items=-len(deleted_items),
+                purchased=-sum(1 for _, purchased in deleted_items if purchased)
+            )
+            publish_grocery_event(family_id, ITEMS_DELETED, grocery_list_id, [item_id for item_id, _ in deleted_items])
+    return deleted
+
+
+def delete_grocery_list(grocery_list):
+    """ Deletes a grocery list (and, by cascade, its items) and records its tombstone. """
+    with transaction.atomic():
+        GroceryTombstone.objects.create(
+            object_type=GroceryTombstone.ObjectType.LIST,
+            object_id=grocery_list.id,
+            object_uuid=grocery_list.uuid,
+            grocery_list_id=grocery_list.id,
+            family_membership_id=grocery_list.family_membership_id,
+            family_id=grocery_list.family_id,
+        )
+        publish_grocery_event(grocery_list.family_id, LIST_DELETED, grocery_list.id)
+        grocery_list.delete()
+
+
+# ------------------------------------------------------------------------------
+# List-level item operations
+# ------------------------------------------------------------------------------
+# Each operation is one set-based statement (UPDATE ... RETURNING, DELETE, or
+# INSERT ... SELECT ... RETURNING) over the items of a list, optionally
+# restricted to item_ids. The returned rows give the exact counter deltas and
+# the ids for the change events. Each returns the number of affected items.
+# ------------------------------------------------------------------------------
+def _item_ids_clause(item_ids):
+    return ("", []) if item_ids is None else (" AND id = ANY(%s)", [list(item_ids)])
+
+
+def set_items_purchased(grocery_list, purchased=True, item_ids=None):
+    """ Marks all (or the given) items of the list purchased / not purchased. """
+    ids_sql, ids_params = _item_ids_clause(item_ids)
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "UPDATE grocery_items SET purchased = %s, version = version + 1,"
+                " field_clocks = field_clocks || %s::jsonb, updated_at = %s"
+                " WHERE grocery_list_id = %s AND purchased <> %s" + ids_sql + " RETURNING id, name, quantity, quantity_type",
+                [purchased, json.dumps(stamp_fields(["purchased"])), timezone.now(), grocery_list.id, purchased] + ids_params
+            )
+            rows = cursor.fetchall()
+        changed_ids = [row[0] for row in rows]
+        if changed_ids:
+            record_purchases((grocery_list.family_id, name, quantity, quantity_type, 1 if purchased else -1)
+                             for _, name, quantity, quantity_type in rows)
+            touch_grocery_list(grocery_list.id, purchased=len(changed_ids) if purchased else -len(changed_ids))
+            publish_grocery_event(grocery_list.family_id, ITEMS_UPDATED, grocery_list.id, changed_ids)
+    return len(changed_ids)
+
+
+def clear_purchased_items(grocery_list):
+    """ Deletes every purchased item of the list (with tombstones). """
+    return delete_grocery_items(GroceryItem.objects.filter(grocery_list_id=grocery_list.id, purchased=True))
+
+
+def move_items(grocery_list, target_list, item_ids):
+    """ Moves the given items of grocery_list to target_list (same family). """
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "UPDATE grocery_items SET grocery_list_id = %s, version = version + 1, updated_at = %s"
+                " WHERE grocery_list_id = %s AND id = ANY(%s) RETURNING id, purchased",
+                [target_list.id, timezone.now(), grocery_list.id, list(item_ids)]
+            )
+            rows = cursor.fetchall()
+        if rows:
+            moved_ids = [item_id for item_id, _ in rows]
+            purchased = sum(1 for _, item_purchased in rows if item_purchased)
+            # Touch both lists in id order so opposite concurrent moves cannot deadlock
+            deltas = {grocery_list.id: -1, target_list.id: 1}
+            for grocery_list_id in sorted(deltas):
+                touch_grocery_list(grocery_list_id, items=deltas[grocery_list_id] * len(rows),
+                                   purchased=deltas[grocery_list_id] * purchased)
+                publish_grocery_event(grocery_list.family_id, ITEMS_UPDATED, grocery_list_id, moved_ids)
+    return len(rows)
+
+
+def copy_items(grocery_list, target_list, item_ids, user):
+    """
+    Copies the given items of grocery_list to target_list (same family) as new,
+    unpurchased items created by user. Returns the ids of the copies.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO grocery_items (uuid, grocery_list_id, family_id, name, quantity, quantity_type,"
+                " purchased, created_by_id, note, field_clocks, created_at, updated_at)"
+                " SELECT gen_random_uuid(), %s, family_id, name, quantity, quantity_type, false, %s, note, '{}', %s, %s"
+                " FROM grocery_items WHERE grocery_list_id = %s AND id = ANY(%s) ORDER BY id"
+                " RETURNING id, name, quantity, quantity_type",
+                [target_list.id, user.id, now, now, grocery_list.id, list(item_ids)]
+            )
+            rows = cursor.fetchall()
+        if rows:
+            touch_grocery_list(target_list.id, items=len(rows))
+            record_item_names(target_list.family_id, [
+                GroceryItem(name=name, quantity=quantity, quantity_type=quantity_type) for _, name, quantity, quantity_type in rows
+            ])
+            publish_grocery_event(target_list.family_id, ITEMS_CREATED, target_list.id, [row[0] for row in rows])
+    return [row[0] for row in rows]
+
+
+# ------------------------------------------------------------------------------
+# Item filtering and sorting
+# ------------------------------------------------------------------------------
+# Query parameters of GET /grocery-items/, each shape backed by a composite
+# index that leads with grocery_list (see GroceryItem.Meta.indexes):
+#   ?purchased=true|false  -> (grocery_list, purchased, -created_at, -id)
+#   ?quantity_type=<type>  -> (grocery_list, quantity_type, -created_at, -id)
+#   ?name=<prefix>         -> (grocery_list, UPPER(name) text_pattern_ops), case-insensitive
+#   ?sort=<key>            -> (grocery_list, name, id) / (grocery_list, updated_at, id)
+#                             / (grocery_list, -created_at, -id); "-" for descending
+# ------------------------------------------------------------------------------
+def filter_grocery_items(queryset, query_params):
+    """ Applies the item filters of query_params. Raises ValueError for invalid values. """
+    purchased = query_params.get("purchased")
+    if purchased is not None:
+        if purchased not in ("true", "false"):
+            raise ValueError("purchased must be true or false.")
+        queryset = queryset.filter(purchased=purchased == "true")
+
+    quantity_type = query_params.get("quantity_type")
+    if quantity_type is not None:
+        if quantity_type not in GroceryItem.QuantityType.values:
+            raise ValueError(f"quantity_type must be one of: {', '.join(GroceryItem.QuantityType.values)}")
+        queryset = queryset.filter(quantity_type=quantity_type)
+
+    name = (query_params.get("name") or "").strip()
+    if name:
+        queryset = queryset.filter(name__istartswith=name)
+    return queryset
+
+
+def get_item_sort_key(query_params):
+    """ The ?sort key, -created_at by default. Raises ValueError for unknown keys. """
+    sort = query_params.get("sort", "-created_at")
+    if sort not in ITEM_SORT_KEYS:
+        raise ValueError(f"sort must be one of: {', '.join(ITEM_SORT_KEYS)}")
+    return sort
+
+
+# ------------------------------------------------------------------------------
+# Delta sync
+# ------------------------------------------------------------------------------
+# The cursor is an opaque, url-safe token holding one keyset position
+# (timestamp, id) per stream: lists and items by updated_at, tombstones by
+# deleted_at. Each call returns at most SYNC_PAGE_SIZE rows per stream.
+# ------------------------------------------------------------------------------
+def encode_sync_cursor(positions):
+    """ Encodes {stream: (datetime, id)} into an opaque cursor string. """
+    raw = {stream: [moment.isoformat(), row_id] for stream, (moment, row_id) in positions.items()}
+    return base64.urlsafe_b64encode(json.dumps(raw, separators=(",", ":")).encode()).decode()
+
+
+def decode_sync_cursor(cursor):
+    """ Decodes a cursor produced by encode_sync_cursor. Raises ValueError if it is malformed. """
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        positions = {}
+        for stream in SYNC_STREAMS:
+            moment, row_id = raw[stream]
+            moment = parse_datetime(moment)
+            if moment is None:
+                raise ValueError
+            positions[stream] = (moment, int(row_id))
+        return positions
+    except Exception:
+        raise ValueError("Invalid sync cursor.")
+
+
+def _rows_after(queryset, field, position, until, limit):
+    """ Keyset scan of queryset on (field, id) after position and up to until. """
+    queryset = queryset.filter(**{f"{field}__lte": until})
+    if position is not None:
+        moment, row_id = position
+        queryset = queryset.filter(Q(**{f"{field}__gt": moment}) | Q(**{field: moment, "id__gt": row_id}))
+    rows = list(queryset.order_by(field, "id")[:limit + 1])
+    return rows[:limit], len(rows) > limit
+
+
+def fetch_grocery_changes(family_ids, cursor=None, limit=SYNC_PAGE_SIZE):
+    """
+    Returns the lists and items changed, and the tombstones recorded, since cursor
+    for the given families. With no cursor every live row is returned
+    and tombstones are skipped, since the client has nothing to delete yet.
+    """
+    positions = decode_sync_cursor(cursor) if cursor else {}
+    until = timezone.now() - SYNC_SETTLE_WINDOW
+
+    lists, lists_more = _rows_after(
+        GroceryList.objects.filter(family_id__in=family_ids),
+        "updated_at", positions.get("lists"), until, limit
+    )
+    items, items_more = _rows_after(
+        GroceryItem.objects.filter(family_id__in=family_ids),
+        "updated_at", positions.get("items"), until, limit
+    )
+    if cursor:
+        tombstones, tombstones_more = _rows_after(
+            GroceryTombstone.objects.filter(family_id__in=family_ids),
+            "deleted_at", positions.get("tombstones"), until, limit
+        )
+    else:
+        tombstones, tombstones_more = [], False
+
+    next_positions = {
+        "lists": (lists[-1].updated_at, lists[-1].id) if lists else positions.get("lists"),
+        "items": (items[-1].updated_at, items[-1].id) if items else positions.get("items"),
+        "tombstones": (tombstones[-1].deleted_at, tombstones[-1].id) if tombstones else positions.get("tombstones"),
+    }
+    # A stream with no position yet has nothing at or before the settle horizon
+    for stream, position in next_positions.items():
+        if position is None:
+            next_positions[stream] = (until, 0)
+
+    return {
+        "lists": lists,
+        "items": items,
+        "tombstones": tombstones,
+        "cursor": encode_sync_cursor(next_positions),
+        "has_more": lists_more or items_more or tombstones_more,
+    }
+
+
+# ------------------------------------------------------------------------------
+# List revisions, counters and ETags
+# ------------------------------------------------------------------------------
+# GroceryList.revision goes up on every write to a list or to one of its items,
+# so (list id, revision, query string) identifies the exact representation of
+# the list and of each of its item pages. That lets GETs answer If-None-Match
+# with a 304 after one indexed lookup, without serializing anything.
+#
+# item_count / purchased_count are maintained with relative F() updates in the
+# same UPDATE, inside the transaction of the item write. Writers must take their
+# deltas from locked (or conditionally updated) rows so they stay exact.
+# ------------------------------------------------------------------------------
+def touch_grocery_list(grocery_list_id, items=0, purchased=0):
+    """ Bumps the list's revision and applies item/purchased counter deltas in one UPDATE. """
+    GroceryList.objects.filter(id=grocery_list_id).update(
+        revision=F("revision") + 1,
+        item_count=F("item_count") + items,
+        purchased_count=F("purchased_count") + purchased,
+    )
+
+
+def recount_grocery_lists(list_ids):
+    """
+    Recomputes item_count / purchased_count from the items table, for writes that
+    bypass the delta helpers (e.g. Django admin). The list row is locked before
+    counting so concurrent delta updates are neither lost nor counted twice.
+    """
+    for grocery_list_id in set(list_ids):
+        with transaction.atomic():
+            if not GroceryList.objects.select_for_update().filter(id=grocery_list_id).exists():
+                continue
+            counts = GroceryItem.objects.filter(grocery_list_id=grocery_list_id).aggregate(
+                items=Count("id"),
+                purchased=Count("id", filter=Q(purchased=True)),
+            )
+            GroceryList.objects.filter(id=grocery_list_id).update(
+                revision=F("revision") + 1,
+                item_count=counts["items"],
+                purchased_count=counts["purchased"],
+            )
+
+
+def grocery_list_etag(grocery_list_id, revision, request, version=None):
+    """
+    Strong ETag for a list, or for one page of its items, as requested by
+    request. The list's own ETag is given its version, "v<version>-<digest>",
+    so the value served by a GET is also a valid If-Match for updating the list.
+    """
+    query = "&".join(f"{key}={value}" for key, value in sorted(request.query_params.items()))
+    digest = hashlib.sha1(f"{grocery_list_id}:{revision}:{request.path}?{query}".encode()).hexdigest()
+    return f'"{digest}"' if version is None else f'"v{version}-{digest}"'
+
+
+def etag_matches(request, etag):
+    """ True if the request's If-None-Match header names etag (weak comparison, as RFC 9110 requires). """
+    header = request.headers.get("If-None-Match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    tags = [tag.strip() for tag in header.split(",")]
+    return etag in [tag[2:] if tag.startswith("W/") else tag for tag in tags]
+
+
+# ------------------------------------------------------------------------------
+# Optimistic concurrency (versions and If-Match)
+# ------------------------------------------------------------------------------
+# GroceryItem.version and GroceryList.version go up on every write to the row
+# (GroceryList.revision, by contrast, also moves with the list's items). Single
+# updates are one conditional UPDATE ... WHERE id = x AND version = n, so a
+# write based on a stale read changes nothing and is reported as a conflict,
+# and no row lock is held between the read and the write.
+#
+# Clients name the version they edited with If-Match: "v<n>" (the ETag of
+# write responses) or the "v<n>-<digest>" ETag of a list GET, only the version
+# of which is compared; or with "version" in the body. Without either, the update
+# is applied to whatever the current version is (retried if it moves meanwhile).
+# ------------------------------------------------------------------------------
+VERSION_WRITE_RETRIES = 5
+
+
+def version_etag(version):
+    return f'"v{version}"'
+
+
+def parse_if_match(request):
+    """
+    The versions named by the request's If-Match header: None without the header
+    or for "*", else a set of ints. Weak or foreign tags never match (If-Match
+    uses strong comparison), so they yield no version.
+    """
+    header = request.headers.get("If-Match")
+    if not header or header.strip() == "*":
+        return None
+    versions = set()
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag.startswith('"v') and tag.endswith('"'):
+            version = tag[2:-1].split("-", 1)[0]
+            if version.isdigit():
+                versions.add(int(version))
+    return versions
+
+
+def _versioned_update(queryset, row_id, expected_versions, read_fields, write):
+    """
+    Reads read_fields of row_id and calls write(current, version) inside a
+    transaction; write must issue the conditional UPDATE and return the number
+    of rows it changed. Returns the current row dict on success, or None when
+    the row is gone or its version is not in expected_versions.
+    """
+    for _ in range(VERSION_WRITE_RETRIES):
+        current = queryset.filter(id=row_id).values("version", *read_fields).first()
+        if current is None or (expected_versions is not None and current["version"] not in expected_versions):
+            return None
+        with transaction.atomic():
+            if write(current, current["version"]):
+                return current
+    return None
+
+
+def update_grocery_item(grocery_item, changes, expected_versions=None):
+    """
+    Applies changes (validated serializer data) to grocery_item if its version is
+    one of expected_versions (any version when None), bumps the version and
+    keeps the list counters exact. Returns the updated item, or None on conflict.
+    """
+    now = timezone.now()
+    target_list = changes.get("grocery_list")
+    if target_list is not None:
+        changes = {**changes, "family_id": target_list.family_id}
+
+    clocks = stamp_fields(changes)
+
+    def write(current, version):
+        if not GroceryItem.objects.filter(id=grocery_item.id, version=version).update(
+            **changes, version=F("version") + 1, field_clocks={**current["field_clocks"], **clocks}, updated_at=now
+        ):
+            return 0
+        # The conditional UPDATE succeeded, so current holds the exact previous values
+        was_purchased = int(current["purchased"])
+        is_purchased = int(changes.get("purchased", current["purchased"]))
+        if is_purchased != was_purchased:
+            record_purchases([(
+                changes.get("family_id", current["family_id"]), changes.get("name", current["name"]),
+                changes.get("quantity", current["quantity"]), changes.get("quantity_type", current["quantity_type"]),
+                is_purchased - was_purchased
+            )])
+        old_list = (current["grocery_list_id"], current["family_id"])
+        new_list = (target_list.id, target_list.family_id) if target_list is not None else old_list
+        if new_list == old_list:
+            deltas = {old_list: (0, is_purchased - was_purchased)}
+        else:
+            deltas = {old_list: (-1, -was_purchased), new_list: (1, is_purchased)}
+        # Touch lists in id order so opposite concurrent moves cannot deadlock
+        for grocery_list_id, family_id in sorted(deltas):
+            items, purchased = deltas[(grocery_list_id, family_id)]
+            touch_grocery_list(grocery_list_id, items=items, purchased=purchased)
+            publish_grocery_event(family_id, ITEMS_UPDATED, grocery_list_id, [grocery_item.id])
+        return 1
+
+    if _versioned_update(GroceryItem.objects, grocery_item.id, expected_versions,
+                         ("purchased", "grocery_list_id", "family_id", "field_clocks", "name", "quantity",
+                          "quantity_type"), write) is None:
+        return None
+    return GroceryItem.objects.get(id=grocery_item.id)
+
+
+def update_grocery_list(grocery_list, changes, expected_versions=None):
+    """
+    Applies changes (validated serializer data) to grocery_list if its version is
+    one of expected_versions (any version when None); bumps its version and
+    revision. Returns the updated list, or None on conflict.
+    """
+    now = timezone.now()
+
+    def write(current, version):
+        updated = GroceryList.objects.filter(id=grocery_list.id, version=version).update(
+            **changes, version=F("version") + 1, revision=F("revision") + 1, updated_at=now
+        )
+        if updated:
+            publish_grocery_event(grocery_list.family_id, LIST_UPDATED, grocery_list.id)
+        return updated
+
+    if _versioned_update(GroceryList.objects, grocery_list.id, expected_versions, (), write) is None:
+        return None
+    return GroceryList.objects.get(id=grocery_list.id)
+
+
+# ------------------------------------------------------------------------------
+# Item search
+# ------------------------------------------------------------------------------
+# Matches come from grocery_items_search_idx, a GIN index on
+# grocery_item_search_vector(), combined (bitmap AND) with the family_id index,
+# so only the family's matching rows are read. Results are ordered by (rank, id), best first, and paged with an
+# opaque keyset cursor on that pair instead of an OFFSET.
+# ------------------------------------------------------------------------------
+def encode_search_cursor(rank, item_id):
+    raw = {"r": rank, "i": item_id}
+    return base64.urlsafe_b64encode(json.dumps(raw, separators=(",", ":")).encode()).decode()
+
+
+def decode_search_cursor(cursor):
+    """ Decodes a cursor produced by encode_search_cursor. Raises ValueError if it is malformed. """
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return float(raw["r"]), int(raw["i"])
+    except Exception:
+        raise ValueError("Invalid search cursor.")
+
+
+def search_grocery_items(family_ids, text, cursor=None, limit=SEARCH_PAGE_SIZE):
+    """
+    Full-text search over item names and notes of the given families.
+    Returns {"items": [...], "cursor": str or None, "has_more": bool}; each item
+    carries its rank and grocery_list_name annotations.
+    Raises ValueError for an empty/too long query or an invalid cursor.
+    """
+    text = (text or "").strip()
+    if not text:
+        raise ValueError("Query parameter 'q' is required.")
+    if len(text) > SEARCH_MAX_QUERY_LENGTH:
+        raise ValueError(f"Query must be at most {SEARCH_MAX_QUERY_LENGTH} characters.")
+
+    query = SearchQuery(text, config=SEARCH_CONFIG, search_type="websearch")
+    document = grocery_item_search_vector()
+    # ts_rank is a real; as double precision it round-trips exactly through the cursor
+    items = GroceryItem.objects.filter(family_id__in=family_ids).alias(document=document).filter(
+        document=query
+    ).annotate(
+        rank=Cast(SearchRank(document, query), FloatField()),
+        grocery_list_name=F("grocery_list__name"),
+    )
+
+    if cursor:
+        rank, item_id = decode_search_cursor(cursor)
+        items = items.filter(Q(rank__lt=rank) | Q(rank=rank, id__lt=item_id))
+
+    rows = list(items.order_by("-rank", "-id")[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return {
+        "items": rows,
+        "cursor": encode_search_cursor(rows[-1].rank, rows[-1].id) if has_more else None,
+        "has_more": has_more,
+    }
+
+
+# ------------------------------------------------------------------------------
+# Consolidated shopping view
+# ------------------------------------------------------------------------------
+# What the family still needs across all its lists (templates aside):
+# unpurchased items grouped by normalized name (trimmed, lower-cased) and
+# quantity type, summed by one aggregate query on grocery_items_open_family_idx.
+#
+# With conversions on, each item's quantity is first converted by the best
+# matching GroceryUnitConversion for its name and unit (the family's rows before
+# the global ones, a named row before a catch-all one), so "2 Count eggs" and
+# "120 Gram eggs" add up to "240 Gram". Conversions are a single hop.
+# ------------------------------------------------------------------------------
+CONSOLIDATED_SQL = """
+    SELECT lower(btrim(i.name)) AS normalized_name,
+           COALESCE(c.to_type, i.quantity_type) AS quantity_type,
+           SUM(i.quantity * COALESCE(c.factor, 1)) AS quantity,
+           (array_agg(btrim(i.name) ORDER BY i.created_at DESC, i.id DESC))[1] AS name,
+           array_agg(i.id ORDER BY i.id) AS item_ids,
+           array_agg(DISTINCT i.grocery_list_id) AS grocery_list_ids,
+           bool_or(c.to_type IS NOT NULL) AS converted
+    FROM grocery_items i
+    LEFT JOIN LATERAL (
+        SELECT to_type, factor FROM grocery_unit_conversions
+        WHERE %(convert)s AND from_type = i.quantity_type
+          AND (family_id = i.family_id OR family_id IS NULL)
+          AND normalized_name IN (lower(btrim(i.name)), '')
+        ORDER BY family_id IS NULL, normalized_name = ''
+        LIMIT 1
+    ) c ON true
+    WHERE i.family_id = ANY(%(family_ids)s) AND NOT i.purchased{lists_sql}
+      AND i.grocery_list_id NOT IN (SELECT id FROM grocery_lists WHERE family_id = ANY(%(family_ids)s) AND is_template)
+    GROUP BY 1, 2
+    ORDER BY 1, 2
+"""
+
+
+def consolidate_grocery_items(family_ids, grocery_list_ids=None, convert=True):
+    """
+    Totals of the unpurchased items of the given families (optionally only of
+    grocery_list_ids), one row per (normalized name, quantity type) with the
+    ids of the items and lists it was summed from.
+    """
+    params = {"family_ids": list(family_ids), "convert": convert}
+    lists_sql = ""
+    if grocery_list_ids is not None:
+        lists_sql = " AND i.grocery_list_id = ANY(%(grocery_list_ids)s)"
+        params["grocery_list_ids"] = list(grocery_list_ids)
+    with connection.cursor() as cursor:
+        cursor.execute(CONSOLIDATED_SQL.format(lists_sql=lists_sql), params)
+        columns = [column.name for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
@@ -2,26 +2,137 @@ from rest_framework import serializers
 from rest_framework.serializers import (ModelSerializer,
                                         )
 from grocery.models import *
+from grocery.recurrence import first_occurrence
+from django.utils import timezone
 
-class GroceryListSerializer(serializers.ModelSerializer):
+class SparseFieldsMixin:
+    """
+    Restricts a serializer to a subset of its fields: Serializer(obj, fields=[...]).
+    Collection endpoints use Meta.compact_fields unless the client asks for
+    ?fields=a,b,c (or ?fields=all), and load only the matching columns.
+    """
+    ALL_FIELDS = "all"
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    @classmethod
+    def get_requested_fields(cls, request):
+        """ Field names for ?fields=, compact_fields by default. Raises ValueError for unknown fields. """
+        requested = request.query_params.get("fields")
+        if not requested:
+            return list(cls.Meta.compact_fields)
+        available = list(cls().fields)
+        if requested == cls.ALL_FIELDS:
+            return available
+        fields = [name.strip() for name in requested.split(",") if name.strip()]
+        unknown = [name for name in fields if name not in available]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}. Available: {', '.join(available)}")
+        return fields
+
+    @classmethod
+    def restrict_queryset(cls, queryset, fields, extra=()):
+        """ Loads only the columns of fields (plus extra, e.g. ordering fields) so large text is never read. """
+        model_fields = {field.name for field in queryset.model._meta.concrete_fields}
+        return queryset.only(*{"id", *extra, *(name for name in fields if name in model_fields)})
+
+
+class GroceryListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = GroceryList
         fields = "__all__"
-        read_only_fields = ["uuid", "created_by", "created_at", "updated_at"]
+        read_only_fields = ["uuid", "family", "revision", "version", "item_count", "purchased_count",
+                            "created_by", "created_at", "updated_at"]
+        compact_fields = ["id", "name", "family", "item_count", "purchased_count", "is_template", "version", "updated_at"]
 
     def validate_name(self, value):
         if not value or not value.strip():
             raise serializers.ValidationError("Name is required.")
         return value
 
+    def validate_family_membership(self, value):
+        # family and the items' denormalized family_id follow the membership set at creation
+        if self.instance is not None and value.id != self.instance.family_membership_id:
+            raise serializers.ValidationError("The family of an existing list cannot be changed.")
+        return value
+
+
+class GroceryListDashboardSerializer(serializers.ModelSerializer):
+    """ Compact list representation with its item counters, for the family dashboard. """
+    class Meta:
+        model = GroceryList
+        fields = ["id", "uuid", "name", "family", "family_membership", "item_count", "purchased_count",
+                  "is_template", "revision", "version", "created_at", "updated_at"]
+        read_only_fields = fields
+
 
-class GroceryItemSerializer(serializers.ModelSerializer):
+class GroceryItemSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = GroceryItem
         fields = "__all__"
-        read_only_fields = ["uuid", "created_by", "created_at", "updated_at"]
+        read_only_fields = ["uuid", "family", "version", "field_clocks", "created_by", "created_at", "updated_at"]
+        compact_fields = ["id", "name", "quantity", "quantity_type", "purchased", "version"]
 
     def validate_name(self, value):
         if not value or not value.strip():
             raise serializers.ValidationError("Name is required.")
-        return value
\ No newline at end of file
+        return value
+
+class GroceryItemBulkSerializer(GroceryItemSerializer):
+    """
+    Item serializer used by bulk operations. The grocery list is resolved
+    once by the view, so it is read-only here to avoid a lookup per item.
+    """
+    class Meta(GroceryItemSerializer.Meta):
+        read_only_fields = GroceryItemSerializer.Meta.read_only_fields + ["grocery_list"]
+
+
+class GroceryItemSearchSerializer(GroceryItemSerializer):
+    """ Item search hit: the item plus its relevance rank and the name of its list. """
+    rank = serializers.FloatField(read_only=True)
+    grocery_list_name = serializers.CharField(read_only=True)
+
+
+class GroceryListRecurrenceSerializer(serializers.ModelSerializer):
+    """
+    Schedule of a template list. next_run_on, when given, is the day to start
+    from; it is moved to the first day on or after it that matches the schedule.
+    """
+    class Meta:
+        model = GroceryListRecurrence
+        fields = ["id", "template", "frequency", "interval", "weekday", "day_of_month", "next_run_on",
+                  "last_run_on", "is_active", "created_at", "updated_at"]
+        read_only_fields = ["template", "last_run_on", "created_at", "updated_at"]
+        extra_kwargs = {"next_run_on": {"required": False}}
+
+    SCHEDULE_FIELDS = ("frequency", "interval", "weekday", "day_of_month")
+
+    def validate(self, attrs):
+        schedule = GroceryListRecurrence(**{
+            name: attrs[name] if name in attrs else getattr(self.instance or GroceryListRecurrence(), name)
+            for name in self.SCHEDULE_FIELDS
+        })
+        if schedule.interval < 1:
+            raise serializers.ValidationError({"interval": "Must be at least 1."})
+        if schedule.frequency == GroceryListRecurrence.Frequency.WEEKLY and schedule.weekday not in range(7):
+            raise serializers.ValidationError({"weekday": "Weekly recurrences need a weekday from 0 (Monday) to 6 (Sunday)."})
+        if schedule.frequency == GroceryListRecurrence.Frequency.MONTHLY and schedule.day_of_month not in range(1, 32):
+            raise serializers.ValidationError({"day_of_month": "Monthly recurrences need a day_of_month from 1 to 31."})
+
+        start = attrs.get("next_run_on") or timezone.localdate()
+        if self.instance is None or attrs.keys() & {*self.SCHEDULE_FIELDS, "next_run_on"}:
+            attrs["next_run_on"] = first_occurrence(schedule, start)
+        return attrs
+
+
+class GroceryReplenishmentSerializer(serializers.ModelSerializer):
+    """ An item the family is due to buy again, with its usual interval. """
+    class Meta:
+        model = GroceryReplenishment
+        fields = ["normalized_name", "name", "quantity", "quantity_type", "purchase_count", "interval_days",
+                  "interval_stddev_days", "last_purchased_on", "next_due_on"]
+        read_only_fields = fields
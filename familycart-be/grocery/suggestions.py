@@ -0,0 +1,169 @@
+from collections import OrderedDict
+from threading import Lock
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils import timezone
+from grocery.models import GroceryItemNameStat
+
+# ------------------------------------------------------------------------------
+# Item-name suggestions (autocomplete)
+# ------------------------------------------------------------------------------
+# GroceryItemNameStat holds one row per (family, normalized name) with a use
+# counter, upserted by record_item_names() in the transaction that creates the
+# items. Lookups are served from an in-process LRU of the hot families' name
+# tables, sorted by use_count, so a keystroke is a Python prefix scan:
+#   - record_item_names bumps a per-family generation number in Django's cache
+#     on commit; an LRU entry is only used while its generation is current.
+#     With a shared cache (CACHE_URL or REDIS_URL) every process sees new names
+#     on the next keystroke. With the per-process locmem fallback only the
+#     process that recorded them does; the others catch up when their entry
+#     expires, after at most SUGGESTION_CACHE_TTL seconds
+#   - families with more than SUGGESTION_FAMILY_NAMES names are not cached in
+#     full; their lookups use the (family, normalized_name pattern) index
+# ------------------------------------------------------------------------------
+
+SUGGESTION_LIMIT = 10
+SUGGESTION_MAX_LIMIT = 25
+SUGGESTION_FAMILY_NAMES = 2000
+
+KEY_PREFIX = "grocery:suggestions"
+
+UPSERT_SQL = """
+    INSERT INTO grocery_item_name_stats
+        (family_id, normalized_name, name, use_count, quantity, quantity_type, last_used_at)
+    VALUES {values}
+    ON CONFLICT (family_id, normalized_name) DO UPDATE SET
+        name = EXCLUDED.name,
+        use_count = grocery_item_name_stats.use_count + EXCLUDED.use_count,
+        quantity = EXCLUDED.quantity,
+        quantity_type = EXCLUDED.quantity_type,
+        last_used_at = EXCLUDED.last_used_at
+"""
+
+
+def normalize_item_name(name):
+    return (name or "").strip().lower()
+
+
+def generation_key(family_id):
+    return f"{KEY_PREFIX}:generation:{family_id}"
+
+
+class FamilyNamesLRU:
+    """
+    Least recently used cache of family id -> (generation, expires_at, names),
+    where names is None for families with too many names to hold in full.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.lock = Lock()
+
+    def get(self, family_id, generation):
+        with self.lock:
+            entry = self.entries.get(family_id)
+            if entry is None or entry[0] != generation or entry[1] < time.monotonic():
+                return None
+            self.entries.move_to_end(family_id)
+            return entry
+
+    def set(self, family_id, generation, names):
+        expires_at = time.monotonic() + getattr(settings, "SUGGESTION_CACHE_TTL", 300)
+        with self.lock:
+            self.entries[family_id] = (generation, expires_at, names)
+            self.entries.move_to_end(family_id)
+            while len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+
+
+family_names = FamilyNamesLRU(getattr(settings, "SUGGESTION_CACHE_FAMILIES", 256))
+
+
+def record_item_names(family_id, items):
+    """
+    Adds newly created items to their family's name statistics with one upsert.
+    Must run inside the transaction that creates the items.
+    """
+    stats = {}
+    for item in items:
+        normalized_name = normalize_item_name(item.name)
+        if not normalized_name:
+            continue
+        # Items arrive oldest first, so the last one of a name sets its latest quantity
+        use_count = stats[normalized_name][2] + 1 if normalized_name in stats else 1
+        stats[normalized_name] = (item.name.strip(), normalized_name, use_count, item.quantity, item.quantity_type)
+    if not stats:
+        return
+
+    now = timezone.now()
+    # Sorted so concurrent upserts lock the rows in the same order
+    rows = [stats[normalized_name] for normalized_name in sorted(stats)]
+    params = []
+    for name, normalized_name, use_count, quantity, quantity_type in rows:
+        params += [family_id, normalized_name, name, use_count, quantity, quantity_type, now]
+    with connection.cursor() as cursor:
+        cursor.execute(UPSERT_SQL.format(values=", ".join(["(%s, %s, %s, %s, %s, %s, %s)"] * len(rows))), params)
+
+    def bump():
+        key = generation_key(family_id)
+        cache.add(key, 0, None)
+        cache.incr(key)
+    transaction.on_commit(bump)
+
+
+def serialize_stat(stat):
+    return {
+        "name": stat.name,
+        "quantity": stat.quantity,
+        "quantity_type": stat.quantity_type,
+        "use_count": stat.use_count,
+    }
+
+
+def stats_queryset(family_id):
+    return GroceryItemNameStat.objects.filter(family_id=family_id).only(
+        "normalized_name", "name", "quantity", "quantity_type", "use_count"
+    ).order_by("-use_count", "-last_used_at")
+
+
+def get_family_suggestions(family_id, prefix, limit):
+    generation = cache.get(generation_key(family_id), 0)
+    entry = family_names.get(family_id, generation)
+    if entry is None:
+        stats = list(stats_queryset(family_id)[:SUGGESTION_FAMILY_NAMES + 1])
+        names = None
+        if len(stats) <= SUGGESTION_FAMILY_NAMES:
+            names = [(stat.normalized_name, serialize_stat(stat)) for stat in stats]
+        family_names.set(family_id, generation, names)
+    else:
+        names = entry[2]
+
+    if names is None:
+        return [serialize_stat(stat) for stat in stats_queryset(family_id).filter(normalized_name__startswith=prefix)[:limit]]
+
+    suggestions = []
+    for normalized_name, suggestion in names:
+        if normalized_name.startswith(prefix):
+            suggestions.append(suggestion)
+            if len(suggestions) == limit:
+                break
+    return suggestions
+
+
+def get_item_suggestions(family_ids, prefix, limit=SUGGESTION_LIMIT):
+    """
+    The most used item names of the families starting with prefix, most used
+    first, each with the quantity and quantity type it was last added with.
+    """
+    prefix = normalize_item_name(prefix)
+    if not prefix:
+        return []
+    suggestions = []
+    for family_id in family_ids:
+        suggestions += get_family_suggestions(family_id, prefix, limit)
+    if len(family_ids) > 1:
+        suggestions.sort(key=lambda suggestion: -suggestion["use_count"])
+    return suggestions[:limit]
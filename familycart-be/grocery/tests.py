@@ -1,3 +1,770 @@
-from django.test import TestCase
+import csv
+import io
+import threading
+import time
+import uuid
+from datetime import date, timedelta
+from unittest import mock
+from asgiref.sync import async_to_sync
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, connections
+from django.http import QueryDict
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from family.models import Family, FamilyMembership
+from grocery.models import (GroceryList, GroceryItem, GroceryItemNameStat, GroceryListRecurrence, GroceryPurchaseRollup,
+                            GroceryReplenishment, GroceryUnitConversion)
+from grocery.scripts import (fetch_grocery_changes, filter_grocery_items, get_item_sort_key, recount_grocery_lists,
+                             touch_grocery_list)
+from grocery.serializers import GroceryItemBulkSerializer, GroceryListSerializer
+from grocery.recurrence import instantiate_templates
+from grocery.transfer import aiter_chunks, export_records, import_records
+from user.models import User
 
-# Create your tests here.
+
+def create_member(family=None):
+    """ A user with a membership in family (a new family when None). """
+    family = family or Family.objects.create(name="Family", family_code=uuid.uuid4().hex[:20])
+    user = User.objects.create(username=uuid.uuid4().hex[:20], email=f"{uuid.uuid4().hex[:12]}@example.com")
+    return user, FamilyMembership.objects.create(user=user, family=family)
+
+
+class GroceryAPITestCase(TestCase):
+    def setUp(self):
+        self.user, self.membership = create_member()
+        self.family = self.membership.family
+        self.grocery_list = GroceryList.objects.create(name="Weekly", family_membership=self.membership, created_by=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def list_url(self, grocery_list=None):
+        return f"/api/v1/grocery/grocery-lists/{(grocery_list or self.grocery_list).id}/"
+
+
+@mock.patch("grocery.scripts.SYNC_SETTLE_WINDOW", timedelta(0))
+class DeltaSyncTests(GroceryAPITestCase):
+    url = "/api/v1/grocery/sync/"
+
+    def sync(self, cursor=None):
+        response = self.client.get(self.url, {"cursor": cursor} if cursor else {})
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+        return response.json()["payload"]
+
+    def test_snapshot_then_changes_and_tombstones(self):
+        milk = GroceryItem.objects.create(grocery_list=self.grocery_list, name="Milk")
+        eggs = GroceryItem.objects.create(grocery_list=self.grocery_list, name="Eggs")
+        other_user, other_membership = create_member()
+        other_list = GroceryList.objects.create(name="Other", family_membership=other_membership, created_by=other_user)
+        GroceryItem.objects.create(grocery_list=other_list, name="Tea")
+        recount_grocery_lists([self.grocery_list.id])
+
+        snapshot = self.sync()
+        self.assertEqual([grocery_list["id"] for grocery_list in snapshot["lists"]], [self.grocery_list.id])
+        self.assertEqual([item["name"] for item in snapshot["items"]], ["Milk", "Eggs"])
+        self.assertEqual(snapshot["deleted"], {"lists": [], "items": []})
+        self.assertFalse(snapshot["has_more"])
+        self.assertEqual(self.sync(snapshot["cursor"])["items"], [])
+
+        milk.name = "Oat milk"
+        milk.save()
+        self.assertEqual(self.client.delete(f"/api/v1/grocery/grocery-items/{eggs.id}/").status_code,
+                         status.HTTP_200_OK)
+        changes = self.sync(snapshot["cursor"])
+        self.assertEqual([item["name"] for item in changes["items"]], ["Oat milk"])
+        self.assertEqual([(row["id"], row["uuid"]) for row in changes["deleted"]["items"]], [(eggs.id, str(eggs.uuid))])
+
+        caught_up = self.sync(changes["cursor"])
+        self.assertEqual((caught_up["items"], caught_up["deleted"]["items"]), ([], []))
+
+    def test_pages_follow_the_keyset(self):
+        items = [GroceryItem.objects.create(grocery_list=self.grocery_list, name=f"Item {i}") for i in range(3)]
+        cursor, seen = None, []
+        for expected_more in (True, True, False):
+            changes = fetch_grocery_changes([self.family.id], cursor, limit=1)
+            seen += [item.id for item in changes["items"]]
+            self.assertEqual(changes["has_more"], expected_more)
+            cursor = changes["cursor"]
+        self.assertEqual(seen, [item.id for item in items])
+
+    def test_rows_are_held_back_for_the_settle_window(self):
+        with mock.patch("grocery.scripts.SYNC_SETTLE_WINDOW", timedelta(seconds=2)):
+            GroceryItem.objects.create(grocery_list=self.grocery_list, name="Milk")
+            snapshot = self.sync()
+            self.assertEqual(snapshot["items"], [])
+            later = timezone.now() + timedelta(seconds=3)
+            with mock.patch("grocery.scripts.timezone.now", return_value=later):
+                self.assertEqual([item["name"] for item in self.sync(snapshot["cursor"])["items"]], ["Milk"])
+
+    def test_malformed_cursor_is_a_bad_request(self):
+        self.assertEqual(self.client.get(self.url, {"cursor": "garbage"}).status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class VersionPreconditionTests(GroceryAPITestCase):
+    def test_get_etag_is_accepted_as_if_match(self):
+        etag = self.client.get(self.list_url())["ETag"]
+        response = self.client.patch(self.list_url(), {"name": "Monthly"}, format="json", HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["payload"]["name"], "Monthly")
+
+        # The ETag of the write response is the one a new GET serves
+        self.assertEqual(response["ETag"], self.client.get(self.list_url())["ETag"])
+        stale = self.client.patch(self.list_url(), {"name": "Yearly"}, format="json", HTTP_IF_MATCH=etag)
+        self.assertEqual(stale.status_code, status.HTTP_412_PRECONDITION_FAILED)
+
+    def test_get_etag_still_answers_304(self):
+        etag = self.client.get(self.list_url())["ETag"]
+        self.assertEqual(self.client.get(self.list_url(), HTTP_IF_NONE_MATCH=etag).status_code,
+                         status.HTTP_304_NOT_MODIFIED)
+        response = self.client.post(f"/api/v1/grocery/grocery-items/?grocery_list_id={self.grocery_list.id}",
+                                    {"name": "Eggs", "quantity": 12, "quantity_type": "Count"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.client.get(self.list_url(), HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+
+    def test_save_bumps_version(self):
+        item = GroceryItem.objects.create(grocery_list=self.grocery_list, name="Milk")
+        self.assertEqual(item.version, 1)
+        item.name = "Oat milk"
+        # The UPDATE, then the new version is read back
+        with self.assertNumQueries(2):
+            item.save()
+        self.assertEqual(item.version, 2)
+        self.assertEqual(GroceryItem.objects.get(id=item.id).version, 2)
+
+        with self.assertNumQueries(2):
+            self.grocery_list.save(update_fields=["name"])
+        self.assertEqual(self.grocery_list.version, 2)
+        self.assertEqual(GroceryList.objects.get(id=self.grocery_list.id).version, 2)
+
+
+class BulkOperationTests(GroceryAPITestCase):
+    url = "/api/v1/grocery/grocery-items/bulk/"
+
+    def setUp(self):
+        super().setUp()
+        self.milk, self.eggs, self.bread = (
+            GroceryItem.objects.create(grocery_list=self.grocery_list, name=name, purchased=purchased)
+            for name, purchased in (("Milk", False), ("Eggs", True), ("Bread", False))
+        )
+        recount_grocery_lists([self.grocery_list.id])
+
+    def bulk(self, *operations):
+        response = self.client.post(self.url, {"grocery_list_id": self.grocery_list.id, "operations": operations},
+                                    format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+        return response
+
+    def assertCountersExact(self, item_count, purchased_count):
+        self.grocery_list.refresh_from_db()
+        items = GroceryItem.objects.filter(grocery_list=self.grocery_list)
+        self.assertEqual((self.grocery_list.item_count, self.grocery_list.purchased_count),
+                         (item_count, purchased_count))
+        self.assertEqual((items.count(), items.filter(purchased=True).count()), (item_count, purchased_count))
+
+    def test_mixed_operations_keep_counters_exact(self):
+        self.bulk(
+            {"op": "create", "data": {"name": "Tea", "quantity": 1, "quantity_type": "Count", "purchased": True}},
+            {"op": "update", "id": self.milk.id, "data": {"purchased": True}},
+            {"op": "update", "id": self.eggs.id, "data": {"name": "Brown eggs"}},
+            {"op": "delete", "id": self.bread.id},
+        )
+        self.assertCountersExact(3, 3)
+        rollups = GroceryPurchaseRollup.objects.filter(family=self.family)
+        self.assertEqual(sorted(rollups.values_list("normalized_name", "item_count")), [("milk", 1), ("tea", 1)])
+
+        self.eggs.refresh_from_db()
+        self.assertEqual((self.eggs.name, self.eggs.purchased, self.eggs.version), ("Brown eggs", True, 2))
+        self.assertEqual(set(self.eggs.field_clocks), {"name"})
+        self.milk.refresh_from_db()
+        self.assertEqual(set(self.milk.field_clocks), {"purchased"})
+
+    def test_fields_an_operation_does_not_set_keep_concurrent_writes(self):
+        is_valid = GroceryItemBulkSerializer.is_valid
+
+        def is_valid_then_concurrent_purchase(serializer, *args, **kwargs):
+            # Another request buys the milk after the batch has read its items
+            if not GroceryItem.objects.get(id=self.milk.id).purchased:
+                GroceryItem.objects.filter(id=self.milk.id).update(purchased=True)
+                touch_grocery_list(self.grocery_list.id, purchased=1)
+            return is_valid(serializer, *args, **kwargs)
+
+        with mock.patch.object(GroceryItemBulkSerializer, "is_valid", is_valid_then_concurrent_purchase):
+            self.bulk(
+                {"op": "update", "id": self.milk.id, "data": {"name": "Oat milk"}},
+                {"op": "update", "id": self.bread.id, "data": {"purchased": True}},
+            )
+        self.milk.refresh_from_db()
+        self.assertEqual((self.milk.name, self.milk.purchased), ("Oat milk", True))
+        self.assertCountersExact(3, 3)
+        self.assertEqual(list(GroceryPurchaseRollup.objects.values_list("normalized_name", "item_count")), [("bread", 1)])
+
+
+class ListCounterTests(GroceryAPITestCase):
+    def test_dashboard_reads_the_counters_in_one_query(self):
+        GroceryList.objects.create(name="Party", family_membership=self.membership, created_by=self.user)
+        self.client.post(f"/api/v1/grocery/grocery-items/?grocery_list_id={self.grocery_list.id}",
+                         {"name": "Milk", "quantity": 1, "quantity_type": "Count", "purchased": True}, format="json")
+        self.client.get("/api/v1/grocery/dashboard/")  # caches the memberships
+        with self.assertNumQueries(1):
+            payload = self.client.get("/api/v1/grocery/dashboard/").json()["payload"]
+        self.assertEqual([(row["name"], row["item_count"], row["purchased_count"]) for row in payload],
+                         [("Party", 0, 0), ("Weekly", 1, 1)])
+
+
+class ConsolidatedViewTests(GroceryAPITestCase):
+    url = "/api/v1/grocery/consolidated/"
+
+    def setUp(self):
+        super().setUp()
+        self.party = GroceryList.objects.create(name="Party", family_membership=self.membership, created_by=self.user)
+        template = GroceryList.objects.create(name="Template", family_membership=self.membership, is_template=True)
+        self.eggs = GroceryItem.objects.create(grocery_list=self.grocery_list, name="Eggs", quantity=2)
+        self.party_eggs = GroceryItem.objects.create(grocery_list=self.party, name=" eggs ", quantity=120,
+                                                     quantity_type=GroceryItem.QuantityType.GRAM)
+        GroceryItem.objects.create(grocery_list=self.party, name="Milk", purchased=True)
+        GroceryItem.objects.create(grocery_list=template, name="Eggs", quantity=12)
+        GroceryUnitConversion.objects.create(family=self.family, normalized_name="eggs", factor=60,
+                                             from_type=GroceryItem.QuantityType.COUNT,
+                                             to_type=GroceryItem.QuantityType.GRAM)
+
+    def consolidated(self, query=""):
+        response = self.client.get(f"{self.url}?{query}")
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+        return response.json()["payload"]
+
+    def test_totals_across_lists_with_conversions(self):
+        [row] = self.consolidated()
+        self.assertEqual((row["normalized_name"], row["quantity_type"], row["quantity"], row["converted"]),
+                         ("eggs", "Gram", 240.0, True))
+        self.assertEqual(row["item_ids"], [self.eggs.id, self.party_eggs.id])
+        self.assertEqual(sorted(row["grocery_list_ids"]), sorted([self.grocery_list.id, self.party.id]))
+
+        rows = self.consolidated("convert=false")
+        self.assertEqual([(row["quantity_type"], row["quantity"]) for row in rows], [("Count", 2.0), ("Gram", 120.0)])
+        [row] = self.consolidated(f"grocery_list_ids={self.party.id}")
+        self.assertEqual(row["item_ids"], [self.party_eggs.id])
+
+    def test_one_query_whatever_the_number_of_lists(self):
+        self.consolidated()  # caches the memberships
+        with self.assertNumQueries(1):
+            self.consolidated()
+        for i in range(5):
+            extra = GroceryList.objects.create(name=f"List {i}", family_membership=self.membership)
+            GroceryItem.objects.create(grocery_list=extra, name=f"Item {i}")
+        with self.assertNumQueries(1):
+            self.assertEqual(len(self.consolidated()), 6)
+
+    def test_invalid_parameters_are_bad_requests(self):
+        for query in ("convert=maybe", "grocery_list_ids=1,x"):
+            self.assertEqual(self.client.get(f"{self.url}?{query}").status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ConcurrentCounterTests(TransactionTestCase):
+    """ Counters stay exact when writers of every kind race on the same list. """
+
+    def test_counters_stay_exact_under_concurrent_writes(self):
+        user, membership = create_member()
+        grocery_list = GroceryList.objects.create(name="Weekly", family_membership=membership, created_by=user)
+        items = [GroceryItem.objects.create(grocery_list=grocery_list, name=f"Item {i}") for i in range(6)]
+        recount_grocery_lists([grocery_list.id])
+        list_url = f"/api/v1/grocery/grocery-lists/{grocery_list.id}/"
+        items_url = "/api/v1/grocery/grocery-items/"
+
+        def toggle(client, n):
+            item = items[n % 3]
+            return client.patch(f"{items_url}{item.id}/", {"purchased": n % 2 == 0}, format="json")
+
+        def add(client, n):
+            return client.post(f"{items_url}?grocery_list_id={grocery_list.id}",
+                               {"name": f"New {n}", "quantity": 1, "quantity_type": "Count", "purchased": n % 2 == 0},
+                               format="json")
+
+        def mark_all(client, n):
+            return client.post(f"{list_url}mark-purchased/", {"purchased": n % 2 == 1}, format="json")
+
+        def bulk(client, n):
+            return client.post(f"{items_url}bulk/", {"grocery_list_id": grocery_list.id, "operations": [
+                {"op": "update", "id": items[3 + n % 3].id, "data": {"purchased": n % 2 == 0}},
+                {"op": "create", "data": {"name": f"Bulk {n}", "quantity": 1, "quantity_type": "Count"}},
+            ]}, format="json")
+
+        writers = [toggle, toggle, add, mark_all, bulk]
+        barrier = threading.Barrier(len(writers))
+        statuses = []
+
+        def run(writer):
+            client = APIClient()
+            client.force_authenticate(user)
+            barrier.wait()
+            try:
+                for n in range(5):
+                    statuses.append((writer.__name__, writer(client, n).status_code))
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=run, args=(writer,)) for writer in writers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([entry for entry in statuses if entry[1] >= 300], [])
+        grocery_list.refresh_from_db()
+        rows = GroceryItem.objects.filter(grocery_list=grocery_list)
+        self.assertEqual((grocery_list.item_count, grocery_list.purchased_count),
+                         (rows.count(), rows.filter(purchased=True).count()))
+        self.assertEqual(grocery_list.item_count, 6 + 5 + 5)
+
+
+class ItemSearchTests(GroceryAPITestCase):
+    url = "/api/v1/grocery/grocery-items/search/"
+
+    def setUp(self):
+        super().setUp()
+        for name, note in (("Bread", "<p>Goes with the milk &amp; jam</p>"), ("Whole milk", None),
+                           ("Milk chocolate", None), ("Cheese", "Cheddar"), ("Eggs", None)):
+            GroceryItem.objects.create(grocery_list=self.grocery_list, name=name, note=note)
+        other_user, other_membership = create_member()
+        other_list = GroceryList.objects.create(name="Other", family_membership=other_membership, created_by=other_user)
+        GroceryItem.objects.create(grocery_list=other_list, name="Milk")
+
+    def search(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+        return response.json()["payload"]
+
+    def names(self, **params):
+        return [item["name"] for item in self.search(**params)["results"]]
+
+    def test_name_matches_rank_above_note_matches(self):
+        results = self.search(q="milk")["results"]
+        self.assertEqual(set(item["name"] for item in results[:2]), {"Whole milk", "Milk chocolate"})
+        self.assertEqual(results[2]["name"], "Bread")
+        self.assertGreater(results[1]["rank"], results[2]["rank"])
+        self.assertEqual(results[0]["grocery_list_name"], "Weekly")
+
+    def test_websearch_syntax_and_stemming(self):
+        self.assertEqual(self.names(q="milk -chocolate"), ["Whole milk", "Bread"])
+        self.assertEqual(self.names(q='"whole milk"'), ["Whole milk"])
+        self.assertEqual(self.names(q="egg"), ["Eggs"])
+        self.assertEqual(self.names(q="cheddar"), ["Cheese"])
+
+    def test_pages_follow_the_ranking(self):
+        everything = self.names(q="milk")
+        pages, cursor = [], None
+        while True:
+            params = {"q": "milk", "page_size": 1, **({"cursor": cursor} if cursor else {})}
+            payload = self.search(**params)
+            pages += [item["name"] for item in payload["results"]]
+            cursor = payload["cursor"]
+            if not payload["has_more"]:
+                break
+        self.assertEqual(pages, everything)
+
+    def test_invalid_queries_are_bad_requests(self):
+        for params in ({}, {"q": "milk", "cursor": "garbage"}):
+            self.assertEqual(self.client.get(self.url, params).status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class IdempotencyTests(GroceryAPITestCase):
+    def post_item(self, key, name="Milk"):
+        return self.client.post(f"/api/v1/grocery/grocery-items/?grocery_list_id={self.grocery_list.id}",
+                                {"name": name, "quantity": 1, "quantity_type": "Count"}, format="json",
+                                HTTP_IDEMPOTENCY_KEY=key)
+
+    def check_replay(self):
+        first = self.post_item("key-1")
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(first.has_header("Idempotent-Replayed"))
+
+        replay = self.post_item("key-1")
+        self.assertEqual(replay.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(replay["Idempotent-Replayed"], "true")
+        self.assertEqual(replay.json(), first.json())
+        self.assertEqual(GroceryItem.objects.filter(grocery_list=self.grocery_list).count(), 1)
+
+        mismatch = self.post_item("key-1", name="Eggs")
+        self.assertEqual(mismatch.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(GroceryItem.objects.filter(grocery_list=self.grocery_list).count(), 1)
+
+        self.assertEqual(self.post_item("key-2", name="Eggs").status_code, status.HTTP_201_CREATED)
+        self.assertEqual(GroceryItem.objects.filter(grocery_list=self.grocery_list).count(), 2)
+
+    def test_replay_with_the_database_store(self):
+        self.check_replay()
+
+    @override_settings(IDEMPOTENCY_STORE="cache")
+    def test_replay_with_the_cache_store(self):
+        self.check_replay()
+
+    def test_keys_are_scoped_to_the_user(self):
+        self.assertEqual(self.post_item("key-1").status_code, status.HTTP_201_CREATED)
+        other_user, _ = create_member(self.family)
+        self.client.force_authenticate(other_user)
+        replay = self.post_item("key-1", name="Eggs")
+        self.assertEqual(replay.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(replay.has_header("Idempotent-Replayed"))
+
+
+class ImportTests(GroceryAPITestCase):
+    def import_dump(self, membership):
+        records = list(enumerate(export_records(GroceryList.objects.filter(id=self.grocery_list.id)), start=1))
+        return import_records(records, membership, membership.user)
+
+    def test_imported_rows_get_new_uuids(self):
+        item = GroceryItem.objects.create(grocery_list=self.grocery_list, name="Milk")
+        _, other_membership = create_member()
+        self.assertEqual(self.import_dump(other_membership), {"lists": 1, "items": 1})
+        self.assertEqual(self.import_dump(self.membership), {"lists": 1, "items": 1})
+
+        self.assertEqual(GroceryItem.objects.filter(uuid=item.uuid).count(), 1)
+        self.assertEqual(GroceryList.objects.filter(uuid=self.grocery_list.uuid).count(), 1)
+        self.assertEqual(GroceryItem.objects.filter(name="Milk").values("uuid").distinct().count(), 3)
+
+    @mock.patch("grocery.transfer.IMPORT_BATCH_SIZE", 1)
+    def test_rows_are_stamped_at_commit(self):
+        list_uuid = str(uuid.uuid4())
+        inserted = []
+
+        def records():
+            yield 1, {"record": "list", "uuid": list_uuid, "name": "Imported"}
+            yield 2, {"record": "item", "list_uuid": list_uuid, "name": "Milk"}
+            # The item batch is inserted by now, long before the import commits
+            inserted.append(timezone.now())
+
+        import_records(records(), self.membership, self.user)
+        item = GroceryItem.objects.get(grocery_list__name="Imported")
+        self.assertGreater(item.updated_at, inserted[0])
+        self.assertGreater(item.grocery_list.updated_at, inserted[0])
+
+    def test_invalid_files_are_rejected(self):
+        uploads = (
+            ("ndjson", b'{"record": "list", "name": "Caf\xe9"}\n'),
+            ("ndjson", b'{"record": "list", "name": 5}\n'),
+            ("csv", b"record,name\nlist,\"" + b"x" * (csv.field_size_limit() + 1) + b"\"\n"),
+        )
+        for output, content in uploads:
+            response = self.client.post(
+                f"/api/v1/grocery/import/?output={output}&family_id={self.family.id}",
+                {"file": SimpleUploadedFile(f"dump.{output}", content)}, format="multipart"
+            )
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, content[:40])
+            self.assertTrue(response.json()["payload"].startswith("Line "), response.json())
+        self.assertEqual(GroceryList.objects.filter(family=self.family).count(), 1)
+
+
+class ExportTests(GroceryAPITestCase):
+    def test_chunks_are_read_lazily(self):
+        consumed = []
+
+        def lines():
+            for i in range(10):
+                consumed.append(i)
+                yield f"{i}\n"
+
+        async def first_chunk():
+            chunks = aiter_chunks(lines(), lines_per_chunk=3)
+            chunk = await anext(chunks)
+            await chunks.aclose()
+            return chunk
+
+        self.assertEqual(async_to_sync(first_chunk)(), "0\n1\n2\n")
+        self.assertEqual(consumed, [0, 1, 2])
+
+    def test_invalid_filters_are_rejected(self):
+        for query in ("grocery_list_id=abc", "family_id=1.5"):
+            response = self.client.get(f"/api/v1/grocery/export/?output=csv&{query}")
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, query)
+
+    async def test_asgi_export_streams_asynchronously(self):
+        headers = {"authorization": f"Bearer {AccessToken.for_user(self.user)}"}
+        response = await self.async_client.get("/api/v1/grocery/export/?output=csv", headers=headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.is_async)
+        content = b"".join([part async for part in response.streaming_content]).decode()
+        self.assertEqual(content.splitlines()[1].split(",")[:2], ["list", str(self.grocery_list.uuid)])
+
+
+class OpLogTests(GroceryAPITestCase):
+    def test_set_ignores_same_uuid_in_another_family(self):
+        item = GroceryItem.objects.create(grocery_list=self.grocery_list, name="Milk")
+        other_user, other_membership = create_member()
+        other_list = GroceryList.objects.create(name="Other", family_membership=other_membership, created_by=other_user)
+        other_item = GroceryItem.objects.create(grocery_list=other_list, name="Tea", uuid=item.uuid)
+
+        clock = f"{int(time.time() * 1000)}:0:client"
+        response = self.client.post("/api/v1/grocery/oplog/", {"operations": [
+            {"op": "set", "item": str(item.uuid), "hlc": clock, "fields": {"name": "Oat milk"}},
+        ]}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+        item.refresh_from_db()
+        other_item.refresh_from_db()
+        self.assertEqual(item.name, "Oat milk")
+        self.assertEqual(other_item.name, "Tea")
+
+
+def item_index_name(*fields):
+    return next(index.name for index in GroceryItem._meta.indexes if index.fields == list(fields))
+
+
+class ItemQueryPlanTests(TestCase):
+    """
+    Each filter / sort shape of GroceryItemAPIView.get is served by its
+    composite index (migration 0015), checked with EXPLAIN on lists of 2000
+    items where filters are as selective as in real lists.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        user, membership = create_member()
+        lists = [GroceryList.objects.create(name=f"List {i}", family_membership=membership) for i in range(10)]
+        GroceryItem.objects.bulk_create([
+            GroceryItem(
+                grocery_list=grocery_list,
+                family_id=membership.family_id,
+                name=f"{'zucchini' if i % 500 == 0 else 'item'} {i}",
+                purchased=i % 50 == 0,
+                quantity_type=GroceryItem.QuantityType.GRAM if i % 40 == 0 else GroceryItem.QuantityType.COUNT,
+            )
+            for grocery_list in lists for i in range(2000)
+        ], batch_size=5000)
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE grocery_items")
+        cls.family_id = membership.family_id
+        cls.grocery_list = lists[3]
+
+    def plan(self, query):
+        """ EXPLAIN of the first page GroceryItemAPIView.get would read for the query string. """
+        params = QueryDict(query)
+        sort = get_item_sort_key(params)
+        items = filter_grocery_items(
+            GroceryItem.objects.filter(grocery_list_id=self.grocery_list.id, family_id__in=[self.family_id]), params
+        )
+        return items.order_by(sort, "-id" if sort.startswith("-") else "id")[:20].explain()
+
+    def assertUsesIndex(self, query, index_name, backward=False):
+        plan = self.plan(query)
+        scan = f"Index Scan{' Backward' if backward else ''} using {index_name} "
+        self.assertIn(scan, plan, plan)
+
+    def test_purchased_filter(self):
+        self.assertUsesIndex("purchased=true", item_index_name("grocery_list", "purchased", "-created_at", "-id"))
+        self.assertUsesIndex("purchased=true&sort=created_at",
+                             item_index_name("grocery_list", "purchased", "-created_at", "-id"), backward=True)
+
+    def test_quantity_type_filter(self):
+        self.assertUsesIndex("quantity_type=Gram", item_index_name("grocery_list", "quantity_type", "-created_at", "-id"))
+
+    def test_name_prefix_filter(self):
+        self.assertUsesIndex("name=zucc", "grocery_items_name_prefix_idx")
+
+    def test_name_sort(self):
+        self.assertUsesIndex("sort=name", item_index_name("grocery_list", "name", "id"))
+        self.assertUsesIndex("sort=-name", item_index_name("grocery_list", "name", "id"), backward=True)
+
+    def test_updated_at_sort(self):
+        self.assertUsesIndex("sort=updated_at", item_index_name("grocery_list", "updated_at", "id"))
+        self.assertUsesIndex("sort=-updated_at", item_index_name("grocery_list", "updated_at", "id"), backward=True)
+
+    def test_created_at_sort(self):
+        self.assertUsesIndex("", item_index_name("grocery_list", "-created_at", "-id"))
+        self.assertUsesIndex("sort=created_at", item_index_name("grocery_list", "-created_at", "-id"), backward=True)
+
+
+class GroceryListUpdateTests(GroceryAPITestCase):
+    def test_family_membership_cannot_move_the_list(self):
+        _, other_membership = create_member()
+        serializer = GroceryListSerializer(self.grocery_list, data={"family_membership": other_membership.id}, partial=True)
+        self.assertFalse(serializer.is_valid())
+        self.assertIn("family_membership", serializer.errors)
+
+        response = self.client.patch(self.list_url(), {"family_membership": other_membership.id}, format="json")
+        self.assertIn(response.status_code, (status.HTTP_400_BAD_REQUEST, status.HTTP_403_FORBIDDEN))
+        self.grocery_list.refresh_from_db()
+        self.assertEqual(self.grocery_list.family_membership_id, self.membership.id)
+        self.assertEqual(self.grocery_list.family_id, self.family.id)
+
+        response = self.client.patch(self.list_url(), {"family_membership": self.membership.id, "name": "Monthly"},
+                                     format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class MarkPurchasedTests(GroceryAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.item = GroceryItem.objects.create(grocery_list=self.grocery_list, name="Milk", purchased=True)
+        recount_grocery_lists([self.grocery_list.id])
+        self.url = f"{self.list_url()}mark-purchased/"
+
+    def test_form_encoded_false_unmarks(self):
+        response = self.client.post(self.url, {"purchased": "false"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.item.refresh_from_db()
+        self.assertFalse(self.item.purchased)
+
+    def test_invalid_values_are_rejected(self):
+        for body in ({"purchased": None}, {"purchased": "maybe"}, {"item_ids": [True]}):
+            response = self.client.post(self.url, body, format="json")
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, body)
+        self.item.refresh_from_db()
+        self.assertTrue(self.item.purchased)
+
+
+class MergeOnAddTests(GroceryAPITestCase):
+    def test_suggestions_learn_the_added_quantity(self):
+        url = f"/api/v1/grocery/grocery-items/?grocery_list_id={self.grocery_list.id}&merge=true"
+        for quantity in (2, 3):
+            self.client.post(url, {"name": "Milk", "quantity": quantity, "quantity_type": "Liter"}, format="json")
+        item = GroceryItem.objects.get(grocery_list=self.grocery_list)
+        self.assertEqual(item.quantity, 5)
+        stat = GroceryItemNameStat.objects.get(family=self.family, normalized_name="milk")
+        self.assertEqual((stat.quantity, stat.use_count), (3, 2))
+
+
+class KeysetCursorTests(GroceryAPITestCase):
+    def test_malformed_cursor_is_a_bad_request(self):
+        GroceryItem.objects.create(grocery_list=self.grocery_list, name="Milk")
+        urls = (
+            f"/api/v1/grocery/grocery-items/?grocery_list_id={self.grocery_list.id}&pagination=cursor",
+            "/api/v1/grocery/grocery-lists/?pagination=cursor",
+        )
+        for url in urls:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK, url)
+            for cursor in ("garbage", "e30", "eyJjIjoxLCJpIjoxfQ"):
+                response = self.client.get(f"{url}&cursor={cursor}")
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, (url, cursor))
+                self.assertEqual(response.json(), {"message": "error", "payload": "Invalid cursor", "status": 0})
+
+
+class PurchaseAnalyticsTests(GroceryAPITestCase):
+    def setUp(self):
+        super().setUp()
+        GroceryItem.objects.create(grocery_list=self.grocery_list, name="Milk ", quantity=2,
+                                   quantity_type=GroceryItem.QuantityType.LITER)
+        recount_grocery_lists([self.grocery_list.id])
+        response = self.client.post(f"{self.list_url()}mark-purchased/", {"purchased": True}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def rollups(self, family):
+        return list(GroceryPurchaseRollup.objects.filter(family=family).values_list("normalized_name", "item_count"))
+
+    def test_analytics_reads_the_rollups(self):
+        payload = self.client.get("/api/v1/grocery/analytics/?period=month").json()["payload"]
+        self.assertEqual([period["items"] for period in payload["periods"]], [1])
+        self.assertEqual(payload["periods"][0]["quantities"], {"Liter": 2.0})
+        self.assertEqual([(item["normalized_name"], item["items"]) for item in payload["top_items"]], [("milk", 1)])
+        self.assertEqual(self.client.get("/api/v1/grocery/analytics/?period=day").status_code,
+                         status.HTTP_400_BAD_REQUEST)
+
+    def test_backfill_keeps_the_history_of_cleared_items(self):
+        self.client.post(f"{self.list_url()}clear-purchased/")
+        self.assertFalse(GroceryItem.objects.filter(grocery_list=self.grocery_list).exists())
+        call_command("backfill_purchase_rollups", stdout=io.StringIO())
+        self.assertEqual(self.rollups(self.family), [("milk", 1)])
+
+    def test_backfill_seeds_families_without_rollups(self):
+        other_user, other_membership = create_member()
+        other_list = GroceryList.objects.create(name="Old", family_membership=other_membership, created_by=other_user)
+        GroceryItem.objects.create(grocery_list=other_list, name="Tea", purchased=True)
+        GroceryItem.objects.create(grocery_list=self.grocery_list, name="Coffee", purchased=True)
+        call_command("backfill_purchase_rollups", stdout=io.StringIO())
+        self.assertEqual(self.rollups(other_membership.family), [("tea", 1)])
+        self.assertEqual(self.rollups(self.family), [("milk", 1)])
+
+
+class TemplateTests(GroceryAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.template = GroceryList.objects.create(name="Saturday shop", family_membership=self.membership,
+                                                   created_by=self.user, is_template=True)
+        GroceryItem.objects.create(grocery_list=self.template, name="Milk", quantity=2)
+        GroceryItem.objects.create(grocery_list=self.template, name="Eggs", quantity=12, purchased=True)
+
+    def lists_from_template(self):
+        return GroceryList.objects.filter(name__startswith="Saturday shop", is_template=False)
+
+    def test_instantiate_clones_items_unpurchased(self):
+        response = self.client.post(f"{self.list_url(self.template)}instantiate/", {"name": "This week"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.content)
+        grocery_list = GroceryList.objects.get(id=response.json()["payload"]["id"])
+        self.assertEqual((grocery_list.name, grocery_list.is_template, grocery_list.family_id),
+                         ("This week", False, self.family.id))
+        self.assertEqual((grocery_list.item_count, grocery_list.purchased_count), (2, 0))
+        self.assertEqual(sorted(grocery_list.items.values_list("name", "quantity", "purchased")),
+                         [("Eggs", 12.0, False), ("Milk", 2.0, False)])
+
+        response = self.client.post(f"{self.list_url()}instantiate/", format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_cloning_takes_a_fixed_number_of_queries(self):
+        def count_queries(templates):
+            with CaptureQueriesContext(connection) as queries:
+                instantiate_templates([(template, "Copy", self.user.id) for template in templates])
+            return len(queries)
+
+        templates = [self.template]
+        for i in range(3):
+            template = GroceryList.objects.create(name=f"Template {i}", family_membership=self.membership, is_template=True)
+            GroceryItem.objects.create(grocery_list=template, name="Bread")
+            templates.append(template)
+        self.assertEqual(count_queries(templates[:1]), count_queries(templates))
+
+    def test_missed_runs_create_one_list_and_keep_the_schedule(self):
+        response = self.client.put(f"{self.list_url(self.template)}recurrence/",
+                                   {"frequency": "weekly", "weekday": 5, "next_run_on": "2026-10-01"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.content)
+        self.assertEqual(response.json()["payload"]["next_run_on"], "2026-10-03")
+
+        # Two Saturdays were missed by 2026-10-18
+        for _ in range(2):
+            call_command("materialize_recurring_lists", "--date", "2026-10-18", stdout=io.StringIO())
+        self.assertEqual(list(self.lists_from_template().values_list("name", "item_count")),
+                         [("Saturday shop (2026-10-18)", 2)])
+        recurrence = GroceryListRecurrence.objects.get(template=self.template)
+        self.assertEqual((recurrence.last_run_on, recurrence.next_run_on), (date(2026, 10, 18), date(2026, 10, 24)))
+
+    def test_monthly_runs_clamp_to_short_months(self):
+        GroceryListRecurrence.objects.create(template=self.template, frequency="monthly", day_of_month=31,
+                                             next_run_on=date(2026, 1, 31))
+        call_command("materialize_recurring_lists", "--date", "2026-01-31", stdout=io.StringIO())
+        self.assertEqual(GroceryListRecurrence.objects.get(template=self.template).next_run_on, date(2026, 2, 28))
+        self.assertEqual(self.lists_from_template().count(), 1)
+
+
+class ReplenishmentTests(GroceryAPITestCase):
+    url = "/api/v1/grocery/grocery-items/replenishment/"
+
+    def setUp(self):
+        super().setUp()
+        today = timezone.localdate()
+        GroceryItemNameStat.objects.create(family=self.family, normalized_name="coffee", name="Coffee", use_count=3)
+        for days_ago, item_count in ((21, 1), (14, 2), (7, 1), (3, 0)):
+            GroceryPurchaseRollup.objects.create(family=self.family, day=today - timedelta(days=days_ago),
+                                                 normalized_name="coffee", item_count=item_count,
+                                                 quantity=item_count * 500, quantity_type="Gram")
+        # Bought twice only: below the minimum
+        for days_ago in (10, 5):
+            GroceryPurchaseRollup.objects.create(family=self.family, day=today - timedelta(days=days_ago),
+                                                 normalized_name="tea", item_count=1, quantity=1)
+        call_command("predict_replenishment", stdout=io.StringIO())
+
+    def test_predictions_come_from_the_rollups(self):
+        # There are no purchased items left: the rollups alone are the history
+        self.assertFalse(GroceryItem.objects.exists())
+        payload = self.client.get(self.url).json()["payload"]
+        self.assertEqual(len(payload), 1)
+        self.assertEqual(
+            {key: payload[0][key] for key in ("name", "quantity", "quantity_type", "purchase_count", "interval_days")},
+            {"name": "Coffee", "quantity": 500.0, "quantity_type": "Gram", "purchase_count": 3, "interval_days": 7.0}
+        )
+        self.assertEqual(payload[0]["next_due_on"], timezone.localdate().isoformat())
+        self.assertEqual(GroceryReplenishment.objects.count(), 1)
+
+    def test_items_already_on_a_list_are_not_due(self):
+        GroceryItem.objects.create(grocery_list=self.grocery_list, name=" COFFEE")
+        self.assertEqual(self.client.get(self.url).json()["payload"], [])
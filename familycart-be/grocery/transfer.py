@@ -0,0 +1,246 @@
+import csv
+import json
+import uuid
+from itertools import islice
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from grocery.models import GroceryList, GroceryItem
+from grocery.events import publish_grocery_event, LIST_CREATED
+from grocery.suggestions import record_item_names
+
+# ------------------------------------------------------------------------------
+# Export / import of grocery lists
+# ------------------------------------------------------------------------------
+# A dump is a sequence of records: every list first, then every item, each
+# item pointing at its list through list_uuid. NDJSON writes one JSON object
+# per line; CSV writes the same records as rows under TRANSFER_COLUMNS.
+#
+# Exports stream rows from server-side cursors (.iterator(chunk_size)) and
+# imports read the upload line by line and insert with batched bulk_create,
+# so neither holds the whole dump in memory. Under ASGI a sync streaming body
+# would be read to the end before the first byte is sent, so ASGI requests get
+# the rendered lines through aiter_chunks instead.
+# ------------------------------------------------------------------------------
+
+TRANSFER_FORMATS = ("ndjson", "csv")
+EXPORT_CHUNK_SIZE = 2000
+IMPORT_BATCH_SIZE = 5000
+
+RECORD_LIST = "list"
+RECORD_ITEM = "item"
+
+LIST_COLUMNS = ("uuid", "name", "description", "created_at")
+ITEM_COLUMNS = ("uuid", "list_uuid", "name", "quantity", "quantity_type", "purchased", "note", "created_at")
+TRANSFER_COLUMNS = ("record", "uuid", "list_uuid", "name", "description", "quantity", "quantity_type",
+                    "purchased", "note", "created_at")
+
+
+class TransferError(ValueError):
+    """ An invalid import record; carries the 1-based line/row number. """
+
+    def __init__(self, line, message):
+        super().__init__(f"Line {line}: {message}")
+
+
+def export_records(lists):
+    """ Yields the list and item records of the given GroceryList queryset. """
+    list_rows = lists.order_by("id").values_list("uuid", "name", "description", "created_at")
+    for row in list_rows.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield {"record": RECORD_LIST, **dict(zip(LIST_COLUMNS, row))}
+
+    item_rows = GroceryItem.objects.filter(grocery_list__in=lists).order_by("grocery_list_id", "id").values_list(
+        "uuid", "grocery_list__uuid", "name", "quantity", "quantity_type", "purchased", "note", "created_at"
+    )
+    for row in item_rows.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield {"record": RECORD_ITEM, **dict(zip(ITEM_COLUMNS, row))}
+
+
+def _export_value(value):
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return value
+
+
+def render_ndjson(records):
+    for record in records:
+        yield json.dumps({key: _export_value(value) for key, value in record.items()}) + "\n"
+
+
+class _Echo:
+    """ File-like object whose write() hands the line back to the csv writer's caller. """
+
+    def write(self, value):
+        return value
+
+
+def render_csv(records):
+    writer = csv.DictWriter(_Echo(), fieldnames=TRANSFER_COLUMNS)
+    yield writer.writeheader()
+    for record in records:
+        yield writer.writerow({key: _export_value(value) for key, value in record.items()})
+
+
+async def aiter_chunks(lines, lines_per_chunk=EXPORT_CHUNK_SIZE):
+    """
+    Async iterator over the rendered lines of a dump, joined lines_per_chunk at a
+    time. Each chunk is read in the request's sync thread, which holds the DB
+    connection of the server-side cursors.
+    """
+    lines = iter(lines)
+    next_chunk = sync_to_async(lambda: "".join(islice(lines, lines_per_chunk)))
+    try:
+        while chunk := await next_chunk():
+            yield chunk
+    finally:
+        if hasattr(lines, "close"):
+            await sync_to_async(lines.close)()
+
+
+def _decode_lines(upload):
+    """ Yields the upload's lines as text, each keeping its line ending. """
+    for line, raw in enumerate(upload, start=1):
+        try:
+            yield raw.decode("utf-8")
+        except UnicodeDecodeError:
+            raise TransferError(line, "the file is not UTF-8 text.")
+
+
+def read_records(upload, file_format):
+    """ Yields (line number, record dict) from an uploaded dump, reading it incrementally. """
+    if file_format == "csv":
+        reader = csv.DictReader(_decode_lines(upload))
+        try:
+            for line, row in enumerate(reader, start=2):
+                yield line, row
+        except csv.Error as e:
+            raise TransferError(reader.line_num, f"invalid CSV: {e}.")
+        return
+    for line, raw in enumerate(_decode_lines(upload), start=1):
+        if not raw.strip():
+            continue
+        try:
+            record = json.loads(raw)
+        except ValueError:
+            raise TransferError(line, "invalid JSON.")
+        if not isinstance(record, dict):
+            raise TransferError(line, "expected a JSON object.")
+        yield line, record
+
+
+def _parse_name(line, value):
+    if not isinstance(value, str) or not value.strip():
+        raise TransferError(line, "name is required.")
+    return value.strip()[:255]
+
+
+def _parse_uuid(line, value, required=False):
+    if value in (None, ""):
+        if required:
+            raise TransferError(line, "uuid is required.")
+        return uuid.uuid4()
+    try:
+        return uuid.UUID(str(value))
+    except ValueError:
+        raise TransferError(line, f"invalid uuid {value!r}.")
+
+
+def _parse_bool(line, value):
+    if isinstance(value, bool):
+        return value
+    if value in (None, "", "false", "False", "0"):
+        return False
+    if value in ("true", "True", "1"):
+        return True
+    raise TransferError(line, f"invalid purchased value {value!r}.")
+
+
+def _parse_item(line, record, family_id, grocery_list_id, user):
+    name = _parse_name(line, record.get("name"))
+    try:
+        quantity = float(record.get("quantity") if record.get("quantity") not in (None, "") else 1)
+    except (TypeError, ValueError):
+        raise TransferError(line, f"invalid quantity {record.get('quantity')!r}.")
+    quantity_type = record.get("quantity_type") or GroceryItem.QuantityType.COUNT
+    if quantity_type not in GroceryItem.QuantityType.values:
+        raise TransferError(line, f"invalid quantity_type {quantity_type!r}.")
+    return GroceryItem(
+        grocery_list_id=grocery_list_id,
+        family_id=family_id,
+        name=name,
+        quantity=quantity,
+        quantity_type=quantity_type,
+        purchased=_parse_bool(line, record.get("purchased")),
+        note=record.get("note") or None,
+        created_by=user,
+    )
+
+
+def import_records(records, family_membership, user):
+    """
+    Creates the lists and items of a dump in family_membership's family, all or
+    nothing. Items must come after their list record. Lists and items get new
+    uuids (the dump's list uuids only link items to their list), so a dump can be
+    imported into any family, or twice. Original created_at values are not kept,
+    and updated_at is the time of the commit.
+    Returns {"lists": n, "items": n}; raises TransferError.
+    """
+    family_id = family_membership.family_id
+    list_ids = {}
+    counters = {}
+    batch = []
+
+    def flush():
+        GroceryItem.objects.bulk_create(batch)
+        record_item_names(family_id, batch)
+        batch.clear()
+
+    with transaction.atomic():
+        for line, record in records:
+            record_type = record.get("record")
+            if record_type == RECORD_LIST:
+                name = _parse_name(line, record.get("name"))
+                list_uuid = _parse_uuid(line, record.get("uuid"))
+                if str(list_uuid) in list_ids:
+                    raise TransferError(line, f"duplicate list uuid {list_uuid}.")
+                grocery_list = GroceryList.objects.create(
+                    family_membership=family_membership,
+                    family_id=family_id,
+                    name=name,
+                    description=record.get("description") or None,
+                    created_by=user,
+                )
+                list_ids[str(list_uuid)] = grocery_list.id
+                counters[grocery_list.id] = [0, 0]
+            elif record_type == RECORD_ITEM:
+                list_uuid = str(_parse_uuid(line, record.get("list_uuid"), required=True))
+                if list_uuid not in list_ids:
+                    raise TransferError(line, f"unknown list_uuid {list_uuid}; list records must come first.")
+                item = _parse_item(line, record, family_id, list_ids[list_uuid], user)
+                counters[item.grocery_list_id][0] += 1
+                counters[item.grocery_list_id][1] += int(item.purchased)
+                batch.append(item)
+                if len(batch) >= IMPORT_BATCH_SIZE:
+                    flush()
+            else:
+                raise TransferError(line, f"record must be {RECORD_LIST!r} or {RECORD_ITEM!r}.")
+        if batch:
+            flush()
+
+        for grocery_list_id, (item_count, purchased_count) in counters.items():
+            if item_count:
+                GroceryList.objects.filter(id=grocery_list_id).update(
+                    item_count=item_count, purchased_count=purchased_count, revision=1
+                )
+            publish_grocery_event(family_id, LIST_CREATED, grocery_list_id)
+
+        # Delta sync only waits SYNC_SETTLE_WINDOW past updated_at, less than a long
+        # import may take to commit: stamp the rows as of the commit instead
+        committed_at = timezone.now()
+        GroceryList.objects.filter(id__in=counters).update(updated_at=committed_at)
+        GroceryItem.objects.filter(grocery_list_id__in=counters).update(updated_at=committed_at)
+
+    return {"lists": len(list_ids), "items": sum(item_count for item_count, _ in counters.values())}
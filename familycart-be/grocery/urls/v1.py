@@ -1,6 +1,10 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from grocery.views import GroceryListViewSet, GroceryItemAPIView
+from grocery.views import (GroceryListViewSet, GroceryItemAPIView, GroceryItemBulkAPIView, GrocerySyncAPIView,
+                           GroceryDashboardAPIView, GroceryItemSearchAPIView,
+                           GroceryItemSuggestionAPIView, GroceryExportAPIView, GroceryImportAPIView,
+                           GroceryOpLogAPIView, GroceryConsolidatedAPIView, GroceryReplenishmentAPIView,
+                           GroceryAnalyticsAPIView)
 
 # Router for GroceryList (still using ViewSet)
 router = DefaultRouter()
@@ -12,5 +16,25 @@ urlpatterns = [
 
     # GroceryItem CRUD (APIView)
     path('grocery-items/', GroceryItemAPIView.as_view(), name='grocery-item-list-create'),
+    path('grocery-items/bulk/', GroceryItemBulkAPIView.as_view(), name='grocery-item-bulk'),
+    path('grocery-items/search/', GroceryItemSearchAPIView.as_view(), name='grocery-item-search'),
+    path('grocery-items/suggestions/', GroceryItemSuggestionAPIView.as_view(), name='grocery-item-suggestions'),
+    path('grocery-items/replenishment/', GroceryReplenishmentAPIView.as_view(), name='grocery-item-replenishment'),
     path('grocery-items/<int:grocery_item_id>/', GroceryItemAPIView.as_view(), name='grocery-item-detail'),
+
+    # Delta sync for lists and items
+    path('sync/', GrocerySyncAPIView.as_view(), name='grocery-sync'),
+    # Offline operation-log merge (hybrid logical clocks)
+    path('oplog/', GroceryOpLogAPIView.as_view(), name='grocery-oplog'),
+
+    # Streaming dump / restore of lists and items
+    path('export/', GroceryExportAPIView.as_view(), name='grocery-export'),
+    path('import/', GroceryImportAPIView.as_view(), name='grocery-import'),
+
+    # All family lists with their counters
+    path('dashboard/', GroceryDashboardAPIView.as_view(), name='grocery-dashboard'),
+    # Unpurchased items of all family lists, summed per item and unit
+    path('consolidated/', GroceryConsolidatedAPIView.as_view(), name='grocery-consolidated'),
+    # Purchases per week / month / year, from the daily rollups
+    path('analytics/', GroceryAnalyticsAPIView.as_view(), name='grocery-analytics'),
 ]
@@ -1,5 +1,5 @@
 # Library Import
-from rest_framework import status
+from rest_framework import serializers, status
 from rest_framework.viewsets import *
 from rest_framework.permissions import (
     AllowAny,
@@ -15,11 +15,67 @@ from django.db.models import Q
 from datetime import datetime, timedelta, date
 from constants.response import KEY_MESSAGE, KEY_PAYLOAD, KEY_STATUS
 from constants.commons import handle_exceptions
+from constants.idempotency import idempotent
 from django.conf import settings
 from notification.scripts import *
 from grocery.permissions import *
+from grocery.scripts import (apply_bulk_item_operations, BULK_MAX_OPERATIONS, delete_grocery_items,
+                             delete_grocery_list, fetch_grocery_changes, touch_grocery_list,
+                             grocery_list_etag, etag_matches, search_grocery_items, SEARCH_PAGE_SIZE,
+                             SEARCH_MAX_PAGE_SIZE, merge_grocery_item, set_items_purchased,
+                             clear_purchased_items, move_items, copy_items, filter_grocery_items,
+                             get_item_sort_key, update_grocery_item, update_grocery_list, parse_if_match,
+                             version_etag, consolidate_grocery_items)
+from grocery.events import *
+from grocery.suggestions import get_item_suggestions, record_item_names, SUGGESTION_LIMIT, SUGGESTION_MAX_LIMIT
+from grocery.analytics import record_purchases, purchase_transition, get_purchase_analytics
+from grocery.oplog import OPLOG_MAX_OPERATIONS, parse_operations, apply_operations
+from grocery.clock import server_clock
+from grocery.recurrence import instantiate_template
+from grocery.replenishment import (get_due_replenishments, REPLENISHMENT_DAYS_AHEAD, REPLENISHMENT_MAX_DAYS_AHEAD,
+                                   REPLENISHMENT_LIMIT)
+from grocery.transfer import (TRANSFER_FORMATS, TransferError, export_records, render_ndjson, render_csv,
+                              read_records, import_records, aiter_chunks)
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from django.db import transaction
 from rest_framework.pagination import PageNumberPagination
+from family.scripts import get_membership_resolver
+from grocery.pagination import GroceryKeysetPagination, use_keyset_pagination
 from rest_framework.views import APIView
+from rest_framework.decorators import action
+
+# ------------------------------------------------------------------------------
+# Version preconditions of item and list updates
+# ------------------------------------------------------------------------------
+# An update may name the version it was based on with If-Match (answered with
+# 412 Precondition Failed when stale) or with "version" in the body (answered
+# with 409 Conflict). Either error carries the current state and its ETag, so
+# the client can merge and retry without another GET.
+# ------------------------------------------------------------------------------
+def get_expected_versions(request):
+    """ Returns (versions or None, status on conflict). Raises ValueError for an invalid body version. """
+    versions = parse_if_match(request)
+    if versions is not None:
+        return versions, status.HTTP_412_PRECONDITION_FAILED
+    version = request.data.get("version") if hasattr(request.data, "get") else None
+    if version in (None, ""):
+        return None, None
+    if isinstance(version, bool) or not str(version).isdigit():
+        raise ValueError("version must be a positive integer.")
+    return {int(version)}, status.HTTP_409_CONFLICT
+
+
+def version_conflict_response(status_code, current, etag=None):
+    return Response({
+        KEY_MESSAGE: "error",
+        KEY_PAYLOAD: {
+            "detail": "The object was modified by another request.",
+            "current": current,
+        },
+        KEY_STATUS: 0
+    }, status=status_code, headers={"ETag": etag or version_etag(current["version"])})
+
 
 class GroceryListViewSet(ModelViewSet):
     """
@@ -34,29 +90,57 @@ class GroceryListViewSet(ModelViewSet):
         Limit grocery lists to those belonging to families
         the authenticated user is a member of.
         """
-        user = self.request.user
-        memberships = FamilyMembership.objects.filter(user=user)
-        return GroceryList.objects.filter(family_membership__in=memberships)
+        family_ids = get_membership_resolver(self.request).family_ids
+        return GroceryList.objects.filter(family_id__in=family_ids)
+
+    @property
+    def paginator(self):
+        """Use keyset pagination when the client opts in with ?pagination=cursor."""
+        if use_keyset_pagination(self.request):
+            if not hasattr(self, "_keyset_paginator"):
+                self._keyset_paginator = GroceryKeysetPagination()
+            return self._keyset_paginator
+        return super().paginator
 
     @handle_exceptions
     def perform_create(self, serializer):
         """Attach created_by automatically to the current user."""
-        serializer.save(created_by=self.request.user)
+        serializer.save(
+            created_by=self.request.user,
+            family_id=serializer.validated_data["family_membership"].family_id
+        )
+        publish_grocery_event(serializer.instance.family_id, LIST_CREATED, serializer.instance.id)
 
-    # List Grocery List Objs
+    # List Grocery List Objs (compact unless ?fields= asks for more)
     @handle_exceptions
     def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
-        page = self.paginate_queryset(queryset)
+        try:
+            fields = GroceryListSerializer.get_requested_fields(request)
+        except ValueError as e:
+            return Response({
+                KEY_MESSAGE: "error",
+                KEY_PAYLOAD: str(e),
+                KEY_STATUS: 0
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        queryset = GroceryListSerializer.restrict_queryset(self.get_queryset(), fields, extra=("created_at",))
+        try:
+            page = self.paginate_queryset(queryset)
+        except ValueError as e:
+            return Response({
+                KEY_MESSAGE: "error",
+                KEY_PAYLOAD: str(e),
+                KEY_STATUS: 0
+            }, status=status.HTTP_400_BAD_REQUEST)
         if page is not None:
-            serializer = self.get_serializer(page, many=True)
+            serializer = self.get_serializer(page, many=True, fields=fields)
             return self.get_paginated_response({
                 KEY_MESSAGE: "success",
                 KEY_PAYLOAD: serializer.data,
                 KEY_STATUS: 1
             })
 
-        serializer = self.get_serializer(queryset, many=True)
+        serializer = self.get_serializer(queryset, many=True, fields=fields)
         return Response({
             KEY_MESSAGE: "success",
             KEY_PAYLOAD: serializer.data,
@@ -67,14 +151,19 @@ class GroceryListViewSet(ModelViewSet):
     @handle_exceptions
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
+        etag = grocery_list_etag(instance.id, instance.revision, request, instance.version)
+        if etag_matches(request, etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
         serializer = self.get_serializer(instance)
         return Response({
             KEY_MESSAGE: "success",
             KEY_PAYLOAD: serializer.data,
             KEY_STATUS: 1
-        }, status=status.HTTP_200_OK)
+        }, status=status.HTTP_200_OK, headers={"ETag": etag})
 
     # Create Grocery List Objs
+    @idempotent
     @handle_exceptions
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -91,7 +180,7 @@ class GroceryListViewSet(ModelViewSet):
 
         # Family membership authorization
         family_membership = serializer.validated_data.get("family_membership")
-        if not FamilyMembership.objects.filter(id=family_membership.id, user=request.user).exists():
+        if not get_membership_resolver(request).owns_membership(family_membership.id):
             return Response({
                 KEY_MESSAGE: "error",
                 KEY_PAYLOAD: "You are not authorized to create a list for this family.",
@@ -107,30 +196,225 @@ class GroceryListViewSet(ModelViewSet):
         }, status=status.HTTP_201_CREATED)
 
     # Update Grocery List Objs
+    @idempotent
     @handle_exceptions
     def update(self, request, *args, **kwargs):
         instance = self.get_object()
+        try:
+            expected_versions, conflict_status = get_expected_versions(request)
+        except ValueError as e:
+            return self.error_response(str(e))
         serializer = self.get_serializer(instance, data=request.data, partial=True)
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
+        if not serializer.is_valid():
+            return self.error_response(serializer.errors)
+        updated = update_grocery_list(instance, serializer.validated_data, expected_versions)
+        if updated is None:
+            current = self.get_object()
+            return version_conflict_response(conflict_status or status.HTTP_409_CONFLICT,
+                                             self.get_serializer(current).data,
+                                             grocery_list_etag(current.id, current.revision, request, current.version))
 
         return Response({
             KEY_MESSAGE: "success",
-            KEY_PAYLOAD: serializer.data,
+            KEY_PAYLOAD: self.get_serializer(updated).data,
             KEY_STATUS: 1
-        }, status=status.HTTP_200_OK)
+        }, status=status.HTTP_200_OK, headers={"ETag": grocery_list_etag(updated.id, updated.revision, request, updated.version)})
 
     # Delete Grocery List Objs
+    @idempotent
     @handle_exceptions
     def destroy(self, request, *args, **kwargs):
         instance = self.get_object()
-        instance.delete()
+        delete_grocery_list(instance)
         return Response({
             KEY_MESSAGE: "success",
             KEY_PAYLOAD: "Grocery list deleted successfully.",
             KEY_STATUS: 1
         }, status=status.HTTP_200_OK)
 
+    # ------------------------------------------------------------------------------
+    # List-level item operations
+    # ------------------------------------------------------------------------------
+    # POST /grocery-lists/<id>/<operation>/ -> {"count": <affected items>}
+    # Each runs as a single set-based statement (see grocery.scripts).
+    # ------------------------------------------------------------------------------
+    def error_response(self, message, status_code=status.HTTP_400_BAD_REQUEST):
+        return Response({
+            KEY_MESSAGE: "error",
+            KEY_PAYLOAD: message,
+            KEY_STATUS: 0
+        }, status=status_code)
+
+    def get_item_ids(self, request, required):
+        """ Returns the body's item_ids (None when absent and not required), or raises ValueError. """
+        item_ids = request.data.get("item_ids")
+        if item_ids is None and not required:
+            return None
+        if not isinstance(item_ids, list) or not item_ids or \
+                not all(isinstance(i, int) and not isinstance(i, bool) for i in item_ids):
+            raise ValueError("item_ids must be a non-empty list of item ids.")
+        return item_ids
+
+    def get_purchased_flag(self, request):
+        """ The body's purchased flag, true when absent. Raises ValueError for a value that is not a boolean. """
+        if "purchased" not in request.data:
+            return True
+        try:
+            return serializers.BooleanField().to_internal_value(request.data.get("purchased"))
+        except serializers.ValidationError:
+            raise ValueError("purchased must be true or false.")
+
+    def get_target_list(self, request, grocery_list):
+        """ Returns the target list of a move/copy, which must be another list of the same family. """
+        target_list_id = request.data.get("target_list_id")
+        target = None
+        if isinstance(target_list_id, int) and not isinstance(target_list_id, bool) and target_list_id != grocery_list.id:
+            target = GroceryList.objects.filter(id=target_list_id, family_id=grocery_list.family_id).first()
+        if target is None:
+            raise ValueError("target_list_id must be another grocery list of the same family.")
+        return target
+
+    @action(detail=True, methods=["post"], url_path="mark-purchased")
+    @idempotent
+    @handle_exceptions
+    def mark_purchased(self, request, *args, **kwargs):
+        """ Marks all items, or {"item_ids": [...]}, purchased; {"purchased": false} un-marks them. """
+        grocery_list = self.get_object()
+        try:
+            item_ids = self.get_item_ids(request, required=False)
+            purchased = self.get_purchased_flag(request)
+        except ValueError as e:
+            return self.error_response(str(e))
+        count = set_items_purchased(grocery_list, purchased, item_ids)
+        return Response({
+            KEY_MESSAGE: "success",
+            KEY_PAYLOAD: {"count": count},
+            KEY_STATUS: 1
+        }, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=["post"], url_path="clear-purchased")
+    @idempotent
+    @handle_exceptions
+    def clear_purchased(self, request, *args, **kwargs):
+        """ Deletes every purchased item of the list. """
+        count = clear_purchased_items(self.get_object())
+        return Response({
+            KEY_MESSAGE: "success",
+            KEY_PAYLOAD: {"count": count},
+            KEY_STATUS: 1
+        }, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=["post"], url_path="move-items")
+    @idempotent
+    @handle_exceptions
+    def move_to_list(self, request, *args, **kwargs):
+        """ Moves {"item_ids": [...]} to {"target_list_id": <id>} of the same family. """
+        grocery_list = self.get_object()
+        try:
+            item_ids = self.get_item_ids(request, required=True)
+            target_list = self.get_target_list(request, grocery_list)
+        except ValueError as e:
+            return self.error_response(str(e))
+        count = move_items(grocery_list, target_list, item_ids)
+        return Response({
+            KEY_MESSAGE: "success",
+            KEY_PAYLOAD: {"count": count},
+            KEY_STATUS: 1
+        }, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=["post"], url_path="copy-items")
+    @idempotent
+    @handle_exceptions
+    def copy_to_list(self, request, *args, **kwargs):
+        """ Copies {"item_ids": [...]} to {"target_list_id": <id>} as new, unpurchased items. """
+        grocery_list = self.get_object()
+        try:
+            item_ids = self.get_item_ids(request, required=True)
+            target_list = self.get_target_list(request, grocery_list)
+        except ValueError as e:
+            return self.error_response(str(e))
+        new_item_ids = copy_items(grocery_list, target_list, item_ids, request.user)
+        return Response({
+            KEY_MESSAGE: "success",
+            KEY_PAYLOAD: {"count": len(new_item_ids), "item_ids": new_item_ids},
+            KEY_STATUS: 1
+        }, status=status.HTTP_201_CREATED)
+
+
+    # ------------------------------------------------------------------------------
+    # Templates and recurrences (grocery/recurrence.py)
+    # ------------------------------------------------------------------------------
+    def get_template(self):
+        """ The list of the URL, which must be a template. Raises ValueError otherwise. """
+        template = self.get_object()
+        if not template.is_template:
+            raise ValueError("This grocery list is not a template.")
+        return template
+
+    @action(detail=True, methods=["post"], url_path="instantiate")
+    @idempotent
+    @handle_exceptions
+    def instantiate(self, request, *args, **kwargs):
+        """ Clones the template and its items into a new list, named {"name": ...} or after the template. """
+        try:
+            template = self.get_template()
+        except ValueError as e:
+            return self.error_response(str(e))
+        name = request.data.get("name")
+        if name is not None and (not isinstance(name, str) or not name.strip()):
+            return self.error_response("name must be a non-empty string.")
+        grocery_list = instantiate_template(template, request.user, name)
+        return Response({
+            KEY_MESSAGE: "success",
+            KEY_PAYLOAD: self.get_serializer(grocery_list).data,
+            KEY_STATUS: 1
+        }, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=["get", "put", "delete"], url_path="recurrence")
+    @idempotent
+    @handle_exceptions
+    def recurrence(self, request, *args, **kwargs):
+        """
+        GET / PUT / DELETE the schedule on which the template is cloned, e.g.
+        {"frequency": "weekly", "weekday": 5} for every Saturday.
+        """
+        try:
+            template = self.get_template()
+        except ValueError as e:
+            return self.error_response(str(e))
+        instance = GroceryListRecurrence.objects.filter(template_id=template.id).first()
+
+        if instance is None and request.method != "PUT":
+            return self.error_response("This template has no recurrence.", status.HTTP_404_NOT_FOUND)
+
+        if request.method == "GET":
+            return Response({
+                KEY_MESSAGE: "success",
+                KEY_PAYLOAD: GroceryListRecurrenceSerializer(instance).data,
+                KEY_STATUS: 1
+            }, status=status.HTTP_200_OK)
+
+        if request.method == "DELETE":
+            instance.delete()
+            return Response({
+                KEY_MESSAGE: "success",
+                KEY_PAYLOAD: "Recurrence deleted successfully.",
+                KEY_STATUS: 1
+            }, status=status.HTTP_200_OK)
+
+        serializer = GroceryListRecurrenceSerializer(instance, data=request.data, partial=instance is not None)
+        if not serializer.is_valid():
+            return self.error_response(serializer.errors)
+        if instance is None:
+            serializer.save(template=template, family_id=template.family_id, created_by=request.user)
+        else:
+            serializer.save()
+        return Response({
+            KEY_MESSAGE: "success",
+            KEY_PAYLOAD: serializer.data,
+            KEY_STATUS: 1
+        }, status=status.HTTP_201_CREATED if instance is None else status.HTTP_200_OK)
+
 
 class GroceryItemPagination(PageNumberPagination):
     """Custom pagination for grocery items"""
@@ -149,7 +433,12 @@ class GroceryItemAPIView(APIView):
 
 	@handle_exceptions
 	def get(self, request, *args, **kwargs):
-	    """List all grocery items for a given grocery list"""
+	    """
+	    List the grocery items of a list. Optional filters: ?purchased=true|false,
+	    ?quantity_type=<type>, ?name=<prefix>; ordering: ?sort=name|created_at|updated_at
+	    ("-" prefixed for descending, -created_at by default). Items are compact
+	    unless ?fields=a,b,c (or ?fields=all) asks for more.
+	    """
 	    user = request.user
 	    grocery_list_id = request.query_params.get("grocery_list_id")
 
@@ -160,24 +449,61 @@ class GroceryItemAPIView(APIView):
 	            KEY_STATUS: 0
 	        }, status=status.HTTP_400_BAD_REQUEST)
 
+	    family_ids = get_membership_resolver(request).family_ids
+
+	    # Answer conditional requests from the list revision alone
+	    revision = GroceryList.objects.filter(
+	        id=grocery_list_id,
+	        family_id__in=family_ids
+	    ).values_list("revision", flat=True).first()
+	    etag = grocery_list_etag(grocery_list_id, revision, request) if revision is not None else None
+	    if etag and etag_matches(request, etag):
+	        return Response(status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
 	    items = GroceryItem.objects.filter(
 	        grocery_list__id=grocery_list_id,
-	        grocery_list__family_membership__user=user
-	    ).select_related("grocery_list", "created_by")
+	        family_id__in=family_ids
+	    )
+	    try:
+	        items = filter_grocery_items(items, request.query_params)
+	        sort = get_item_sort_key(request.query_params)
+	        fields = GroceryItemSerializer.get_requested_fields(request)
+	    except ValueError as e:
+	        return Response({
+	            KEY_MESSAGE: "error",
+	            KEY_PAYLOAD: str(e),
+	            KEY_STATUS: 0
+	        }, status=status.HTTP_400_BAD_REQUEST)
 
-	    paginator = self.pagination_class()
-	    paginated_items = paginator.paginate_queryset(items, request)
-	    serializer = GroceryItemSerializer(paginated_items, many=True)
+	    if use_keyset_pagination(request):
+	        paginator = GroceryKeysetPagination(ordering=sort)
+	    else:
+	        paginator = self.pagination_class()
+	        items = items.order_by(sort, "-id" if sort.startswith("-") else "id")
+	    items = GroceryItemSerializer.restrict_queryset(items, fields, extra=(sort.lstrip("-"),))
+	    try:
+	        paginated_items = paginator.paginate_queryset(items, request)
+	    except ValueError as e:
+	        return Response({
+	            KEY_MESSAGE: "error",
+	            KEY_PAYLOAD: str(e),
+	            KEY_STATUS: 0
+	        }, status=status.HTTP_400_BAD_REQUEST)
+	    serializer = GroceryItemSerializer(paginated_items, many=True, fields=fields)
 
-	    return paginator.get_paginated_response({
+	    response = paginator.get_paginated_response({
 	        KEY_MESSAGE: "success",
 	        KEY_PAYLOAD: serializer.data,
 	        KEY_STATUS: 1
 	    })
+	    if etag:
+	        response["ETag"] = etag
+	    return response
 
+	@idempotent
 	@handle_exceptions
 	def post(self, request, *args, **kwargs):
-		"""Create a new grocery item"""
+		"""Create a new grocery item, or with ?merge=true add to a matching unpurchased one"""
 		user = request.user
 		grocery_list_id = request.query_params.get("grocery_list_id")
 
@@ -192,7 +518,7 @@ class GroceryItemAPIView(APIView):
 		try:
 		    grocery_list = GroceryList.objects.get(
 		        id=grocery_list_id,
-		        family_membership__user=user
+		        family_id__in=get_membership_resolver(request).family_ids
 		    )
 		except GroceryList.DoesNotExist:
 		    return Response({
@@ -213,8 +539,35 @@ class GroceryItemAPIView(APIView):
 		data = request.data.copy()
 		data["grocery_list"] = grocery_list.id
 		serializer = GroceryItemSerializer(data=data)
+		# Opt-in: ?merge=true adds the quantity to a matching unpurchased item instead of inserting
+		merge = request.query_params.get("merge") == "true"
 		if serializer.is_valid():
-		    serializer.save(grocery_list=grocery_list, created_by=user)
+		    with transaction.atomic():
+		        merged_item = merge_grocery_item(grocery_list, serializer.validated_data) if merge else None
+		        if merged_item is not None:
+		            touch_grocery_list(grocery_list.id)
+		            # The stats learn the quantity added, not the merged total
+		            record_item_names(grocery_list.family_id, [GroceryItem(
+		                name=merged_item.name,
+		                quantity=serializer.validated_data.get("quantity", 1),
+		                quantity_type=merged_item.quantity_type,
+		            )])
+		            publish_grocery_event(grocery_list.family_id, ITEMS_UPDATED, grocery_list.id, [merged_item.id])
+		        else:
+		            serializer.save(grocery_list=grocery_list, family_id=grocery_list.family_id, created_by=user)
+		            touch_grocery_list(grocery_list.id, items=1, purchased=int(serializer.instance.purchased))
+		            record_item_names(grocery_list.family_id, [serializer.instance])
+		            record_purchases([purchase_transition(serializer.instance, False)])
+		            publish_grocery_event(grocery_list.family_id, ITEMS_CREATED, grocery_list.id, [serializer.instance.id])
+		    if merge:
+		        return Response({
+		            KEY_MESSAGE: "success",
+		            KEY_PAYLOAD: {
+		                "merged": merged_item is not None,
+		                "item": GroceryItemSerializer(merged_item).data if merged_item is not None else serializer.data,
+		            },
+		            KEY_STATUS: 1
+		        }, status=status.HTTP_200_OK if merged_item is not None else status.HTTP_201_CREATED)
 		    return Response({
 		        KEY_MESSAGE: "success",
 		        KEY_PAYLOAD: serializer.data,
@@ -227,14 +580,15 @@ class GroceryItemAPIView(APIView):
 		        KEY_STATUS: 0
 		    }, status=status.HTTP_400_BAD_REQUEST)
 
+	@idempotent
 	@handle_exceptions
 	def put(self, request, grocery_item_id, *args, **kwargs):
 		"""Full update of a grocery item"""
 		user = request.user
 		try:
-			grocery_item = GroceryItem.objects.get(id=grocery_item_id)
+			grocery_item = GroceryItem.objects.get(id=grocery_item_id, family_id__in=get_membership_resolver(request).family_ids)
 			data = request.data.copy()
-			data["grocery_list"] = grocery_item.grocery_list.id
+			data["grocery_list"] = grocery_item.grocery_list_id
 		except GroceryItem.DoesNotExist:
 		    return Response({
 		        KEY_MESSAGE: "error",
@@ -242,14 +596,14 @@ class GroceryItemAPIView(APIView):
 		        KEY_STATUS: 0
 		    }, status=status.HTTP_404_NOT_FOUND)
 
+		try:
+			expected_versions, conflict_status = get_expected_versions(request)
+		except ValueError as e:
+			return Response({KEY_MESSAGE: "error", KEY_PAYLOAD: str(e), KEY_STATUS: 0}, status=status.HTTP_400_BAD_REQUEST)
+
 		serializer = GroceryItemSerializer(grocery_item, data=data)
 		if serializer.is_valid():
-		    serializer.save()
-		    return Response({
-		        KEY_MESSAGE: "success",
-		        KEY_PAYLOAD: serializer.data,
-		        KEY_STATUS: 1
-		    }, status=status.HTTP_200_OK)
+		    return self.save_item(grocery_item, serializer.validated_data, expected_versions, conflict_status)
 		else:
 		    return Response({
 		        KEY_MESSAGE: "error",
@@ -257,12 +611,13 @@ class GroceryItemAPIView(APIView):
 		        KEY_STATUS: 0
 		    }, status=status.HTTP_400_BAD_REQUEST)
 
+	@idempotent
 	@handle_exceptions
 	def patch(self, request, grocery_item_id, *args, **kwargs):
 	    """Partial update"""
 	    user = request.user
 	    try:
-	        instance = GroceryItem.objects.get(id=grocery_item_id, grocery_list__family_membership__user=user)
+	        instance = GroceryItem.objects.get(id=grocery_item_id, family_id__in=get_membership_resolver(request).family_ids)
 	    except GroceryItem.DoesNotExist:
 	        return Response({
 	            KEY_MESSAGE: "error",
@@ -270,14 +625,21 @@ class GroceryItemAPIView(APIView):
 	            KEY_STATUS: 0
 	        }, status=status.HTTP_404_NOT_FOUND)
 
+	    try:
+	        expected_versions, conflict_status = get_expected_versions(request)
+	    except ValueError as e:
+	        return Response({KEY_MESSAGE: "error", KEY_PAYLOAD: str(e), KEY_STATUS: 0}, status=status.HTTP_400_BAD_REQUEST)
+
 	    serializer = GroceryItemSerializer(instance, data=request.data, partial=True)
 	    if serializer.is_valid():
-	        serializer.save()
-	        return Response({
-	            KEY_MESSAGE: "success",
-	            KEY_PAYLOAD: serializer.data,
-	            KEY_STATUS: 1
-	        }, status=status.HTTP_200_OK)
+	        target_list = serializer.validated_data.get("grocery_list")
+	        if target_list is not None and target_list.family_id not in get_membership_resolver(request).family_ids:
+	            return Response({
+	                KEY_MESSAGE: "error",
+	                KEY_PAYLOAD: "Grocery list not found or not authorized.",
+	                KEY_STATUS: 0
+	            }, status=status.HTTP_404_NOT_FOUND)
+	        return self.save_item(instance, serializer.validated_data, expected_versions, conflict_status)
 	    else:
 	        return Response({
 	            KEY_MESSAGE: "error",
@@ -285,12 +647,33 @@ class GroceryItemAPIView(APIView):
 	            KEY_STATUS: 0
 	        }, status=status.HTTP_400_BAD_REQUEST)
 
+	def save_item(self, grocery_item, changes, expected_versions, conflict_status):
+		"""Conditional update shared by put and patch; a conflict answers with the current item"""
+		updated = update_grocery_item(grocery_item, changes, expected_versions)
+		if updated is not None:
+			return Response({
+			    KEY_MESSAGE: "success",
+			    KEY_PAYLOAD: GroceryItemSerializer(updated).data,
+			    KEY_STATUS: 1
+			}, status=status.HTTP_200_OK, headers={"ETag": version_etag(updated.version)})
+
+		current = GroceryItem.objects.filter(id=grocery_item.id).first()
+		if current is None:
+			return Response({
+			    KEY_MESSAGE: "error",
+			    KEY_PAYLOAD: "Item not found or not authorized.",
+			    KEY_STATUS: 0
+			}, status=status.HTTP_404_NOT_FOUND)
+		return version_conflict_response(conflict_status or status.HTTP_409_CONFLICT,
+		                                 GroceryItemSerializer(current).data)
+
+	@idempotent
 	@handle_exceptions
 	def delete(self, request, grocery_item_id, *args, **kwargs):
 	    """Delete grocery item"""
 	    user = request.user
 	    try:
-	        instance = GroceryItem.objects.get(id=grocery_item_id, grocery_list__family_membership__user=user)
+	        instance = GroceryItem.objects.get(id=grocery_item_id, family_id__in=get_membership_resolver(request).family_ids)
 	    except GroceryItem.DoesNotExist:
 	        return Response({
 	            KEY_MESSAGE: "error",
@@ -298,9 +681,445 @@ class GroceryItemAPIView(APIView):
 	            KEY_STATUS: 0
 	        }, status=status.HTTP_404_NOT_FOUND)
 
-	    instance.delete()
+	    delete_grocery_items(GroceryItem.objects.filter(id=instance.id))
 	    return Response({
 	        KEY_MESSAGE: "success",
 	        KEY_PAYLOAD: "Item deleted successfully.",
 	        KEY_STATUS: 1
-	    }, status=status.HTTP_200_OK)
\ No newline at end of file
+	    }, status=status.HTTP_200_OK)
+
+class GroceryItemBulkAPIView(APIView):
+    """
+    Applies a batch of create/update/delete operations to the items of one grocery list.
+    Body: {"grocery_list_id": 1, "operations": [{"op": "create", "data": {...}},
+                                                {"op": "update", "id": 5, "data": {...}},
+                                                {"op": "delete", "id": 6}]}
+    The batch is all-or-nothing: if any operation is invalid nothing is written.
+    """
+    permission_classes = [IsAuthenticated, IsFamilyMember]
+
+    @idempotent
+    @handle_exceptions
+    def post(self, request, *args, **kwargs):
+        user = request.user
+        grocery_list_id = request.data.get("grocery_list_id")
+        operations = request.data.get("operations")
+
+        if not grocery_list_id:
+            return Response({
+                KEY_MESSAGE: "error",
+                KEY_PAYLOAD: "grocery_list_id is required.",
+                KEY_STATUS: 0
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        if not isinstance(operations, list) or not operations:
+            return Response({
+                KEY_MESSAGE: "error",
+                KEY_PAYLOAD: "operations must be a non-empty list.",
+                KEY_STATUS: 0
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        if len(operations) > BULK_MAX_OPERATIONS:
+            return Response({
+                KEY_MESSAGE: "error",
+                KEY_PAYLOAD: f"A batch can contain at most {BULK_MAX_OPERATIONS} operations.",
+                KEY_STATUS: 0
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        # Validate grocery list ownership once for the whole batch
+        try:
+            grocery_list = GroceryList.objects.get(
+                id=grocery_list_id,
+                family_id__in=get_membership_resolver(request).family_ids
+            )
+        except (GroceryList.DoesNotExist, ValueError):
+            return Response({
+                KEY_MESSAGE: "error",
+                KEY_PAYLOAD: "You are not authorized to access this grocery list.",
+                KEY_STATUS: 0
+            }, status=status.HTTP_403_FORBIDDEN)
+
+        results, has_errors = apply_bulk_item_operations(grocery_list, operations, user)
+        if has_errors:
+            return Response({
+                KEY_MESSAGE: "error",
+                KEY_PAYLOAD: results,
+                KEY_STATUS: 0
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            KEY_MESSAGE: "success",
+            KEY_PAYLOAD: results,
+            KEY_STATUS: 1
+        }, status=status.HTTP_200_OK)
+
+
+class GroceryOpLogAPIView(APIView):
+    """
+    Merges a queue of offline item operations stamped with hybrid logical clocks
+    (see grocery/oplog.py for the operations and merge rules).
+    Body: {"operations": [{"op": "set", "item": "<uuid>", "hlc": "<wall ms>:<counter>:<node>",
+                           "fields": {"purchased": true}}, ...]}
+    The batch is all-or-nothing; the response holds the merged state of every
+    item it touched and the server clock, for the client to observe.
+    """
+    permission_classes = [IsAuthenticated]
+
+    @idempotent
+    @handle_exceptions
+    def post(self, request, *args, **kwargs):
+        operations = request.data.get("operations")
+        if not isinstance(operations, list) or not operations:
+            return Response({
+                KEY_MESSAGE: "error",
+                KEY_PAYLOAD: "operations must be a non-empty list.",
+                KEY_STATUS: 0
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        if len(operations) > OPLOG_MAX_OPERATIONS:
+            return Response({
+                KEY_MESSAGE: "error",
+                KEY_PAYLOAD: f"A batch can contain at most {OPLOG_MAX_OPERATIONS} operations.",
+                KEY_STATUS: 0
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        family_ids = get_membership_resolver(request).family_ids
+        parsed, results, has_errors = parse_operations(operations, family_ids)
+        if has_errors:
+            return Response({
+                KEY_MESSAGE: "error",
+                KEY_PAYLOAD: results,
+                KEY_STATUS: 0
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        items = apply_operations(parsed, family_ids, request.user)
+        return Response({
+            KEY_MESSAGE: "success",
+            KEY_PAYLOAD: {
+                "items": items,
+                "hlc": str(server_clock.now()),
+            },
+            KEY_STATUS: 1
+        }, status=status.HTTP_200_OK)
+
+
+class GrocerySyncAPIView(APIView):
+    """
+    Delta sync for grocery lists and items.
+    Call without a cursor for a full snapshot, then pass back the returned cursor
+    (?cursor=...) to receive only rows created, changed or deleted since then.
+    Keep calling while has_more is true. Clients should upsert by id, since a row
+    can be sent again if it changes between two calls.
+    """
+    permission_classes = [IsAuthenticated]
+
+    @handle_exceptions
+    def get(self, request, *args, **kwargs):
+        try:
+            changes = fetch_grocery_changes(
+                get_membership_resolver(request).family_ids,
+                request.query_params.get("cursor")
+            )
+        except ValueError as e:
+            return Response({
+                KEY_MESSAGE: "error",
+                KEY_PAYLOAD: str(e),
+                KEY_STATUS: 0
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        deleted = {"lists": [], "items": []}
+        for tombstone in changes["tombstones"]:
+            key = "lists" if tombstone.object_type == GroceryTombstone.ObjectType.LIST else "items"
+            deleted[key].append({"id": tombstone.object_id, "uuid": tombstone.object_uuid, "deleted_at": tombstone.deleted_at})
+
+        return Response({
+            KEY_MESSAGE: "success",
+            KEY_PAYLOAD: {
+                "lists": GroceryListSerializer(changes["lists"], many=True).data,
+                "items": GroceryItemSerializer(changes["items"], many=True).data,
+                "deleted": deleted,
+                "cursor": changes["cursor"],
+                "has_more": changes["has_more"],
+            },
+            KEY_STATUS: 1
+        }, status=status.HTTP_200_OK)
+
+
+class GroceryDashboardAPIView(APIView):
+    """
+    All grocery lists of the user's families with their item/purchased counters,
+    read from the materialized columns with a single query.
+    """
+    permission_classes = [IsAuthenticated]
+
+    @handle_exceptions
+    def get(self, request, *args, **kwargs):
+        serializer_fields = GroceryListDashboardSerializer.Meta.fields
+        lists = GroceryList.objects.filter(
+            family_id__in=get_membership_resolver(request).family_ids
+        ).only(*serializer_fields).order_by("-created_at", "-id")
+
+        return Response({
+            KEY_MESSAGE: "success",
+            KEY_PAYLOAD: GroceryListDashboardSerializer(lists, many=True).data,
+            KEY_STATUS: 1
+        }, status=status.HTTP_200_OK)
+
+
+class GroceryConsolidatedAPIView(APIView):
+    """
+    What the user's families still need in total: unpurchased items of every list
+    summed per normalized name and quantity type, with the source item ids so they
+    can be checked off with the list actions.
+    ?grocery_list_ids=1,2 restricts it to some lists; ?convert=false skips the
+    unit conversions (GroceryUnitConversion).
+    """
+    permission_classes = [IsAuthenticated]
+
+    @handle_exceptions
+    def get(self, request, *args, **kwargs):
+        convert = request.query_params.get("convert", "true")
+        if convert not in ("true", "false"):
+            return Response({
+                KEY_MESSAGE: "error",
+                KEY_PAYLOAD: "convert must be true or false.",
+                KEY_STATUS: 0
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        grocery_list_ids = request.query_params.get("grocery_list_ids")
+        if grocery_list_ids is not None:
+            try:
+                grocery_list_ids = [int(list_id) for list_id in grocery_list_ids.split(",") if list_id.strip()]
+            except ValueError:
+                return Response({
+                    KEY_MESSAGE: "error",
+                    KEY_PAYLOAD: "grocery_list_ids must be comma-separated ids.",
+                    KEY_STATUS: 0
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            KEY_MESSAGE: "success",
+            KEY_PAYLOAD: consolidate_grocery_items(
+                get_membership_resolver(request).family_ids, grocery_list_ids, convert == "true"
+            ),
+            KEY_STATUS: 1
+        }, status=status.HTTP_200_OK)
+
+
+class GroceryAnalyticsAPIView(APIView):
+    """
+    How many items, and how much of each quantity type, the user's families bought
+    per ?period=week|month|year (week by default) between ?start= and ?end=
+    (YYYY-MM-DD, the recent past by default), with the most bought items.
+    Answered from the daily purchase rollups alone.
+    """
+    permission_classes = [IsAuthenticated]
+
+    @handle_exceptions
+    def get(self, request, *args, **kwargs):
+        try:
+            start, end = (request.query_params.get(name) for name in ("start", "end"))
+            analytics = get_purchase_analytics(
+                get_membership_resolver(request).family_ids,
+                request.query_params.get("period", "week"),
+                date.fromisoformat(start) if start else None,
+                date.fromisoformat(end) if end else None
+            )
+        except ValueError as e:
+            return Response({
+                KEY_MESSAGE: "error",
+                KEY_PAYLOAD: str(e),
+                KEY_STATUS: 0
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            KEY_MESSAGE: "success",
+            KEY_PAYLOAD: analytics,
+            KEY_STATUS: 1
+        }, status=status.HTTP_200_OK)
+
+
+class GroceryItemSearchAPIView(APIView):
+    """
+    Full-text search over the names and notes of the items of the user's families.
+    ?q=<words> (web search syntax: "quoted phrases", or, -exclusions), optional
+    ?page_size=<n> and ?cursor=<cursor> from the previous page. Best matches first.
+    """
+    permission_classes = [IsAuthenticated]
+
+    @handle_exceptions
+    def get(self, request, *args, **kwargs):
+        try:
+            page_size = int(request.query_params.get("page_size", SEARCH_PAGE_SIZE))
+        except ValueError:
+            page_size = SEARCH_PAGE_SIZE
+        page_size = min(max(page_size, 1), SEARCH_MAX_PAGE_SIZE)
+
+        try:
+            results = search_grocery_items(
+                get_membership_resolver(request).family_ids,
+                request.query_params.get("q"),
+                request.query_params.get("cursor"),
+                page_size
+            )
+        except ValueError as e:
+            return Response({
+                KEY_MESSAGE: "error",
+                KEY_PAYLOAD: str(e),
+                KEY_STATUS: 0
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            KEY_MESSAGE: "success",
+            KEY_PAYLOAD: {
+                "results": GroceryItemSearchSerializer(results["items"], many=True).data,
+                "cursor": results["cursor"],
+                "has_more": results["has_more"],
+            },
+            KEY_STATUS: 1
+        }, status=status.HTTP_200_OK)
+
+
+class GroceryItemSuggestionAPIView(APIView):
+    """
+    Item-name autocomplete: ?q=<prefix>[&limit=<n>] returns the family's most used
+    item names starting with the prefix, with their latest quantity and quantity type.
+    """
+    permission_classes = [IsAuthenticated]
+
+    @handle_exceptions
+    def get(self, request, *args, **kwargs):
+        try:
+            limit = int(request.query_params.get("limit", SUGGESTION_LIMIT))
+        except ValueError:
+            limit = SUGGESTION_LIMIT
+        limit = min(max(limit, 1), SUGGESTION_MAX_LIMIT)
+
+        return Response({
+            KEY_MESSAGE: "success",
+            KEY_PAYLOAD: get_item_suggestions(
+                get_membership_resolver(request).family_ids,
+                request.query_params.get("q"),
+                limit
+            ),
+            KEY_STATUS: 1
+        }, status=status.HTTP_200_OK)
+
+
+class GroceryReplenishmentAPIView(APIView):
+    """
+    Items the user's families usually buy that are due again within ?days_ahead=<n>
+    days (overdue first) and not already on a list, with how often they are bought.
+    Read from the predictions of the predict_replenishment command.
+    """
+    permission_classes = [IsAuthenticated]
+
+    @handle_exceptions
+    def get(self, request, *args, **kwargs):
+        try:
+            days_ahead = int(request.query_params.get("days_ahead", REPLENISHMENT_DAYS_AHEAD))
+        except ValueError:
+            days_ahead = REPLENISHMENT_DAYS_AHEAD
+        days_ahead = min(max(days_ahead, 0), REPLENISHMENT_MAX_DAYS_AHEAD)
+        try:
+            limit = int(request.query_params.get("limit", REPLENISHMENT_LIMIT))
+        except ValueError:
+            limit = REPLENISHMENT_LIMIT
+        limit = min(max(limit, 1), REPLENISHMENT_LIMIT)
+
+        due = get_due_replenishments(get_membership_resolver(request).family_ids, days_ahead, limit)
+        return Response({
+            KEY_MESSAGE: "success",
+            KEY_PAYLOAD: GroceryReplenishmentSerializer(due, many=True).data,
+            KEY_STATUS: 1
+        }, status=status.HTTP_200_OK)
+
+
+class GroceryExportAPIView(APIView):
+    """
+    Streams a dump of grocery lists and their items: ?output=ndjson (default) or csv.
+    ?grocery_list_id=<id> exports one list, ?family_id=<id> one family, and by
+    default every list of the user's families is exported.
+    """
+    permission_classes = [IsAuthenticated]
+
+    @handle_exceptions
+    def get(self, request, *args, **kwargs):
+        # ?format= is taken by DRF's content negotiation, hence ?output=
+        output = request.query_params.get("output", "ndjson")
+        if output not in TRANSFER_FORMATS:
+            return Response({
+                KEY_MESSAGE: "error",
+                KEY_PAYLOAD: f"output must be one of: {', '.join(TRANSFER_FORMATS)}",
+                KEY_STATUS: 0
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        lists = GroceryList.objects.filter(family_id__in=get_membership_resolver(request).family_ids)
+        for param, field in (("grocery_list_id", "id"), ("family_id", "family_id")):
+            value = request.query_params.get(param)
+            if not value:
+                continue
+            if not value.isdecimal():
+                return Response({
+                    KEY_MESSAGE: "error",
+                    KEY_PAYLOAD: f"{param} must be an integer.",
+                    KEY_STATUS: 0
+                }, status=status.HTTP_400_BAD_REQUEST)
+            lists = lists.filter(**{field: int(value)})
+
+        if output == "csv":
+            content, content_type = render_csv(export_records(lists)), "text/csv"
+        else:
+            content, content_type = render_ndjson(export_records(lists)), "application/x-ndjson"
+        if isinstance(request._request, ASGIRequest):
+            # ASGI servers would read a sync iterator to the end before sending anything
+            content = aiter_chunks(content)
+        response = StreamingHttpResponse(content, content_type=content_type)
+        response["Content-Disposition"] = f'attachment; filename="grocery-export.{output}"'
+        return response
+
+
+class GroceryImportAPIView(APIView):
+    """
+    Imports a dump produced by GroceryExportAPIView (multipart "file", ?output=
+    ndjson or csv) as new lists of the family of ?family_id=<id>. All or nothing.
+    """
+    permission_classes = [IsAuthenticated]
+
+    @idempotent
+    @handle_exceptions
+    def post(self, request, *args, **kwargs):
+        def error(message, status_code=status.HTTP_400_BAD_REQUEST):
+            return Response({
+                KEY_MESSAGE: "error",
+                KEY_PAYLOAD: message,
+                KEY_STATUS: 0
+            }, status=status_code)
+
+        output = request.query_params.get("output", "ndjson")
+        if output not in TRANSFER_FORMATS:
+            return error(f"output must be one of: {', '.join(TRANSFER_FORMATS)}")
+        upload = request.FILES.get("file")
+        if upload is None:
+            return error("A file upload named 'file' is required.")
+
+        memberships = get_membership_resolver(request).memberships
+        family_id = request.query_params.get("family_id")
+        if family_id:
+            family_membership = next((m for m in memberships if str(m.family_id) == family_id), None)
+        else:
+            # Without family_id the user's only family is used
+            family_membership = memberships[0] if len(memberships) == 1 else None
+        if family_membership is None:
+            return error("family_id must be one of your families.", status.HTTP_403_FORBIDDEN)
+
+        try:
+            counts = import_records(read_records(upload.file, output), family_membership, request.user)
+        except TransferError as e:
+            return error(str(e))
+
+        return Response({
+            KEY_MESSAGE: "success",
+            KEY_PAYLOAD: counts,
+            KEY_STATUS: 1
+        }, status=status.HTTP_201_CREATED)
@@ -1,3 +1,13 @@
 from django.contrib import admin
+from notification.models import OutgoingEmail
 
-# Register your models here.
+
+class OutgoingEmailAdmin(admin.ModelAdmin):
+    """Admin configuration for queued emails."""
+    list_display = ("id", "subject", "to_emails", "status", "attempts", "next_attempt_at", "created_at", "sent_at")
+    search_fields = ("subject", "to_emails")
+    list_filter = ("status", "created_at")
+    readonly_fields = ("created_at", "sent_at")
+
+
+admin.site.register(OutgoingEmail, OutgoingEmailAdmin)
@@ -0,0 +1,109 @@
+from smtplib import SMTPServerDisconnected
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.template import engines
+
+# ------------------------------------------------------------------------------
+# Rendering and delivery
+# ------------------------------------------------------------------------------
+# TemplateRenderer reads and compiles each template file the first time it is
+# used and keeps the compiled Template for the life of the process, so a send
+# only renders: no file read, loader lookup or parse. .txt templates render
+# with autoescaping off.
+#
+# EmailSender holds one backend connection (one SMTP TCP/TLS handshake and
+# login) for every message sent through it, and reopens it if the server drops
+# it. Messages go through send_messages one at a time on that connection: SMTP
+# has no multi-message command, so this costs the same as one call with the
+# whole batch, and tells which message failed.
+# ------------------------------------------------------------------------------
+
+
+class TemplateRenderer:
+    """ Renders email templates, given as paths relative to ROOT_DIR, compiling each once. """
+
+    def __init__(self):
+        self._templates = {}
+
+    def get_template(self, path):
+        template = self._templates.get(path)
+        if template is None:
+            with open(settings.ROOT_DIR + path) as f:
+                source = f.read()
+            if path.endswith(".txt"):
+                # Plain text parts must not be HTML-escaped
+                source = "{% autoescape off %}" + source + "{% endautoescape %}"
+            template = engines["django"].from_string(source)
+            self._templates[path] = template
+        return template
+
+    def render(self, path, context):
+        return self.get_template(path).render(context)
+
+    def build_message(self, subject, from_email, to_emails, txt_template, html_template, context, connection=None):
+        """ An EmailMultiAlternatives with the rendered text body and HTML alternative. """
+        message = EmailMultiAlternatives(
+            subject=subject, body=self.render(txt_template, context), from_email=from_email, to=to_emails,
+            connection=connection,
+        )
+        message.attach_alternative(self.render(html_template, context), "text/html")
+        return message
+
+
+renderer = TemplateRenderer()
+
+
+class EmailSender:
+    """
+    Sends messages over one connection of the configured EMAIL_BACKEND, opened
+    by the first send. Use it as a context manager so the connection is closed
+    once the batch is done.
+    """
+
+    def __init__(self, connection=None):
+        self.connection = connection or get_connection()
+        self.is_open = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.is_open:
+            self.connection.close()
+            self.is_open = False
+
+    def open(self):
+        # Opened explicitly: send_messages closes connections it had to open itself
+        if not self.is_open:
+            self.connection.open()
+            self.is_open = True
+
+    def send(self, message):
+        """ Sends one message, reconnecting once if the server dropped the connection. Raises on failure. """
+        self.open()
+        try:
+            sent = self.connection.send_messages([message])
+        except (SMTPServerDisconnected, ConnectionError):
+            self.is_open = False
+            self.connection.close()
+            self.open()
+            sent = self.connection.send_messages([message])
+        if not sent:
+            raise RuntimeError("The email backend did not send the message.")
+
+    def send_messages(self, messages):
+        """
+        Sends messages in order; returns one exception (or None when sent) per
+        message. If the connection cannot be opened, the rest of the batch
+        fails with that error without another attempt.
+        """
+        errors = []
+        for index, message in enumerate(messages):
+            try:
+                self.send(message)
+                errors.append(None)
+            except Exception as e:
+                if not self.is_open:
+                    return errors + [e] * (len(messages) - index)
+                errors.append(e)
+        return errors
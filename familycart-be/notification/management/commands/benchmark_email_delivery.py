@@ -0,0 +1,81 @@
+import socket
+import time
+from django.conf import settings
+from django.core import mail
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.core.management.base import BaseCommand, CommandError
+from django.template.loader import get_template
+from notification.mailer import EmailSender, TemplateRenderer
+
+TXT_TEMPLATE = "templates/verify_email.txt"
+HTML_TEMPLATE = "templates/verify_otp.html"
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures email throughput of a file read, template lookup and connection per message against the "
+        "compiled templates and pooled connection of notification/mailer.py. Sends to the locmem backend, or "
+        "to a local aiosmtpd server with --backend smtp; never to the configured EMAIL_BACKEND."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--count", type=int, default=500, help="Messages sent per run.")
+        parser.add_argument("--backend", choices=["locmem", "smtp"], default="locmem",
+                            help="locmem, or smtp for an in-process aiosmtpd server on 127.0.0.1.")
+
+    def handle(self, *args, **options):
+        if options["count"] < 1:
+            raise CommandError("--count must be at least 1.")
+        if options["backend"] == "locmem":
+            self.run(options["count"], lambda: get_connection("django.core.mail.backends.locmem.EmailBackend"))
+            mail.outbox = []
+            return
+
+        try:
+            from aiosmtpd.controller import Controller
+            from aiosmtpd.handlers import Sink
+        except ImportError:
+            raise CommandError("--backend smtp needs aiosmtpd (pip install aiosmtpd).")
+        # aiosmtpd cannot bind port 0 itself, so borrow a free port from the OS
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            port = probe.getsockname()[1]
+        controller = Controller(Sink(), hostname="127.0.0.1", port=port)
+        controller.start()
+        try:
+            self.run(options["count"], lambda: get_connection(
+                "django.core.mail.backends.smtp.EmailBackend", host="127.0.0.1", port=port,
+                username="", password="", use_tls=False, use_ssl=False,
+            ))
+        finally:
+            controller.stop()
+
+    def run(self, count, connection_factory):
+        contexts = [{"first_name": f"User {index}", "verification_otp": f"{index:06d}"} for index in range(count)]
+        to_emails = ["benchmark@example.com"]
+
+        started = time.perf_counter()
+        for context in contexts:
+            with open(settings.ROOT_DIR + TXT_TEMPLATE) as f:
+                body = f.read()
+            message = EmailMultiAlternatives(subject="Benchmark", body=body, from_email="noreply@example.com",
+                                             to=to_emails, connection=connection_factory())
+            message.attach_alternative(get_template(settings.ROOT_DIR + HTML_TEMPLATE).render(context), "text/html")
+            message.send()
+        per_message = time.perf_counter() - started
+
+        started = time.perf_counter()
+        renderer = TemplateRenderer()
+        with EmailSender(connection_factory()) as sender:
+            errors = sender.send_messages([
+                renderer.build_message("Benchmark", "noreply@example.com", to_emails, TXT_TEMPLATE, HTML_TEMPLATE, context)
+                for context in contexts
+            ])
+        pooled = time.perf_counter() - started
+        failed = sum(error is not None for error in errors)
+        if failed:
+            raise CommandError(f"{failed} of {count} pooled sends failed: {next(e for e in errors if e)}")
+
+        self.stdout.write(f"Per message: {count / per_message:,.0f} emails/s ({per_message:.3f} s)")
+        self.stdout.write(f"Pooled:      {count / pooled:,.0f} emails/s ({pooled:.3f} s)")
+        self.stdout.write(self.style.SUCCESS(f"Pooled delivery is {per_message / pooled:.1f}x faster."))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand, CommandError
+from notification.queue import purge_finished_emails
+
+
+class Command(BaseCommand):
+    help = "Deletes sent and failed queued emails older than EMAIL_QUEUE_RETENTION_DAYS. Run it periodically (e.g. daily from cron)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, help="Keep emails queued in the last this many days instead.")
+
+    def handle(self, *args, **options):
+        if options["days"] is not None and options["days"] < 0:
+            raise CommandError("--days must not be negative.")
+        deleted = purge_finished_emails(options["days"])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} sent or failed queued emails."))
@@ -0,0 +1,25 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from notification.queue import process_email_queue, EMAIL_QUEUE_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = "Sends queued emails, retrying failures with backoff. Runs as a worker unless --once is given."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=EMAIL_QUEUE_BATCH_SIZE,
+                            help="Emails claimed at a time.")
+        parser.add_argument("--once", action="store_true",
+                            help="Send the emails due now and exit (e.g. from cron) instead of polling.")
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be at least 1.")
+        while True:
+            sent, failed = process_email_queue(options["batch_size"])
+            if sent or failed or options["once"]:
+                self.stdout.write(self.style.SUCCESS(f"Sent {sent} queued emails, {failed} failed."))
+            if options["once"]:
+                return
+            time.sleep(settings.EMAIL_QUEUE_POLL_INTERVAL)
@@ -1,3 +1,42 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.db.models import Q
+from django.utils import timezone
 
-# Create your models here.
+
+class OutgoingEmail(models.Model):
+	"""
+	Templated email waiting to be sent. Views only insert the row (in their own
+	transaction) and the send_queued_emails worker renders and delivers it
+	(notification/queue.py), retrying failures with exponential backoff.
+	"""
+	class Status(models.TextChoices):
+	    PENDING = "pending", "Pending"
+	    SENT = "sent", "Sent"
+	    FAILED = "failed", "Failed"
+
+	subject = models.CharField(max_length=255)
+	from_email = models.CharField(max_length=254)
+	to_emails = models.JSONField(default=list)
+	# Paths relative to ROOT_DIR, rendered with context when the email is sent
+	txt_template = models.CharField(max_length=255)
+	html_template = models.CharField(max_length=255)
+	context = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder)
+	status = models.CharField(max_length=10, choices=Status.choices, default=Status.PENDING)
+	attempts = models.PositiveSmallIntegerField(default=0)
+	# Pending emails are sent from this time on; claiming one pushes it a lease ahead
+	next_attempt_at = models.DateTimeField(default=timezone.now)
+	last_error = models.TextField(blank=True)
+	created_at = models.DateTimeField(auto_now_add=True)
+	sent_at = models.DateTimeField(null=True, blank=True)
+
+	class Meta:
+		db_table = "outgoing_emails"
+		indexes = [
+		    # Due emails, in the order the worker claims them
+		    models.Index(fields=["next_attempt_at", "id"], condition=Q(status="pending"),
+		                 name="outgoing_emails_due_idx"),
+		]
+
+	def __str__(self):
+		return f"{self.subject} -> {', '.join(self.to_emails)} ({self.status})"
@@ -0,0 +1,150 @@
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from notification.mailer import EmailSender, renderer
+from notification.models import OutgoingEmail
+
+# ------------------------------------------------------------------------------
+# Email queue
+# ------------------------------------------------------------------------------
+# Sending mail in a request ties its latency and its success to the SMTP
+# server. Instead, enqueue_email inserts an OutgoingEmail row in the request's
+# transaction (so nothing is mailed for a rolled back sign-up) and returns.
+#
+# The send_queued_emails worker drains the queue. claim_due_emails locks due
+# rows with SKIP LOCKED, so concurrent workers split them, and pushes their
+# next_attempt_at one lease ahead before committing: each email is then sent
+# outside any transaction, and a worker that dies mid-batch only delays its
+# emails until the lease runs out (the ones it had sent then go out twice:
+# delivery is at least once). Batches are rendered with the compiled templates
+# and sent over one connection (notification/mailer.py). A failed send is
+# retried after EMAIL_QUEUE_RETRY_DELAY seconds, doubled per attempt, until
+# EMAIL_QUEUE_MAX_ATTEMPTS attempts have failed.
+#
+# The context of an email (e.g. its OTP) is cleared once it is sent or has
+# failed for good; purge_queued_emails deletes those rows after
+# EMAIL_QUEUE_RETENTION_DAYS.
+# ------------------------------------------------------------------------------
+
+EMAIL_QUEUE_BATCH_SIZE = 100
+
+
+def enqueue_email(subject, from_email, to_emails, txt_template, html_template, context=None):
+    """ Queues a templated email for the worker; to_emails is an address or a list of them. """
+    if isinstance(to_emails, str):
+        to_emails = [to_emails]
+    return OutgoingEmail.objects.create(
+        subject=subject,
+        from_email=from_email,
+        to_emails=list(to_emails),
+        txt_template=txt_template,
+        html_template=html_template,
+        context=context or {},
+    )
+
+
+def retry_delay(attempts):
+    """ Seconds to wait before the next attempt after attempts failed ones. """
+    return min(settings.EMAIL_QUEUE_RETRY_DELAY * 2 ** (attempts - 1), settings.EMAIL_QUEUE_MAX_RETRY_DELAY)
+
+
+def claim_due_emails(batch_size=EMAIL_QUEUE_BATCH_SIZE, now=None):
+    """
+    Leases up to batch_size due emails to the caller, oldest first, counting
+    the attempt. Returns them with attempts already incremented.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        emails = list(
+            OutgoingEmail.objects.select_for_update(skip_locked=True).filter(
+                status=OutgoingEmail.Status.PENDING, next_attempt_at__lte=now
+            ).order_by("next_attempt_at", "id")[:batch_size]
+        )
+        if emails:
+            OutgoingEmail.objects.filter(id__in=[email.id for email in emails]).update(
+                next_attempt_at=now + timedelta(seconds=settings.EMAIL_QUEUE_LEASE), attempts=F("attempts") + 1
+            )
+    for email in emails:
+        email.attempts += 1
+    return emails
+
+
+def build_message(email):
+    """ Renders an OutgoingEmail into the message to send. """
+    return renderer.build_message(
+        email.subject, email.from_email, email.to_emails, email.txt_template, email.html_template, email.context
+    )
+
+
+def mark_sent(email):
+    """ Records the delivery and drops the context, which may hold secrets such as OTPs. """
+    email.status = OutgoingEmail.Status.SENT
+    email.sent_at = timezone.now()
+    email.last_error = ""
+    email.context = {}
+    OutgoingEmail.objects.filter(id=email.id).update(status=email.status, sent_at=email.sent_at, last_error="", context={})
+
+
+def mark_failed(email, error):
+    """
+    Schedules the next attempt, or gives up (dropping the context, as
+    mark_sent does) once EMAIL_QUEUE_MAX_ATTEMPTS attempts have failed.
+    """
+    email.last_error = f"{type(error).__name__}: {error}"
+    if email.attempts >= settings.EMAIL_QUEUE_MAX_ATTEMPTS:
+        email.status = OutgoingEmail.Status.FAILED
+        email.context = {}
+    else:
+        email.next_attempt_at = timezone.now() + timedelta(seconds=retry_delay(email.attempts))
+    OutgoingEmail.objects.filter(id=email.id).update(
+        status=email.status, next_attempt_at=email.next_attempt_at, last_error=email.last_error, context=email.context
+    )
+
+
+def purge_finished_emails(days=None):
+    """ Deletes sent and failed emails queued more than days (EMAIL_QUEUE_RETENTION_DAYS) ago. Returns the count. """
+    days = settings.EMAIL_QUEUE_RETENTION_DAYS if days is None else days
+    deleted, _ = OutgoingEmail.objects.filter(
+        status__in=[OutgoingEmail.Status.SENT, OutgoingEmail.Status.FAILED],
+        created_at__lt=timezone.now() - timedelta(days=days),
+    ).delete()
+    return deleted
+
+
+def deliver_emails(emails, sender):
+    """ Sends claimed emails through sender and records each outcome. Returns the (sent, failed) counts. """
+    failed = 0
+    batch = []
+    for email in emails:
+        try:
+            batch.append((email, build_message(email)))
+        except Exception as e:
+            mark_failed(email, e)
+            failed += 1
+    errors = sender.send_messages([message for _, message in batch])
+    for (email, _), error in zip(batch, errors):
+        if error is None:
+            mark_sent(email)
+        else:
+            mark_failed(email, error)
+            failed += 1
+    return len(emails) - failed, failed
+
+
+def process_email_queue(batch_size=EMAIL_QUEUE_BATCH_SIZE):
+    """
+    Sends every email due now, batch_size claimed at a time, over a single
+    backend connection. Emails that fail are rescheduled in the future, so
+    each is tried at most once per call. Returns the (sent, failed) counts.
+    """
+    sent = failed = 0
+    with EmailSender() as sender:
+        while True:
+            emails = claim_due_emails(batch_size)
+            if not emails:
+                return sent, failed
+            batch_sent, batch_failed = deliver_emails(emails, sender)
+            sent += batch_sent
+            failed += batch_failed
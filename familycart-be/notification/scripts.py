@@ -1,8 +1,5 @@
 from django.conf import settings
-from django.core.mail import send_mail, EmailMultiAlternatives
-from django.template import Context
-from django.template.loader import get_template
-from django.conf import settings
+from notification.queue import enqueue_email
 
 # ------------------------------------------------------------------------------
 # Parameters:
@@ -14,17 +11,11 @@ from django.conf import settings
 #   to_emails          : recipient's email address or list of emails
 # ------------------------------------------------------------------------------
 def send_mail_with_template(mail_content, txt_template_path, html_template_path, subject, from_email, to_emails):
-    """ Sends an email using both a plain text template and an HTML template. """
-    mail_content = mail_content
-    try:
-        with open(settings.ROOT_DIR + txt_template_path) as f:
-            full_msg = f.read()
-        message = EmailMultiAlternatives(subject=subject, body=full_msg, from_email=from_email, to=[to_emails])
-        html_template = get_template(settings.ROOT_DIR +html_template_path).render(mail_content)
-        message.attach_alternative(html_template, 'text/html')
-        message.send()
-    except Exception as e:
-        print("Exception in send_mail_with_template -->", e)
+    """
+    Queues an email using both a plain text template and an HTML template. It
+    is rendered and sent by the send_queued_emails worker (notification/queue.py).
+    """
+    return enqueue_email(subject, from_email, to_emails, txt_template_path, html_template_path, mail_content)
 
 
 # ------------------------------------------------------------------------------
@@ -36,7 +27,7 @@ def send_mail_with_template(mail_content, txt_template_path, html_template_path,
 #   from_email       : sender's email address
 # ------------------------------------------------------------------------------
 def send_user_sign_up_mail(subject,first_name, verification_otp, to_emails, from_email=settings.EMAIL_HOST_USER):
-    """ Sends a user verification email after sign-up. """
+    """ Queues a user verification email after sign-up. """
     mail_content = {'first_name': first_name, "verification_otp":verification_otp}
     txt_template_path = "templates/verify_email.txt"
     html_template_path = "templates/verify_otp.html"
@@ -1,3 +1,88 @@
-from django.test import TestCase
+import uuid
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+from django.core import mail
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from notification.mailer import TemplateRenderer
+from notification.models import OutgoingEmail
+from notification.queue import enqueue_email, process_email_queue, purge_finished_emails
 
-# Create your tests here.
+VERIFY_TXT = "templates/verify_email.txt"
+VERIFY_HTML = "templates/verify_otp.html"
+
+
+class TemplateRendererTests(SimpleTestCase):
+    def test_text_part_is_not_escaped_and_has_the_otp(self):
+        message = TemplateRenderer().build_message(
+            "Verify", "noreply@example.com", ["obrien@example.com"], VERIFY_TXT, VERIFY_HTML,
+            {"first_name": "O'Brien", "verification_otp": "123456"},
+        )
+        self.assertIn("Hello O'Brien,", message.body)
+        self.assertIn("123456", message.body)
+        html = message.alternatives[0][0]
+        self.assertIn("O&#x27;Brien", html)
+        self.assertIn("123456", html)
+
+
+def enqueue_verification(to_email="user@example.com"):
+    return enqueue_email("Verify", "noreply@example.com", to_email, VERIFY_TXT, VERIFY_HTML,
+                         {"first_name": "Ann", "verification_otp": "654321"})
+
+
+@override_settings(EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend",
+                   EMAIL_QUEUE_RETRY_DELAY=30, EMAIL_QUEUE_MAX_RETRY_DELAY=3600, EMAIL_QUEUE_MAX_ATTEMPTS=3)
+class EmailQueueTests(TestCase):
+    def test_sign_up_queues_the_mail_for_the_worker(self):
+        email = f"{uuid.uuid4().hex[:12]}@example.com"
+        response = APIClient().post("/api/v1/user/signup", {
+            "email": email, "username": email, "first_name": "Ann", "last_name": "Lee", "password": "Passw0rd!x",
+        }, format="json")
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(len(mail.outbox), 0)
+        queued = OutgoingEmail.objects.get(to_emails=[email])
+        self.assertEqual(queued.status, OutgoingEmail.Status.PENDING)
+
+        call_command("send_queued_emails", "--once", stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, [email])
+        self.assertIn(queued.context["verification_otp"], mail.outbox[0].body)
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, OutgoingEmail.Status.SENT)
+        self.assertEqual(queued.attempts, 1)
+        # The OTP is not kept once sent
+        self.assertEqual(queued.context, {})
+
+    def test_failed_sends_back_off_then_give_up(self):
+        queued = enqueue_verification()
+        failing = mock.patch("django.core.mail.backends.locmem.EmailBackend.send_messages",
+                             side_effect=RuntimeError("SMTP is down"))
+        for attempt, delay in ((1, 30), (2, 60)):
+            started = timezone.now()
+            with failing:
+                self.assertEqual(process_email_queue(), (0, 1))
+            queued.refresh_from_db()
+            self.assertEqual((queued.status, queued.attempts), (OutgoingEmail.Status.PENDING, attempt))
+            self.assertEqual(queued.last_error, "RuntimeError: SMTP is down")
+            self.assertAlmostEqual((queued.next_attempt_at - started).total_seconds(), delay, delta=5)
+            # Not due yet: nothing is retried early
+            self.assertEqual(process_email_queue(), (0, 0))
+            OutgoingEmail.objects.filter(id=queued.id).update(next_attempt_at=timezone.now())
+
+        with failing:
+            self.assertEqual(process_email_queue(), (0, 1))
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts, queued.context), (OutgoingEmail.Status.FAILED, 3, {}))
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_purge_deletes_old_finished_emails_only(self):
+        sent, pending = enqueue_verification(), enqueue_verification()
+        process_email_queue()
+        OutgoingEmail.objects.filter(id=sent.id).update(created_at=timezone.now() - timedelta(days=8))
+        OutgoingEmail.objects.filter(id=pending.id).update(created_at=timezone.now() - timedelta(days=8),
+                                                           status=OutgoingEmail.Status.PENDING)
+        self.assertEqual(purge_finished_emails(7), 1)
+        self.assertEqual(list(OutgoingEmail.objects.values_list("id", flat=True)), [pending.id])
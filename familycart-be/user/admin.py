@@ -19,6 +19,7 @@ class PermissionAdmin(admin.ModelAdmin):
         return qs.select_related('content_type')
 
 admin.site.register(EmailVerification)
+admin.site.register(IdempotencyKey)
 
 class UserCreationForm(forms.ModelForm):
 	"""A form for creating new users. Includes all the required
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from constants.idempotency import DatabaseIdempotencyStore
+
+
+class Command(BaseCommand):
+    help = "Deletes expired Idempotency-Key records. Run it periodically (e.g. daily from cron)."
+
+    def handle(self, *args, **options):
+        deleted = DatabaseIdempotencyStore().purge_expired()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired idempotency keys."))
@@ -5,6 +5,7 @@ from django.conf import settings
 from django.contrib.auth.models import (
     BaseUserManager, AbstractBaseUser
 )
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import ValidationError
 from django.db import models
 from rest_framework_simplejwt.tokens import RefreshToken
@@ -166,4 +167,31 @@ class EmailVerification(models.Model):
 		# Deleting the instance if validation is successful
 		if valid:
 			self.delete()
-		return valid
\ No newline at end of file
+		return valid
+
+
+class IdempotencyKey(models.Model):
+	"""
+	First response of a mutating request sent with an Idempotency-Key header,
+	replayed to retries of the same user and endpoint (see constants/idempotency.py).
+	status_code stays null while the first request is still running.
+	"""
+	user = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False, related_name="idempotency_keys")
+	key = models.CharField(max_length=255)
+	endpoint = models.CharField(max_length=255)
+	fingerprint = models.CharField(max_length=64)
+	status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+	response_body = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+	response_headers = models.JSONField(default=dict, blank=True)
+	locked_until = models.DateTimeField()
+	expires_at = models.DateTimeField(db_index=True)
+	created_at = models.DateTimeField(auto_now_add=True)
+
+	class Meta:
+		db_table = "idempotency_keys"
+		constraints = [
+			models.UniqueConstraint(fields=["user", "key", "endpoint"], name="idempotency_keys_unique"),
+		]
+
+	def __str__(self):
+		return f"{self.endpoint} {self.key} ({self.user_id})"
@@ -29,7 +29,7 @@ class UserSimpleSerializer(ModelSerializer):
         }
 
     def get_family_membership(self, obj):
-        return fetch_my_family_membership(obj)
+        return fetch_my_family_membership(obj, self.context.get("request"))
 
 
     
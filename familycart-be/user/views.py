@@ -293,7 +293,7 @@ class FetchProfileAPIView(APIView):
                     status=status.HTTP_200_OK,
                     data={
                         KEY_MESSAGE: "Profile fetched successfully",
-                        KEY_PAYLOAD: UserSimpleSerializer(request.user, many=False).data,
+                        KEY_PAYLOAD: UserSimpleSerializer(request.user, many=False, context={"request": request}).data,
                         KEY_STATUS: 1
                     },
                 )
@@ -302,7 +302,7 @@ class FetchProfileAPIView(APIView):
     def patch(self, request):
         """ Partial Update User Profile """
         user = request.user
-        serializer = UserSimpleSerializer(user, data=request.data, partial=True)
+        serializer = UserSimpleSerializer(user, data=request.data, partial=True, context={"request": request})
         if serializer.is_valid():
             serializer.save()
             return Response(
@@ -1679,7 +1679,7 @@ export class GroceryListDetailComponent implements OnInit {
         endpoint = pageUrl.startsWith('api/') ? pageUrl : `api/${pageUrl}`;
       }
     } else {
-      endpoint = `grocery/grocery-items/?grocery_list_id=${this.listId}`;
+      endpoint = `grocery/grocery-items/?grocery_list_id=${this.listId}&fields=id,name,quantity,quantity_type,purchased,note`;
     }
 
     this.apiService.get<GroceryItemsListResponse>(
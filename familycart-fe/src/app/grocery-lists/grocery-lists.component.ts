@@ -829,7 +829,7 @@ export class GroceryListsComponent implements OnInit {
     this.error = '';
 
     // If URL is provided (for pagination), use it directly, otherwise use the base endpoint
-    const endpoint = url ? this.extractEndpointFromUrl(url) : 'grocery/grocery-lists';
+    const endpoint = url ? this.extractEndpointFromUrl(url) : 'grocery/grocery-lists/?fields=id,name,description,created_at,updated_at';
 
     this.apiService.get<GroceryListResponse>(endpoint, null, token).subscribe({
       next: (response) => {